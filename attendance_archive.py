@@ -0,0 +1,205 @@
+# attendance_archive.py (Monthly archive partitions for attendance_logs - closed months move to read-only SQLite files)
+#
+# The hot attendance_logs table keeps the current month (and any months newer than the cutoff). Each closed month
+# is moved to ARCHIVE_DIR/attendance_YYYY-MM.db and recorded in the archive_partitions manifest table of the main
+# database. Readers ATTACH only the partitions whose month overlaps the requested date range, read-only.
+#   python attendance_archive.py                 archive every month before the current one
+#   python attendance_archive.py --keep-months 3 keep the current and the two previous months hot
+#   python attendance_archive.py --list          show the manifest
+import argparse
+import calendar
+import os
+import sqlite3
+import time
+from datetime import date
+from urllib.request import pathname2url
+
+from database_setup import setup_database, DATABASE_FILE
+import event_log
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_FILE_PATTERN = "attendance_{period}.db"
+KEEP_MONTHS = 1            # Months kept in the hot table, counting the current one
+MAX_ATTACHED_PARTITIONS = 8 # SQLite allows 10 attached databases by default; larger ranges are read in batches
+
+ARCHIVE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS attendance_logs (
+        log_id INTEGER PRIMARY KEY,
+        employee_id TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        detected_emotion TEXT
+    )
+'''
+
+
+def month_bounds(period):
+    """('YYYY-MM-01', 'YYYY-MM-<last day>') for a 'YYYY-MM' period."""
+    year, month = (int(v) for v in period.split('-'))
+    return f"{period}-01", f"{period}-{calendar.monthrange(year, month)[1]:02d}"
+
+
+def next_period(period):
+    year, month = (int(v) for v in period.split('-'))
+    return f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+def cutoff_period(keep_months=KEEP_MONTHS, today=None):
+    """First 'YYYY-MM' that stays hot: months before it are closed and get archived."""
+    today = today or date.today()
+    months = today.year * 12 + today.month - 1 - max(1, keep_months) + 1
+    return f"{months // 12:04d}-{months % 12 + 1:02d}"
+
+
+def _readonly_uri(path):
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+
+
+def get_partitions(conn, start_date_str=None, end_date_str=None):
+    """Manifest rows [(period, file_path)] whose month overlaps [start_date_str, end_date_str] (None = open-ended)."""
+    query = "SELECT period, file_path FROM archive_partitions"; filters = []; params = []
+    if start_date_str: filters.append("last_date >= ?"); params.append(start_date_str)
+    if end_date_str: filters.append("first_date <= ?"); params.append(end_date_str)
+    if filters: query += " WHERE " + " AND ".join(filters)
+    try: return conn.execute(query + " ORDER BY period", params).fetchall()
+    except sqlite3.OperationalError: return [] # Database created before archiving existed (no manifest yet)
+
+
+def query_logs(conn, select_sql, where_sql, params, order_sql="", start_date_str=None, end_date_str=None, sort_key=None):
+    """Runs `SELECT ... FROM {logs} l ... WHERE ...` over the hot table plus the overlapping archive partitions.
+
+    `select_sql` must contain the placeholder {logs}, which becomes the UNION ALL of the hot table and up to
+    MAX_ATTACHED_PARTITIONS attached partitions per batch. `conn` must be opened with uri=True. When more than
+    one batch is needed, `sort_key` restores the global order that `order_sql` gives within each batch.
+    """
+    partitions = [(period, path) for period, path in get_partitions(conn, start_date_str, end_date_str) if os.path.exists(path)]
+    batches = [partitions[i:i + MAX_ATTACHED_PARTITIONS] for i in range(0, len(partitions), MAX_ATTACHED_PARTITIONS)] or [[]]
+    rows = []
+    for batch_index, batch in enumerate(batches):
+        sources = ["SELECT log_id, employee_id, timestamp, detected_emotion FROM main.attendance_logs"] if batch_index == 0 else []
+        attached = []
+        try:
+            for i, (period, path) in enumerate(batch):
+                alias = f"p{i}"; conn.execute("ATTACH DATABASE ? AS " + alias, (_readonly_uri(path),)); attached.append(alias)
+                sources.append(f"SELECT log_id, employee_id, timestamp, detected_emotion FROM {alias}.attendance_logs")
+            logs_sql = "(" + " UNION ALL ".join(sources) + ")"
+            rows.extend(conn.execute(select_sql.format(logs=logs_sql) + where_sql + order_sql, params).fetchall())
+        finally:
+            for alias in attached: conn.execute("DETACH DATABASE " + alias)
+    if len(batches) > 1 and sort_key: rows.sort(key=sort_key)
+    return rows
+
+
+def _archive_period(conn, period, archive_dir):
+    """Copies one month into its archive file, then records it in the manifest and deletes it from the hot table."""
+    first_date, last_date = month_bounds(period)
+    path = os.path.join(archive_dir, ARCHIVE_FILE_PATTERN.format(period=period))
+    where = "timestamp >= ? AND timestamp < ?"; bounds = (first_date, f"{next_period(period)}-01")
+    # 1) Copy and commit the archive file on its own; re-running after a crash just skips rows already copied (same log_id)
+    archive = sqlite3.connect(path)
+    try:
+        archive.execute(ARCHIVE_TABLE_SQL)
+        archive.execute("CREATE INDEX IF NOT EXISTS idx_logs_employee_time ON attendance_logs (employee_id, timestamp)")
+        archive.commit()
+    finally: archive.close()
+    conn.execute("ATTACH DATABASE ? AS archive_target", (path,))
+    try:
+        conn.execute(f"INSERT OR IGNORE INTO archive_target.attendance_logs SELECT log_id, employee_id, timestamp, detected_emotion FROM main.attendance_logs WHERE {where}", bounds)
+        conn.commit()
+        hot_ids = conn.execute(f"SELECT COUNT(*) FROM main.attendance_logs WHERE {where} AND log_id NOT IN (SELECT log_id FROM archive_target.attendance_logs)", bounds).fetchone()[0]
+        if hot_ids: raise sqlite3.DatabaseError(f"{hot_ids} row(s) of {period} missing from {path} after copy")
+        row_count = conn.execute("SELECT COUNT(*) FROM archive_target.attendance_logs").fetchone()[0]
+    finally: conn.execute("DETACH DATABASE archive_target")
+    # 2) Manifest + delete in one transaction on the main database
+    conn.execute("INSERT OR REPLACE INTO archive_partitions (period, file_path, first_date, last_date, row_count, archived_at) VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))",
+                 (period, path, first_date, last_date, row_count))
+    moved = conn.execute(f"DELETE FROM main.attendance_logs WHERE {where}", bounds).rowcount
+    conn.commit()
+    return moved, row_count
+
+
+def archive_closed_months(keep_months=KEEP_MONTHS, db_file=DATABASE_FILE, archive_dir=ARCHIVE_DIR, today=None):
+    """Moves every closed month (before cutoff_period) out of the hot table. Returns {period: rows moved}."""
+    cutoff = cutoff_period(keep_months, today); moved = {}; conn = None
+    try:
+        os.makedirs(archive_dir, exist_ok=True)
+        conn = sqlite3.connect(db_file)
+        periods = [row[0] for row in conn.execute("SELECT DISTINCT substr(timestamp, 1, 7) FROM attendance_logs WHERE timestamp < ? ORDER BY 1", (f"{cutoff}-01",))]
+        for period in periods:
+            start = time.perf_counter()
+            moved[period], total = _archive_period(conn, period, archive_dir)
+            event_log.info('archive', f"Archived {moved[period]} attendance log(s) of {period} ({total} in partition) in {time.perf_counter() - start:.2f}s.",
+                           period=period, rows=moved[period], partition_rows=total)
+    except (sqlite3.Error, OSError) as e:
+        event_log.error('archive', f"Archiving attendance logs failed: {e}")
+        if conn: conn.rollback()
+    finally:
+        if conn: conn.close()
+    return moved
+
+
+def delete_employee_archives(employee_id, db_file=DATABASE_FILE):
+    """Deletes one employee's rows from every archive partition (used when the employee is deleted), so they can't
+       reappear under a new employee who is later given the same ID. Returns False if any partition could not be updated."""
+    conn = None; removed = 0
+    try:
+        conn = sqlite3.connect(db_file)
+        for period, path in get_partitions(conn):
+            if not os.path.exists(path): continue
+            archive = sqlite3.connect(path)
+            try:
+                deleted = archive.execute("DELETE FROM attendance_logs WHERE employee_id = ?", (employee_id,)).rowcount; archive.commit()
+            finally: archive.close()
+            if deleted:
+                conn.execute("UPDATE archive_partitions SET row_count = row_count - ? WHERE period = ?", (deleted, period)); conn.commit(); removed += deleted
+    except (sqlite3.Error, OSError) as e:
+        event_log.error('archive', f"Deleting archived logs of {employee_id} failed: {e}")
+        return False
+    finally:
+        if conn: conn.close()
+    if removed: event_log.info('archive', f"Deleted {removed} archived attendance log(s) of {employee_id}.")
+    return True
+
+
+def delete_archives(db_file=DATABASE_FILE):
+    """Removes every archive partition file and its manifest row (used by the full attendance data reset)."""
+    conn = None; removed = 0
+    try:
+        conn = sqlite3.connect(db_file)
+        for period, path in get_partitions(conn):
+            if os.path.exists(path): os.remove(path)
+            conn.execute("DELETE FROM archive_partitions WHERE period = ?", (period,)); removed += 1
+        conn.commit()
+    except (sqlite3.Error, OSError) as e:
+        event_log.error('archive', f"Deleting archive partitions failed: {e}")
+        if conn: conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+    if removed: event_log.info('archive', f"Deleted {removed} archive partition(s).")
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Move closed months of attendance_logs into per-month archive databases.")
+    parser.add_argument('--keep-months', type=int, default=KEEP_MONTHS, help="Months kept in the hot table, counting the current one.")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--list', action='store_true', help="Print the archive manifest and exit.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_database()
+    if args.list:
+        conn = sqlite3.connect(DATABASE_FILE)
+        try:
+            for row in conn.execute("SELECT period, row_count, file_path, archived_at FROM archive_partitions ORDER BY period"): print("  ".join(str(v) for v in row))
+        finally: conn.close()
+        return 0
+    moved = archive_closed_months(args.keep_months, archive_dir=args.archive_dir)
+    print(f"Archived {sum(moved.values())} log(s) from {len(moved)} month(s)." if moved else "Nothing to archive.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+# attendance_evidence.py (Audit evidence for attendance logs - face crop + downscaled context frame, saved in the background)
+#
+# When an attendance row is written, the camera thread cuts the face crop and a small context frame out of the
+# current frame (cheap: a slice copy and one resize) and hands them to EvidenceWriter. Its thread does the JPEG
+# encoding and file writes and records the paths in attendance_evidence, keyed by attendance_logs.log_id (which
+# archiving keeps, so evidence stays linked after a month is moved out). The queue is bounded: if the disk
+# can't keep up, evidence is dropped (and counted), attendance never waits for it.
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from database_setup import DATABASE_FILE
+from face_engine import crop_face
+from perf_metrics import METRICS
+import event_log
+
+EVIDENCE_DIR = "evidence"      # evidence/YYYY-MM-DD/<log_id>_<employee_id>_face.jpg and ..._context.jpg
+EVIDENCE_JPEG_QUALITY = 85
+EVIDENCE_FACE_PADDING = 30     # Pixels around the face box in the crop
+EVIDENCE_CONTEXT_WIDTH = 320   # Width of the downscaled full frame
+EVIDENCE_QUEUE_SIZE = 64
+
+
+def prepare_evidence(frame, location, scale=1.0, padding=EVIDENCE_FACE_PADDING, context_width=EVIDENCE_CONTEXT_WIDTH):
+    """(face crop, context frame) as new arrays that stay valid after `frame` is reused. Runs on the camera thread."""
+    face = crop_face(frame, location, scale, padding)
+    h, w = frame.shape[:2]
+    context = cv2.resize(frame, (context_width, max(1, int(h * context_width / w))), interpolation=cv2.INTER_AREA) if w > context_width else frame.copy()
+    return (face.copy() if face is not None else None), context
+
+
+class EvidenceWriter:
+    """Background JPEG writer. submit() never blocks."""
+    def __init__(self, evidence_dir=EVIDENCE_DIR, db_file=DATABASE_FILE, quality=EVIDENCE_JPEG_QUALITY, queue_size=EVIDENCE_QUEUE_SIZE):
+        self.evidence_dir = evidence_dir; self.db_file = db_file; self.quality = quality
+        self._queue = queue.Queue(maxsize=queue_size); self._thread = None
+        self.dropped = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True); self._thread.start()
+
+    def stop(self, timeout=5.0):
+        try: self._queue.put(None, timeout=timeout) # Sentinel: evidence queued before it is still written
+        except queue.Full: pass
+        if self._thread: self._thread.join(timeout)
+
+    def submit(self, log_id, employee_id, evidence, timestamp=None):
+        """Queues the (face crop, context frame) pair of attendance row `log_id`. Returns False if it was dropped."""
+        if not log_id or evidence is None: return False
+        try: self._queue.put_nowait((log_id, employee_id, evidence, timestamp or time.time())); return True
+        except queue.Full:
+            self.dropped += 1; METRICS.increment('evidence_dropped')
+            event_log.warning('evidence', f"Evidence queue full; dropped evidence for log {log_id} ({self.dropped} dropped so far).", sample_key='evidence.dropped')
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None: break
+            try:
+                with METRICS.timer('evidence_write'): self._write(*item)
+            except Exception as e: event_log.error('evidence', f"Saving evidence for log {item[0]} failed: {e}", sample_key='evidence.write')
+
+    def _write(self, log_id, employee_id, evidence, timestamp):
+        face, context = evidence
+        directory = os.path.join(self.evidence_dir, datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')); os.makedirs(directory, exist_ok=True)
+        safe_id = "".join(c if c.isalnum() or c in '-_' else '_' for c in str(employee_id))
+        paths = []
+        for kind, image in (('face', face), ('context', context)):
+            if image is None or image.size == 0: paths.append(None); continue
+            ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok: raise IOError(f"JPEG encoding of the {kind} image failed")
+            path = os.path.join(directory, f"{log_id}_{safe_id}_{kind}.jpg")
+            with open(path, 'wb') as f: f.write(encoded.tobytes())
+            paths.append(path)
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=5.0)
+            conn.execute("INSERT OR REPLACE INTO attendance_evidence (log_id, employee_id, face_path, context_path, created_at) VALUES (?, ?, ?, ?, ?)",
+                         (log_id, employee_id, paths[0], paths[1], datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        finally:
+            if conn: conn.close()
+
+
+def get_evidence(log_id, db_file=DATABASE_FILE):
+    """(face_path, context_path) of an attendance row, or None if no evidence was saved."""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        return conn.execute("SELECT face_path, context_path FROM attendance_evidence WHERE log_id = ?", (log_id,)).fetchone()
+    except sqlite3.Error as e: event_log.error('evidence', f"Reading evidence of log {log_id} failed: {e}"); return None
+    finally:
+        if conn: conn.close()
+
+
+def delete_evidence(employee_id=None, db_file=DATABASE_FILE, evidence_dir=EVIDENCE_DIR):
+    """Removes the evidence of one employee, or all of it (employee_id=None, used by the full data reset)."""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        if employee_id is None:
+            conn.execute("DELETE FROM attendance_evidence"); conn.commit()
+            shutil.rmtree(evidence_dir, ignore_errors=True); return True
+        rows = conn.execute("SELECT face_path, context_path FROM attendance_evidence WHERE employee_id = ?", (employee_id,)).fetchall()
+        for path in (p for row in rows for p in row if p):
+            if os.path.exists(path): os.remove(path)
+        conn.execute("DELETE FROM attendance_evidence WHERE employee_id = ?", (employee_id,)); conn.commit()
+        return True
+    except (sqlite3.Error, OSError) as e:
+        event_log.error('evidence', f"Deleting evidence failed: {e}")
+        if conn: conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
@@ -0,0 +1,2 @@
+# benchmarks package (Offline, CPU-only performance benchmarks - run from the repository root, e.g.
+#   python -m benchmarks.bench_pipeline --help)
@@ -0,0 +1,91 @@
+# benchmarks/bench_detectors.py (Face detector backends compared on replayed footage - offline, CPU only)
+#
+# Runs each backend from face_detectors.py on the same frames and reports detection latency and recall
+# against a reference backend (default 'cnn'): a reference face counts as found when a detected box
+# overlaps it with IoU >= --iou. Extra boxes (no reference face) are reported as well. Examples:
+#   python -m benchmarks.bench_detectors --source recordings/front_door.mp4 --detectors hog,haar,haar:haarcascade_frontalface_alt2.xml
+#   python -m benchmarks.bench_detectors --source samples/frames/ --detectors hog,haar,dnn:models/res10.caffemodel:models/deploy.prototxt
+import argparse
+
+from benchmarks.common import StageTimer, peak_rss_mb, save_results, print_stage_table
+import cv2
+import numpy as np
+
+from face_detectors import create_detector
+from frame_sources import open_frame_source, PLAYBACK_FAST
+
+
+def iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area = lambda box: (box[1] - box[3]) * (box[2] - box[0])
+    union = area(a) + area(b) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_counts(reference, detected, threshold):
+    """(reference faces found, detected boxes matching no reference face), greedy one-to-one matching."""
+    unmatched = list(detected); found = 0
+    for ref_box in reference:
+        scores = [iou(ref_box, box) for box in unmatched]
+        if scores and max(scores) >= threshold: unmatched.pop(int(np.argmax(scores))); found += 1
+    return found, len(unmatched)
+
+
+def load_frames(args):
+    """Decodes the frames once (RGB at --scale) so every backend sees identical input."""
+    source = open_frame_source(args.source, playback=PLAYBACK_FAST)
+    if not source.isOpened(): raise IOError(f"Cannot open source {args.source}")
+    frames = []
+    try:
+        while len(frames) < args.frames:
+            ok, frame = source.read()
+            if not ok: break
+            if args.scale != 1.0: frame = cv2.resize(frame, (0, 0), fx=args.scale, fy=args.scale, interpolation=cv2.INTER_AREA)
+            frames.append(np.ascontiguousarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+    finally:
+        source.release()
+    return frames
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare face detector backends on replayed footage (offline, CPU only).")
+    parser.add_argument('--source', required=True, help="Video file or image folder (see frame_sources.open_frame_source).")
+    parser.add_argument('--detectors', default='hog,haar', help="Comma-separated detector specs (see face_detectors.py).")
+    parser.add_argument('--reference', default='cnn', help="Detector spec whose boxes count as ground truth.")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--scale', type=float, default=0.5, help="Frame downscale before detection, as RECOGNITION_SCALE in the app.")
+    parser.add_argument('--upsample', type=int, default=0, help="Upsample count for backends that support it (dlib).")
+    parser.add_argument('--iou', type=float, default=0.3, help="Overlap needed to count a reference face as found (cascade boxes are tighter).")
+    parser.add_argument('--output', default='bench_detectors.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    frames = load_frames(args)
+    if not frames: print(f"No frames read from {args.source}"); return 1
+    print(f"Computing reference boxes with '{args.reference}' on {len(frames)} frame(s)...")
+    reference_detector = create_detector(args.reference)
+    reference = [reference_detector.detect(frame, upsample=args.upsample) for frame in frames]
+    reference_faces = sum(len(boxes) for boxes in reference)
+
+    runs = []
+    for spec in [d.strip() for d in args.detectors.split(',') if d.strip()]:
+        detector = create_detector(spec); timer = StageTimer(); found = 0; extra = 0; detected = 0
+        for frame, ref_boxes in zip(frames, reference):
+            boxes = timer.time('detect', detector.detect, frame, args.upsample)
+            hits, misses = match_counts(ref_boxes, boxes, args.iou)
+            found += hits; extra += misses; detected += len(boxes)
+        run = {'detector': spec, 'source': args.source, 'frames': len(frames), 'scale': args.scale, 'reference': args.reference,
+               'reference_faces': reference_faces, 'detected': detected, 'found': found, 'extra_boxes': extra,
+               'recall': round(found / reference_faces, 4) if reference_faces else None, 'peak_rss_mb': peak_rss_mb(), 'stages': timer.summary()}
+        print(f"\n--- {spec}: recall {run['recall']} ({found}/{reference_faces}), {extra} extra box(es) ---")
+        print_stage_table(run['stages'])
+        runs.append(run)
+    save_results(args.output, 'detectors', vars(args), runs)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
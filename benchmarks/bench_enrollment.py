@@ -0,0 +1,85 @@
+# benchmarks/bench_enrollment.py (Enrollment detection/encoding latency per strategy on a local photo set - offline, CPU only)
+#
+# Runs face_engine.detect_enrollment_faces + encode_enrollment_face for each strategy over every photo in a
+# folder and reports per-stage latency, how many photos yielded exactly one face, and how far each strategy's
+# encodings are from the legacy full-resolution CNN ('cnn') encodings. Example:
+#   python -m benchmarks.bench_enrollment --photos samples/enroll --strategies pyramid,hog,cnn
+import argparse
+import os
+import time
+
+from benchmarks.common import StageTimer, peak_rss_mb, save_results, print_stage_table
+import cv2
+import numpy as np
+
+from face_engine import detect_enrollment_faces, encode_enrollment_face, largest_face, ENROLLMENT_STRATEGIES
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+
+def list_photos(folder):
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if os.path.splitext(name)[1].lower() in PHOTO_EXTENSIONS]
+
+
+def run_strategy(strategy, photos, repeat):
+    timer = StageTimer(); outcomes = {'one_face': 0, 'multiple_faces': 0, 'no_face': 0, 'unreadable': 0, 'encoding_failed': 0}
+    encodings = {}
+    for _ in range(repeat):
+        for path in photos:
+            start = time.perf_counter()
+            image_bgr = timer.time('decode', cv2.imread, path)
+            if image_bgr is None: outcomes['unreadable'] += 1; continue
+            image_rgb = np.ascontiguousarray(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB))
+            locations = timer.time('detect', detect_enrollment_faces, image_rgb, strategy)
+            if not locations: outcomes['no_face'] += 1; timer.add('total', time.perf_counter() - start); continue
+            outcomes['one_face' if len(locations) == 1 else 'multiple_faces'] += 1
+            encoding = timer.time('encode', encode_enrollment_face, image_rgb, largest_face(locations))
+            timer.add('total', time.perf_counter() - start)
+            if encoding is None: outcomes['encoding_failed'] += 1
+            else: encodings[path] = encoding
+    return timer, outcomes, encodings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Enrollment face detection benchmark per strategy (offline, CPU only).")
+    parser.add_argument('--photos', required=True, help="Folder of enrollment photos (e.g. full-size phone pictures).")
+    parser.add_argument('--strategies', default=','.join(ENROLLMENT_STRATEGIES), help=f"Comma-separated subset of {ENROLLMENT_STRATEGIES}.")
+    parser.add_argument('--repeat', type=int, default=1, help="Passes over the photo set per strategy.")
+    parser.add_argument('--output', default='bench_enrollment.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    photos = list_photos(args.photos)
+    if not photos: print(f"No photos found in {args.photos}"); return 1
+    strategies = [s.strip() for s in args.strategies.split(',') if s.strip()]
+    unknown = [s for s in strategies if s not in ENROLLMENT_STRATEGIES]
+    if unknown: print(f"Unknown strategies: {unknown}"); return 1
+
+    runs = []; encodings_by_strategy = {}
+    for strategy in strategies:
+        print(f"\n--- Strategy '{strategy}' on {len(photos)} photo(s) ---")
+        timer, outcomes, encodings = run_strategy(strategy, photos, args.repeat)
+        encodings_by_strategy[strategy] = encodings
+        run = {'strategy': strategy, 'photos': len(photos), 'repeat': args.repeat, 'outcomes': outcomes,
+               'peak_rss_mb': peak_rss_mb(), 'stages': timer.summary()}
+        print(f"  outcomes: {outcomes}")
+        print_stage_table(run['stages'])
+        runs.append(run)
+
+    # Encoding agreement with the legacy CNN path (same photo, distance as used for matching; < 0.5 counts as a match)
+    reference = encodings_by_strategy.get('cnn')
+    if reference:
+        for run in runs:
+            common = [p for p in encodings_by_strategy[run['strategy']] if p in reference]
+            if not common: continue
+            distances = np.array([np.linalg.norm(encodings_by_strategy[run['strategy']][p] - reference[p]) for p in common])
+            run['distance_to_cnn'] = {'photos': len(common), 'mean': round(float(distances.mean()), 4), 'max': round(float(distances.max()), 4)}
+            print(f"  {run['strategy']}: distance to 'cnn' encodings mean {run['distance_to_cnn']['mean']}, max {run['distance_to_cnn']['max']}")
+    save_results(args.output, 'enrollment', vars(args), runs)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+# benchmarks/bench_gallery.py (Float vs int8 quantized gallery - memory, match latency and agreement; offline, no camera)
+#
+# Builds synthetic galleries, then matches the same queries with the live float path (face_recognition.face_distance
+# over the list of float64 encodings, as face_engine does) and with QuantizedGallery at several re-rank depths.
+# Queries are noisy copies of gallery entries (should match) and fresh encodings (should stay Unknown). Agreement =
+# share of queries where both paths give the same decision (same employee, or both Unknown). Example:
+#   python -m benchmarks.bench_gallery --gallery-sizes 1000,10000,100000 --rerank-k 1,4,8,16
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import StageTimer, peak_rss_mb, synthetic_gallery, save_results, print_stage_table, ENCODING_DIMENSIONS
+import face_recognition
+import numpy as np
+
+from face_engine import MATCH_TOLERANCE
+from quantized_gallery import QuantizedGallery
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Float vs int8 quantized gallery benchmark (offline).")
+    parser.add_argument('--gallery-sizes', default='1000,10000,100000', help="Comma-separated gallery sizes.")
+    parser.add_argument('--rerank-k', default='1,4,8,16', help="Comma-separated re-rank depths for the quantized gallery.")
+    parser.add_argument('--queries', type=int, default=500, help="Queries per gallery size (half genuine, half impostors).")
+    parser.add_argument('--noise', type=float, default=0.03, help="Per-dimension noise of genuine queries (0.03 ~ distance 0.34).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_gallery.json')
+    return parser.parse_args(argv)
+
+
+def float_list_bytes(encodings):
+    """Memory of the live representation: the list plus every float64 array object."""
+    return sys.getsizeof(encodings) + sum(sys.getsizeof(e) for e in encodings)
+
+
+def make_queries(encodings, count, noise, rng):
+    genuine = rng.integers(0, len(encodings), count // 2)
+    queries = [encodings[i] + rng.normal(0.0, noise, ENCODING_DIMENSIONS) for i in genuine]
+    queries += list(rng.normal(0.0, 0.09, size=(count - len(queries), ENCODING_DIMENSIONS))) # Impostors
+    return queries
+
+
+def float_match(encodings, query):
+    distances = face_recognition.face_distance(encodings, query)
+    index = int(np.argmin(distances)); return index, float(distances[index])
+
+
+def decision(ids, index, distance):
+    return ids[index] if index is not None and distance <= MATCH_TOLERANCE else "Unknown"
+
+
+def run_once(args, size, rerank_depths, directory):
+    ids, encodings = synthetic_gallery(size, args.seed)
+    encodings = [e.copy() for e in encodings] # One owning array per employee, as load_known_faces() returns them
+    queries = make_queries(encodings, args.queries, args.noise, np.random.default_rng(args.seed + 1))
+    timer = StageTimer()
+    reference = [timer.time('float', float_match, encodings, q) for q in queries]
+    expected = [decision(ids, i, d) for i, d in reference]
+    build_start = time.perf_counter()
+    gallery = QuantizedGallery.from_encodings(encodings, float_path=os.path.join(directory, f"gallery_{size}.npy"))
+    build_seconds = time.perf_counter() - build_start
+    depths = []
+    for k in rerank_depths:
+        gallery.rerank_k = k; stage = f"int8_k{k}"
+        results = [timer.time(stage, gallery.best_match, q) for q in queries]
+        agree = sum(1 for (i, d), want in zip(results, expected) if decision(ids, i, d) == want)
+        same_best = sum(1 for (i, _), (j, _) in zip(results, reference) if i == j)
+        max_error = max(abs(d - ref_d) for (i, d), (j, ref_d) in zip(results, reference) if i == j) if same_best else None
+        depths.append({'rerank_k': k, 'decision_agreement': round(agree / len(queries), 5), 'same_best_match': round(same_best / len(queries), 5),
+                       'max_distance_error': round(max_error, 7) if max_error is not None else None})
+    stages = timer.summary()
+    memory = {'float_list_bytes': float_list_bytes(encodings), 'int8_resident_bytes': gallery.nbytes(),
+              'float32_file_bytes': os.path.getsize(gallery.float_path)}
+    print(f"\nGallery {size}: float list {memory['float_list_bytes'] / 1e6:.1f} MB, int8 in RAM {memory['int8_resident_bytes'] / 1e6:.2f} MB "
+          f"(+ {memory['float32_file_bytes'] / 1e6:.1f} MB mapped file), quantized in {build_seconds * 1000:.0f} ms")
+    for entry in depths:
+        p50 = stages[f"int8_k{entry['rerank_k']}"]['p50_ms']
+        speedup = f"{stages['float']['p50_ms'] / p50:.1f}x" if p50 else "n/a"
+        print(f"  k={entry['rerank_k']:<3} agreement {entry['decision_agreement']:.2%}  same best match {entry['same_best_match']:.2%}  p50 speedup {speedup}")
+    print_stage_table(stages)
+    del gallery
+    return {'gallery_size': size, 'queries': len(queries), 'memory': memory, 'quantize_ms': round(build_seconds * 1000, 1),
+            'rerank': depths, 'peak_rss_mb': peak_rss_mb(), 'stages': stages}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(v) for v in args.gallery_sizes.split(',') if v.strip()]
+    rerank_depths = [int(v) for v in args.rerank_k.split(',') if v.strip()]
+    directory = tempfile.mkdtemp(prefix='bench_gallery_')
+    try: runs = [run_once(args, size, rerank_depths, directory) for size in sizes]
+    finally: shutil.rmtree(directory, ignore_errors=True)
+    save_results(args.output, 'gallery', vars(args), runs)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
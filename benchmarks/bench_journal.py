@@ -0,0 +1,66 @@
+# benchmarks/bench_journal.py (Sighting journal append latency and range-scan throughput - offline, no camera)
+#
+# Appends synthetic sightings (a few employees, several cameras, one per "frame") into a scratch journal
+# directory, timing every append, then reads back time windows of different widths. Example:
+#   python -m benchmarks.bench_journal --sightings 500000 --segment-records 65536
+import argparse
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import StageTimer, peak_rss_mb, save_results, print_stage_table
+import numpy as np
+
+from sighting_journal import SightingJournal, read_sightings, EMOTIONS
+
+WINDOW_FRACTIONS = (0.001, 0.01, 0.1, 1.0) # Range scans covering this share of the recorded time span
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sighting journal append/scan benchmark (offline).")
+    parser.add_argument('--sightings', type=int, default=200000, help="Sightings appended.")
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--segment-records', type=int, default=65536)
+    parser.add_argument('--fps', type=float, default=15.0, help="Simulated sighting rate (spacing of the synthetic timestamps).")
+    parser.add_argument('--output', default='bench_journal.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    directory = tempfile.mkdtemp(prefix='bench_journal_'); rng = np.random.default_rng(0)
+    employee_ids = [f"SYN{i:06d}" for i in rng.integers(0, args.employees, args.sightings)]
+    cameras = [f"cam{i}" for i in rng.integers(0, 4, args.sightings)]
+    distances = rng.uniform(0.2, 0.6, args.sightings); emotions = rng.integers(0, len(EMOTIONS), args.sightings)
+    start_ts = time.time() - args.sightings / args.fps
+    try:
+        timer = StageTimer()
+        journal = SightingJournal(directory, segment_records=args.segment_records, max_segments=args.sightings // args.segment_records + 2)
+        wall_start = time.perf_counter()
+        for i in range(args.sightings):
+            timer.time('append', journal.append, employee_ids[i], cameras[i], float(distances[i]), EMOTIONS[emotions[i]] or None, start_ts + i / args.fps)
+        append_seconds = time.perf_counter() - wall_start
+        timer.time('flush', journal.flush); journal.close()
+
+        scans = []; span = args.sightings / args.fps
+        for fraction in WINDOW_FRACTIONS:
+            window_start = start_ts + span * (1.0 - fraction) / 2.0
+            begin = time.perf_counter(); rows = read_sightings(window_start, window_start + span * fraction, directory=directory); seconds = time.perf_counter() - begin
+            timer.add(f"scan_{fraction:g}", seconds)
+            scans.append({'fraction': fraction, 'rows': len(rows), 'seconds': round(seconds, 4), 'rows_per_second': round(len(rows) / seconds) if seconds > 0 else None})
+            print(f"  window {fraction:>6.1%}: {len(rows)} sighting(s) in {seconds * 1000:.1f} ms")
+        begin = time.perf_counter(); rows = read_sightings(employee_id=employee_ids[0], directory=directory)
+        timer.add('scan_employee', time.perf_counter() - begin)
+
+        stages = timer.summary()
+        print(f"  {args.sightings} append(s) in {append_seconds:.2f}s = {append_seconds / args.sightings * 1e6:.2f} us/sighting")
+        print_stage_table(stages)
+        run = {'sightings': args.sightings, 'append_us_mean': round(append_seconds / args.sightings * 1e6, 3),
+               'scans': scans, 'peak_rss_mb': peak_rss_mb(), 'stages': stages}
+        save_results(args.output, 'journal', vars(args), [run])
+    finally: shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
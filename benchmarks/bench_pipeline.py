@@ -0,0 +1,144 @@
+# benchmarks/bench_pipeline.py (End-to-end recognition pipeline benchmark - offline, CPU only)
+#
+# Drives FaceRecognitionSystem.recognize_faces_in_frame, detect_emotion_from_face and log_attendance
+# from recorded or synthetic frames against synthetic galleries, and reports per-stage p50/p95/p99
+# latency, frames per second and peak RSS. Examples:
+#   python -m benchmarks.bench_pipeline --face-image samples/a.jpg --faces-per-frame 2 --gallery-sizes 10,1000,100000
+#   python -m benchmarks.bench_pipeline --source recordings/rush_hour.mp4 --frames 500 --output rush_hour.json
+#   python -m benchmarks.bench_pipeline --source recordings/kiosk.mp4 --detection fixed,adaptive --min-face-px 120 --no-emotion --no-db
+import argparse
+import time
+
+from benchmarks.common import (StageTimer, peak_rss_mb, synthetic_gallery, use_scratch_database,
+                               save_results, print_stage_table)
+import cv2
+import face_recognition
+
+import data_manager
+from face_engine import FaceRecognitionSystem, AdaptiveScaleController, crop_face
+from face_quality import QualityGate
+from frame_sources import open_frame_source, SyntheticSource, PLAYBACK_FAST
+
+
+def load_face_images(paths):
+    images = []
+    for path in paths or []:
+        image = cv2.imread(path)
+        if image is None: print(f"Warning: Cannot read face image {path}, skipping."); continue
+        images.append(image)
+    return images
+
+
+def build_gallery(size, face_images, seed=0):
+    """Synthetic gallery of `size` entries; the first entries are replaced by the real encodings of
+       the supplied face images (IDs FACE000...) so that faces in the frames actually match."""
+    ids, encodings = synthetic_gallery(size, seed)
+    slot = 0
+    for image in face_images:
+        if slot >= size: break
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        real = face_recognition.face_encodings(rgb, model='small')
+        if not real: print("Warning: No face found in one of the face images; it will only count as an unknown."); continue
+        ids[slot] = f"FACE{slot:03d}"; encodings[slot] = real[0]; slot += 1
+    return ids, encodings
+
+
+def open_source(args, face_images):
+    if args.source.startswith('synthetic'):
+        width, height = 640, 480
+        if ':' in args.source: width, height = (int(v) for v in args.source.split(':', 1)[1].lower().split('x'))
+        return SyntheticSource(width, height, playback=PLAYBACK_FAST, frame_count=args.frames,
+                               face_images=face_images, faces_per_frame=args.faces_per_frame, seed=args.seed)
+    return open_frame_source(args.source, playback=PLAYBACK_FAST, loop=True)
+
+
+def run_once(args, gallery_size, face_images, detect_emotion_from_face, detection='fixed'):
+    face_system = FaceRecognitionSystem()
+    face_system.set_gallery(*build_gallery(gallery_size, face_images, args.seed))
+    source = open_source(args, face_images)
+    if not source.isOpened(): raise IOError(f"Cannot open source {args.source}")
+
+    scale_controller = AdaptiveScaleController(args.min_face_px) if detection == 'adaptive' else None
+    result_scale = 1.0 if scale_controller else args.scale # Adaptive results are in full-resolution coordinates
+    quality_gate = None if args.no_quality_gate else QualityGate()
+    timer = StageTimer(); frames = 0; faces = 0; recognized = 0; deferred = 0
+    start = time.perf_counter()
+    try:
+        while frames < args.frames:
+            ok, frame = timer.time('capture', source.read)
+            if not ok: break
+            if scale_controller:
+                rgb_frame = timer.time('preprocess', cv2.cvtColor, frame, cv2.COLOR_BGR2RGB)
+                results = timer.time('recognize', face_system.recognize_faces_adaptive, rgb_frame, scale_controller, None, quality_gate)
+            else:
+                rgb_small = timer.time('preprocess', lambda f: cv2.cvtColor(cv2.resize(f, (0, 0), fx=args.scale, fy=args.scale), cv2.COLOR_BGR2RGB), frame)
+                results = timer.time('recognize', face_system.recognize_faces_in_frame, rgb_small, None, quality_gate, args.scale)
+            for employee_id, _, location in results:
+                faces += 1
+                if employee_id is None: deferred += 1; continue # Quality gate: retried on a later frame
+                known = employee_id != "Unknown"
+                if known: recognized += 1
+                if detect_emotion_from_face is not None:
+                    face_crop = crop_face(frame, location, result_scale)
+                    if face_crop is not None: timer.time('emotion', detect_emotion_from_face, face_crop)
+                if known and not args.no_db:
+                    # A unique ID per frame always exercises the INSERT path (the worst case)
+                    timer.time('log_attendance', data_manager.log_attendance, f"{employee_id}_{frames}", "Neutral")
+            frames += 1
+    finally:
+        source.release()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'gallery_size': gallery_size, 'faces_per_frame': args.faces_per_frame, 'source': args.source, 'detection': detection,
+        'scale': args.scale if detection == 'fixed' else None, 'min_face_px': args.min_face_px if detection == 'adaptive' else None,
+        'frames': frames, 'faces': faces, 'recognized': recognized, 'deferred': deferred, 'quality_gate': quality_gate is not None, 'elapsed_s': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else None,
+        'recognition_rate': round(recognized / faces, 4) if faces else None,
+        'peak_rss_mb': peak_rss_mb(), 'stages': timer.summary(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end recognition pipeline benchmark (offline, CPU only).")
+    parser.add_argument('--source', default='synthetic', help="Frame source: 'synthetic[:WxH]', video file or image folder.")
+    parser.add_argument('--face-image', action='append', help="Face photo pasted into synthetic frames and enrolled in the gallery (repeatable).")
+    parser.add_argument('--faces-per-frame', type=int, default=1)
+    parser.add_argument('--gallery-sizes', default='10,1000,10000', help="Comma-separated gallery sizes (10 to 100000).")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--scale', type=float, default=0.5, help="Recognition downscale for 'fixed' detection, as RECOGNITION_SCALE in the app.")
+    parser.add_argument('--detection', default='fixed', help="Comma-separated detection modes to compare: fixed, adaptive.")
+    parser.add_argument('--min-face-px', type=int, default=80, help="Smallest face height for 'adaptive' detection, as MIN_FACE_PX in the app.")
+    parser.add_argument('--no-emotion', action='store_true', help="Skip the emotion stage (avoids loading TensorFlow).")
+    parser.add_argument('--no-db', action='store_true', help="Skip the log_attendance stage.")
+    parser.add_argument('--no-quality-gate', action='store_true', help="Encode every detected face (as the app before the quality gate).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_pipeline.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    gallery_sizes = [int(v) for v in args.gallery_sizes.split(',') if v.strip()]
+    face_images = load_face_images(args.face_image)
+    detect_emotion_from_face = None
+    if not args.no_emotion:
+        from emotion_engine import detect_emotion_from_face # Deferred: imports TensorFlow
+    if not args.no_db: print(f"Using scratch database {use_scratch_database()}")
+
+    runs = []
+    detections = [d.strip() for d in args.detection.split(',') if d.strip()]
+    for gallery_size in gallery_sizes:
+        for detection in detections:
+            print(f"\n--- Gallery size {gallery_size}, {detection} detection ---")
+            run = run_once(args, gallery_size, face_images, detect_emotion_from_face, detection)
+            print(f"  {run['frames']} frames, {run['faces']} faces ({run['recognized']} recognized), {run['fps']} fps, peak RSS {run['peak_rss_mb']} MB")
+            print_stage_table(run['stages'])
+            runs.append(run)
+    # Peak RSS is process-wide, so for clean per-size memory figures run one gallery size per invocation
+    save_results(args.output, 'pipeline', vars(args), runs)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+# benchmarks/common.py (Shared helpers - latency stats, peak RSS, synthetic galleries, scratch DB, JSON results)
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Benchmarks must run offline on CPU only: hide any GPU from TensorFlow/dlib before they are imported
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+ENCODING_DIMENSIONS = 128
+
+
+class StageTimer:
+    """Collects per-stage latencies in seconds."""
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def time(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {stage: summarize_latencies(values) for stage, values in self.samples.items()}
+
+
+def summarize_latencies(values):
+    """count / mean / p50 / p95 / p99 / max in milliseconds."""
+    if not values: return {'count': 0}
+    ms = np.asarray(values, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'count': int(ms.size), 'mean_ms': round(float(ms.mean()), 3), 'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3), 'max_ms': round(float(ms.max()), 3)}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if it can't be determined)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1) # bytes on macOS, KB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil # Windows fallback (optional dependency)
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def synthetic_gallery(size, seed=0):
+    """Random unit-scale 128-d encodings shaped like face_recognition output, with IDs SYN000000..."""
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0.0, 0.09, size=(size, ENCODING_DIMENSIONS)) # Real encodings have norm ~1 (0.09 * sqrt(128))
+    ids = [f"SYN{i:06d}" for i in range(size)]
+    return ids, [encodings[i] for i in range(size)]
+
+
+def use_scratch_database(prefix='bench_'):
+    """Points data_manager/admin_logic/database_setup at a fresh temporary DB and returns its path."""
+    import database_setup, data_manager, admin_logic
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix='.db'); os.close(fd); os.remove(path)
+    for module in (database_setup, data_manager, admin_logic): module.DATABASE_FILE = path
+    database_setup.setup_database()
+    return path
+
+
+def git_revision():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def save_results(path, benchmark_name, args, runs):
+    """Writes results with enough metadata to compare runs across versions and machines."""
+    document = {
+        'benchmark': benchmark_name,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'args': args,
+        'runs': runs,
+    }
+    with open(path, 'w', encoding='utf-8') as f: json.dump(document, f, indent=2)
+    print(f"Results saved to {path}")
+    return document
+
+
+def print_stage_table(stages):
+    print(f"  {'stage':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in stages.items():
+        if not stats.get('count'): continue
+        print(f"  {stage:<22}{stats['count']:>7}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
@@ -0,0 +1,45 @@
+# benchmarks/compare.py (Compare two saved benchmark result files, e.g. before/after a change)
+#   python -m benchmarks.compare baseline.json candidate.json
+import argparse
+import json
+
+RUN_KEY_FIELDS = ('gallery_size', 'faces_per_frame', 'strategy', 'detector', 'detection', 'source')
+
+
+def run_key(run):
+    return tuple((field, run.get(field)) for field in RUN_KEY_FIELDS if field in run)
+
+
+def percent_change(old, new):
+    if old in (None, 0) or new is None: return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(baseline, candidate, metric='p95_ms'):
+    print(f"Baseline : {baseline.get('git_revision')} ({baseline.get('created')})")
+    print(f"Candidate: {candidate.get('git_revision')} ({candidate.get('created')})")
+    base_runs = {run_key(run): run for run in baseline.get('runs', [])}
+    for run in candidate.get('runs', []):
+        key = run_key(run); old = base_runs.get(key)
+        print(f"\n{', '.join(f'{k}={v}' for k, v in key)}")
+        if old is None: print("  (no matching baseline run)"); continue
+        for field in ('fps', 'recognition_rate', 'recall', 'peak_rss_mb'):
+            if field in run: print(f"  {field:<22}{str(old.get(field)):>12}{str(run.get(field)):>12}  {percent_change(old.get(field), run.get(field))}")
+        for stage, stats in run.get('stages', {}).items():
+            old_value = old.get('stages', {}).get(stage, {}).get(metric); new_value = stats.get(metric)
+            print(f"  {stage + ' ' + metric:<22}{str(old_value):>12}{str(new_value):>12}  {percent_change(old_value, new_value)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON result files.")
+    parser.add_argument('baseline'); parser.add_argument('candidate')
+    parser.add_argument('--metric', default='p95_ms', choices=['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding='utf-8') as f: baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f: candidate = json.load(f)
+    compare(baseline, candidate, args.metric)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
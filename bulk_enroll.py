@@ -0,0 +1,199 @@
+# bulk_enroll.py (Parallel bulk enrollment from a CSV manifest or a folder of photos - resumable, batched DB writes)
+#
+#   python bulk_enroll.py staff.csv --workers 8 --report enroll_report.csv
+#   python bulk_enroll.py photos/                  # files named <ID>_<Name>.jpg, e.g. E1001_Jane_Doe.jpg
+#
+# Manifest columns (header row, case-insensitive): employee_id, name, department, photo_path.
+# Relative photo paths are resolved against the manifest's folder. Faces are detected and encoded in a
+# process pool; rows are committed in batches and the photo is copied into employee_photos/. IDs that
+# are already in the database are skipped, so an interrupted run is resumed by running it again.
+import argparse
+import csv
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+
+from database_setup import setup_database
+from data_manager import serialize_encoding, add_employees_batch, get_employee_ids
+from face_engine import detect_enrollment_faces, encode_enrollment_face, largest_face, ENROLLMENT_STRATEGIES, DEFAULT_ENROLLMENT_STRATEGY
+import event_log
+
+EMPLOYEE_PHOTO_DIR = "employee_photos"
+PHOTO_EXTENSIONS = ('.jpg', '.png', '.jpeg', '.bmp')
+IMAGE_EXTENSIONS = PHOTO_EXTENSIONS + ('.webp', '.tif', '.tiff')
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_REPORT_FILE = "bulk_enroll_report.csv"
+REPORT_FIELDS = ('row', 'employee_id', 'name', 'photo_path', 'status', 'detail')
+COLUMN_ALIASES = {
+    'employee_id': ('employee_id', 'id', 'emp_id'),
+    'name': ('name', 'employee_name'),
+    'department': ('department', 'dept'),
+    'photo_path': ('photo_path', 'photo', 'image', 'path'),
+}
+
+
+def safe_photo_name(employee_id):
+    """Same sanitisation as the GUI's get_employee_photo_path, so the admin tabs find the photo."""
+    return "".join(c if c.isalnum() or c in ['-', '_'] else '_' for c in str(employee_id))
+
+
+def read_manifest(path):
+    """Returns [{'row', 'employee_id', 'name', 'department', 'photo_path'}] from a CSV manifest or a photo folder."""
+    entries = []
+    if os.path.isdir(path):
+        for i, file_name in enumerate(sorted(os.listdir(path)), start=1):
+            stem, ext = os.path.splitext(file_name)
+            if ext.lower() not in IMAGE_EXTENSIONS: continue
+            employee_id, _, name = stem.partition('_')
+            entries.append({'row': i, 'employee_id': employee_id.strip(), 'name': name.replace('_', ' ').strip() or employee_id.strip(),
+                            'department': None, 'photo_path': os.path.join(path, file_name)})
+        return entries
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        columns = {(name or '').strip().lower(): name for name in (reader.fieldnames or [])}
+        mapping = {field: next((columns[a] for a in aliases if a in columns), None) for field, aliases in COLUMN_ALIASES.items()}
+        if mapping['employee_id'] is None or mapping['photo_path'] is None:
+            raise ValueError(f"Manifest needs at least employee_id and photo_path columns (found {reader.fieldnames}).")
+        for i, record in enumerate(reader, start=2): # Row numbers as shown in a spreadsheet (header is row 1)
+            value = lambda field: (record.get(mapping[field]) or '').strip() if mapping[field] else ''
+            photo_path = value('photo_path')
+            if photo_path and not os.path.isabs(photo_path): photo_path = os.path.join(base_dir, photo_path)
+            entries.append({'row': i, 'employee_id': value('employee_id'), 'name': value('name') or value('employee_id'),
+                            'department': value('department') or None, 'photo_path': photo_path})
+    return entries
+
+
+def encode_photo(photo_path, strategy=DEFAULT_ENROLLMENT_STRATEGY, allow_multiple=False):
+    """Worker (runs in a child process): returns (status, detail, serialized_encoding)."""
+    try:
+        image_bgr = cv2.imread(photo_path)
+        if image_bgr is None: return 'unreadable_image', "OpenCV could not read the file", None
+        image_rgb = np.ascontiguousarray(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB))
+        face_locations = detect_enrollment_faces(image_rgb, strategy)
+        if not face_locations: return 'no_face', "No face found", None
+        if len(face_locations) > 1 and not allow_multiple: return 'multiple_faces', f"{len(face_locations)} faces found", None
+        encoding = encode_enrollment_face(image_rgb, largest_face(face_locations))
+        if encoding is None: return 'encoding_failed', "Could not generate a face encoding", None
+        return 'ok', None, serialize_encoding(encoding)
+    except Exception as e:
+        return 'error', f"{type(e).__name__}: {e}", None
+
+
+def copy_employee_photo(employee_id, source_path, photo_dir=EMPLOYEE_PHOTO_DIR):
+    """Copies the enrollment photo to <photo_dir>/<safe id><ext>; other formats are re-encoded as .jpg."""
+    os.makedirs(photo_dir, exist_ok=True)
+    ext = os.path.splitext(source_path)[1].lower()
+    base_path = os.path.join(photo_dir, safe_photo_name(employee_id))
+    if ext in PHOTO_EXTENSIONS:
+        shutil.copy2(source_path, base_path + ext); return base_path + ext
+    image = cv2.imread(source_path)
+    if image is None or not cv2.imwrite(base_path + '.jpg', image): raise OSError(f"Cannot convert {source_path} to JPEG")
+    return base_path + '.jpg'
+
+
+def has_employee_photo(employee_id, photo_dir=EMPLOYEE_PHOTO_DIR):
+    base_path = os.path.join(photo_dir, safe_photo_name(employee_id))
+    return any(os.path.exists(base_path + ext) for ext in PHOTO_EXTENSIONS)
+
+
+class BulkEnrollment:
+    """Runs one bulk enrollment pass and writes the failure report as it goes."""
+    def __init__(self, entries, workers=None, batch_size=DEFAULT_BATCH_SIZE, strategy=DEFAULT_ENROLLMENT_STRATEGY, allow_multiple=False,
+                 photo_dir=EMPLOYEE_PHOTO_DIR, copy_photos=True):
+        self.entries = entries; self.workers = workers or os.cpu_count() or 1; self.batch_size = max(1, batch_size)
+        self.strategy = strategy; self.allow_multiple = allow_multiple; self.photo_dir = photo_dir; self.copy_photos = copy_photos
+        self.counts = {'enrolled': 0, 'skipped_existing': 0, 'failed': 0}
+        self._report_writer = None; self._report_file = None
+
+    def fail(self, entry, status, detail):
+        self.counts['failed'] += 1
+        self._report_writer.writerow({'row': entry['row'], 'employee_id': entry['employee_id'], 'name': entry['name'],
+                                      'photo_path': entry['photo_path'], 'status': status, 'detail': detail or ''})
+        self._report_file.flush() # Keep the report usable even if the run is killed
+
+    def select_pending(self):
+        """Drops invalid rows, duplicate IDs within the manifest and IDs already in the database (resume)."""
+        existing_ids = get_employee_ids(); seen = set(); pending = []
+        for entry in self.entries:
+            employee_id = entry['employee_id']
+            if not employee_id: self.fail(entry, 'invalid_row', "Missing employee_id"); continue
+            if not entry['photo_path'] or not os.path.isfile(entry['photo_path']): self.fail(entry, 'missing_photo', "Photo file not found"); continue
+            if employee_id in seen: self.fail(entry, 'duplicate_id', "Employee ID appears earlier in the manifest"); continue
+            seen.add(employee_id)
+            if employee_id in existing_ids:
+                self.counts['skipped_existing'] += 1
+                # A crash between the batch commit and the photo copy leaves the photo missing: finish that step now
+                if self.copy_photos and not has_employee_photo(employee_id, self.photo_dir): self.store_photo(entry)
+                continue
+            pending.append(entry)
+        return pending
+
+    def store_photo(self, entry):
+        try: copy_employee_photo(entry['employee_id'], entry['photo_path'], self.photo_dir)
+        except OSError as e: self.fail(entry, 'photo_copy_failed', f"Enrolled, but the photo was not copied: {e}")
+
+    def flush_batch(self, batch):
+        if not batch: return
+        by_id = {entry['employee_id']: entry for entry, _ in batch}
+        results = add_employees_batch([(entry['employee_id'], entry['name'], entry['department'], encoding) for entry, encoding in batch])
+        for employee_id, inserted, error in results:
+            entry = by_id[employee_id]
+            if not inserted: self.fail(entry, 'db_error', error); continue
+            self.counts['enrolled'] += 1
+            if self.copy_photos: self.store_photo(entry)
+
+    def run(self, report_path=DEFAULT_REPORT_FILE):
+        start = time.perf_counter()
+        with open(report_path, 'w', newline='', encoding='utf-8') as self._report_file:
+            self._report_writer = csv.DictWriter(self._report_file, fieldnames=REPORT_FIELDS); self._report_writer.writeheader()
+            pending = self.select_pending()
+            event_log.info('bulk_enroll', f"{len(self.entries)} manifest rows: {len(pending)} to enroll, {self.counts['skipped_existing']} already enrolled, {self.counts['failed']} invalid. Using {self.workers} worker process(es).")
+            batch = []; done = 0
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(encode_photo, entry['photo_path'], self.strategy, self.allow_multiple): entry for entry in pending}
+                for future in as_completed(futures):
+                    entry = futures[future]; done += 1
+                    try: status, detail, encoding = future.result()
+                    except Exception as e: status, detail, encoding = 'error', f"Worker failed: {e}", None # e.g. a crashed child process
+                    if status == 'ok': batch.append((entry, encoding))
+                    else: self.fail(entry, status, detail)
+                    if len(batch) >= self.batch_size: self.flush_batch(batch); batch = []
+                    if done % self.batch_size == 0:
+                        elapsed = time.perf_counter() - start
+                        event_log.info('bulk_enroll', f"Processed {done}/{len(pending)} photos ({done / elapsed:.1f} photos/s), {self.counts['enrolled']} enrolled, {self.counts['failed']} failed.")
+                self.flush_batch(batch)
+        elapsed = time.perf_counter() - start
+        self.counts['elapsed_s'] = round(elapsed, 1)
+        event_log.info('bulk_enroll', f"Bulk enrollment finished in {elapsed:.1f}s: {self.counts['enrolled']} enrolled, {self.counts['skipped_existing']} already enrolled, {self.counts['failed']} failed (see {report_path}).")
+        return self.counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll many employees at once from a CSV manifest or a folder of <ID>_<Name>.jpg photos.")
+    parser.add_argument("manifest", help="CSV manifest (employee_id, name, department, photo_path) or a folder of photos.")
+    parser.add_argument("--workers", type=int, help="Detection/encoding processes (default: CPU count).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Employees committed per database transaction.")
+    parser.add_argument("--strategy", choices=ENROLLMENT_STRATEGIES, default=DEFAULT_ENROLLMENT_STRATEGY, help="Face detection strategy ('cnn' = full-resolution CNN, slow on CPU).")
+    parser.add_argument("--allow-multiple", action="store_true", help="Enroll the largest face instead of rejecting photos with several faces.")
+    parser.add_argument("--report", default=DEFAULT_REPORT_FILE, help="CSV file listing every row that was not enrolled.")
+    parser.add_argument("--photo-dir", default=EMPLOYEE_PHOTO_DIR)
+    parser.add_argument("--no-copy", dest="copy_photos", action="store_false", help="Don't copy photos into the photo folder.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try: entries = read_manifest(args.manifest)
+    except (OSError, ValueError, csv.Error) as e: event_log.error('bulk_enroll', f"Cannot read manifest {args.manifest}: {e}"); return 1
+    setup_database()
+    counts = BulkEnrollment(entries, workers=args.workers, batch_size=args.batch_size, strategy=args.strategy, allow_multiple=args.allow_multiple,
+                            photo_dir=args.photo_dir, copy_photos=args.copy_photos).run(args.report)
+    return 0 if counts['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+# camera_manager.py (Multi-camera ingestion - N capture threads sharing one gallery, worker pool and attendance writer)
+import datetime
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+from data_manager import log_attendance, get_employee_name, get_employees_logged_today
+from face_engine import crop_face, AdaptiveScaleController
+from attendance_evidence import prepare_evidence
+from face_detectors import create_detector
+from face_quality import QualityGate
+from emotion_engine import detect_emotion_from_face
+from frame_pacer import FramePacer
+from perf_metrics import METRICS
+import event_log
+from frame_sources import open_frame_source, Backoff, PLAYBACK_REALTIME, PLAYBACK_FAST
+
+DEFAULT_RECOGNITION_SCALE = 0.5
+DEFAULT_LOG_COOLDOWN_SECONDS = 10
+DEFAULT_MAX_RECOGNITION_FPS = 6 # Per camera; a camera is never scheduled more often than this
+
+
+class CameraFeed:
+    """Capture thread for one source. Keeps only the newest frame; older frames are simply replaced."""
+    def __init__(self, name, source, target_fps=30, playback=PLAYBACK_REALTIME, loop_replay=False):
+        self.name = name; self.source = source; self.playback = playback; self.loop_replay = loop_replay
+        self.pacer = FramePacer(target_fps)
+        self.scale_controller = None # Per-camera AdaptiveScaleController, set by CameraManager when adaptive detection is on
+        self.detector = None         # Per-camera face detector backend (None = the face system's default)
+        self.quality_gate = None     # Per-camera QualityGate (tracks deferred faces between this camera's frames)
+        self.connected = False
+        self.last_results = [] # Latest recognition results for this camera (recognition-scale coordinates)
+        # Scheduling state, only touched by the CameraManager dispatcher/workers
+        self.busy = False; self.last_processed_seq = 0; self.last_processed_time = 0.0
+        self._lock = threading.Lock(); self._frame = None; self._seq = 0
+        self._thread = None
+
+    def start(self, stop_event):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), name=f"capture-{self.name}", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread: self._thread.join(timeout)
+
+    def latest(self):
+        """Returns (sequence_number, frame). The frame object is never modified after publishing."""
+        with self._lock: return self._seq, self._frame
+
+    def _open(self):
+        cap = open_frame_source(self.source, playback=self.playback, loop=self.loop_replay)
+        if cap.isOpened(): return cap
+        cap.release()
+        return None
+
+    def _run(self, stop_event):
+        cap = None; backoff = Backoff() # Reconnect delay grows while the camera stays unavailable
+        try:
+            while not stop_event.is_set():
+                if cap is None:
+                    cap = self._open()
+                    if cap is None:
+                        delay = backoff.next_delay()
+                        event_log.warning('camera_manager', f"Camera '{self.name}' ({self.source}) failed to open. Retrying in {delay:.1f}s.", sample_key=f'camera_manager.open.{self.name}')
+                        stop_event.wait(delay); continue
+                    event_log.info('camera_manager', f"Camera '{self.name}' opened ({self.source})."); self.connected = True
+                self.pacer.begin_iteration()
+                self.pacer.drain_stale_frames(cap)
+                with METRICS.timer('capture'): ret, frame = cap.read()
+                if not ret or frame is None:
+                    if cap.exhausted: event_log.info('camera_manager', f"Replay on '{self.name}' finished."); break
+                    event_log.warning('camera_manager', f"Can't receive frame from camera '{self.name}'. Reopening.", sample_key=f'camera_manager.read.{self.name}')
+                    cap.release(); cap = None; self.connected = False; stop_event.wait(backoff.next_delay()); continue
+                backoff.reset()
+                with self._lock: self._frame = frame; self._seq += 1
+                self.pacer.mark_capture()
+                if self.playback == PLAYBACK_FAST and not cap.is_live:
+                    # As-fast-as-possible replay: no pacing, but never overwrite a frame before it was picked up
+                    while self.last_processed_seq < self._seq and not stop_event.is_set(): stop_event.wait(0.001)
+                    continue
+                self.pacer.end_iteration(stop_event)
+        finally:
+            if cap is not None: cap.release()
+            self.connected = False; event_log.info('camera_manager', f"Camera '{self.name}' released.")
+
+
+class AttendanceState:
+    """'Already logged today' set and per-employee cooldown, shared by every camera."""
+    def __init__(self, log_cooldown_seconds=DEFAULT_LOG_COOLDOWN_SECONDS):
+        self.log_cooldown_seconds = log_cooldown_seconds
+        self._lock = threading.Lock()
+        self._day = datetime.date.today()
+        self._logged_today = get_employees_logged_today()
+        self._last_attempt = {}
+
+    def should_attempt(self, employee_id, now=None):
+        """True if this employee should be logged now; reserves the attempt so other cameras back off."""
+        now = time.time() if now is None else now
+        with self._lock:
+            today = datetime.date.today()
+            if today != self._day: self._day = today; self._logged_today = set(); self._last_attempt = {}
+            if employee_id in self._logged_today: return False
+            if now - self._last_attempt.get(employee_id, 0) <= self.log_cooldown_seconds: return False
+            self._last_attempt[employee_id] = now
+            return True
+
+    def mark_logged(self, employee_id):
+        with self._lock: self._logged_today.add(employee_id)
+
+
+class AttendanceWriter:
+    """Single thread that owns all attendance DB writes, so cameras never contend on the database."""
+    def __init__(self, state, on_logged=None, evidence=None):
+        self.state = state; self.on_logged = on_logged; self.evidence = evidence # Optional attendance_evidence.EvidenceWriter
+        self._queue = queue.Queue(); self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True); self._thread.start()
+
+    def submit(self, employee_id, emotion_str, camera_name, evidence=None):
+        self._queue.put((employee_id, emotion_str, camera_name, evidence))
+
+    def stop(self, timeout=5.0):
+        self._queue.put(None) # Sentinel: everything queued before it is still written
+        if self._thread: self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None: break
+            employee_id, emotion_str, camera_name, evidence = item
+            try:
+                log_id = log_attendance(employee_id, emotion_str)
+                if log_id:
+                    self.state.mark_logged(employee_id)
+                    if self.evidence: self.evidence.submit(log_id, employee_id, evidence)
+                    event_log.info('camera_manager', f"[{camera_name}] Welcome {get_employee_name(employee_id)}! Attendance marked ({emotion_str}).", employee_id=employee_id, camera=camera_name)
+                    if self.on_logged: self.on_logged(employee_id, emotion_str, camera_name)
+            except Exception as e: event_log.error('camera_manager', f"Error writing attendance for {employee_id}: {e}", sample_key='camera_manager.write')
+
+
+class CameraManager:
+    """Opens N sources and fairly shares one recognition/emotion worker pool between them.
+
+    A dispatcher hands the newest unprocessed frame of each camera to the pool in
+    round-robin order, with at most one in-flight job per camera, so when the CPU
+    is saturated every camera gets an equal share and stale frames are skipped
+    rather than queued.
+    """
+    def __init__(self, face_system, sources, worker_count=2, recognition_scale=DEFAULT_RECOGNITION_SCALE,
+                 max_recognition_fps=DEFAULT_MAX_RECOGNITION_FPS, detect_emotion=True,
+                 log_cooldown_seconds=DEFAULT_LOG_COOLDOWN_SECONDS, target_fps=30, playback=PLAYBACK_REALTIME, loop_replay=False,
+                 adaptive_detection=True, min_face_px=80, detector=None, quality_gate=True, on_faces=None, journal=None, presence=None, evidence=None):
+        self.face_system = face_system # Shared gallery; reloads swap its lists in place
+        self.on_faces = on_faces       # Called with (camera name, face count) whenever a processed frame has faces
+        self.journal = journal         # Optional sighting_journal.SightingJournal: every recognition, not only the daily log
+        self.presence = presence       # Optional presence_tracker.PresenceTracker: sessions and live occupancy
+        # sources: [(name, source)] or [(name, source, detector spec)]; the per-camera spec overrides `detector`
+        self.feeds = [CameraFeed(entry[0], entry[1], target_fps, playback, loop_replay) for entry in sources]
+        for feed, entry in zip(self.feeds, sources):
+            spec = entry[2] if len(entry) > 2 and entry[2] else detector
+            if not spec: continue
+            try: feed.detector = create_detector(spec) # One instance per camera: backends keep per-call state
+            except (ValueError, cv2.error) as e: event_log.error('camera_manager', f"Detector '{spec}' for camera '{feed.name}' unavailable ({e}); using the default.")
+        self.worker_count = max(1, int(worker_count))
+        self.recognition_scale = recognition_scale
+        self.adaptive_detection = adaptive_detection
+        if quality_gate:
+            for feed in self.feeds: feed.quality_gate = QualityGate()
+        if adaptive_detection:
+            for feed in self.feeds: feed.scale_controller = AdaptiveScaleController(min_face_px) # Face sizes differ per camera
+        self.min_process_interval = 1.0 / max_recognition_fps if max_recognition_fps else 0.0
+        self.detect_emotion = detect_emotion
+        self.state = AttendanceState(log_cooldown_seconds)
+        self.writer = AttendanceWriter(self.state, evidence=evidence)
+        self.stop_event = threading.Event()
+        self._slots = threading.Semaphore(self.worker_count)
+        self._executor = None; self._dispatcher = None; self._next_feed = 0
+
+    def start(self):
+        self.stop_event.clear()
+        if self.writer.evidence: self.writer.evidence.start()
+        self.writer.start()
+        self._executor = ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix="recognition")
+        for feed in self.feeds: feed.start(self.stop_event)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="camera-dispatcher", daemon=True); self._dispatcher.start()
+        event_log.info('camera_manager', f"Camera manager started: {len(self.feeds)} camera(s), {self.worker_count} recognition worker(s).")
+
+    def stop(self):
+        self.stop_event.set()
+        if self._dispatcher: self._dispatcher.join(2.0)
+        for feed in self.feeds: feed.join(2.0)
+        if self._executor: self._executor.shutdown(wait=True)
+        self.writer.stop()
+        if self.writer.evidence: self.writer.evidence.stop() # After the writer: it may still queue evidence
+        event_log.info('camera_manager', "Camera manager stopped.")
+
+    def _next_ready_feed(self):
+        """Round-robin pick of a camera that is idle, has a new frame and is not over its rate limit."""
+        now = time.time(); count = len(self.feeds)
+        for offset in range(count):
+            index = (self._next_feed + offset) % count; feed = self.feeds[index]
+            if feed.busy or now - feed.last_processed_time < self.min_process_interval: continue
+            seq, frame = feed.latest()
+            if frame is None or seq == feed.last_processed_seq: continue
+            self._next_feed = (index + 1) % count
+            return feed, seq, frame
+        return None
+
+    def _dispatch_loop(self):
+        while not self.stop_event.is_set():
+            if not self._slots.acquire(timeout=0.1): continue
+            picked = self._next_ready_feed()
+            if picked is None:
+                self._slots.release(); self.stop_event.wait(0.005); continue
+            feed, seq, frame = picked
+            feed.busy = True; feed.last_processed_seq = seq; feed.last_processed_time = time.time()
+            try: self._executor.submit(self._process_frame, feed, frame)
+            except RuntimeError: feed.busy = False; self._slots.release(); break # Executor shut down
+
+    def _process_frame(self, feed, frame):
+        try:
+            if feed.scale_controller is not None:
+                scale = 1.0 # Boxes come back in full-resolution coordinates
+                with METRICS.timer('color_convert'): rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                results = self.face_system.recognize_faces_adaptive(rgb_frame, feed.scale_controller, feed.detector, feed.quality_gate)
+            else:
+                scale = self.recognition_scale
+                with METRICS.timer('resize'): small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+                with METRICS.timer('color_convert'): rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+                results = self.face_system.recognize_faces_in_frame(rgb_small_frame, feed.detector, feed.quality_gate, scale)
+            feed.last_results = results
+            if results and self.on_faces: self.on_faces(feed.name, len(results))
+            for employee_id, distance, location in results:
+                if not employee_id or employee_id == "Unknown": continue
+                if self.presence: self.presence.note_sighting(employee_id, feed.name)
+                if not self.state.should_attempt(employee_id):
+                    if self.journal: self.journal.append(employee_id, feed.name, distance)
+                    continue
+                emotion_str = "N/A"; emotion = None
+                if self.detect_emotion:
+                    face_crop = crop_face(frame, location, scale, padding=15)
+                    if face_crop is None: event_log.warning('camera_manager', f"Invalid face crop dimensions for {employee_id}", sample_key='camera_manager.crop'); continue
+                    emotion = detect_emotion_from_face(face_crop)
+                    emotion_str = emotion.capitalize() if emotion else "Undetected"
+                if self.journal: self.journal.append(employee_id, feed.name, distance, emotion)
+                self.writer.submit(employee_id, emotion_str, feed.name, prepare_evidence(frame, location, scale) if self.writer.evidence else None)
+        except Exception as e: event_log.error('camera_manager', f"Error processing frame from camera '{feed.name}': {e}", sample_key=f'camera_manager.process.{feed.name}')
+        finally:
+            feed.pacer.mark_process(); feed.busy = False; self._slots.release()
+
+    def get_status_summary(self):
+        parts = []
+        for feed in self.feeds:
+            state = feed.pacer.get_fps_summary() if feed.connected else "disconnected"
+            parts.append(f"{feed.name}: {state}")
+        return "; ".join(parts)
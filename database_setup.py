@@ -1,92 +1,176 @@
-# database_setup.py (Added Department column and Cascade Delete)
-import sqlite3
-import hashlib
-import os
-
-DATABASE_FILE = 'attendance_system.db'
-DEFAULT_ADMIN_PASSWORD = 'admin'
-
-def setup_database():
-    """Creates/Updates the database and necessary tables.
-       Adds 'department' column if missing. Ensures cascade delete.
-    """
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-
-        # --- Employees Table ---
-        # Check if 'department' column exists first
-        cursor.execute("PRAGMA table_info(employees)")
-        columns = [info[1] for info in cursor.fetchall()]
-        employees_table_exists = 'employee_id' in columns # Basic check if table exists
-
-        if not employees_table_exists:
-             # Create employees table if it doesn't exist at all
-             print("Creating employees table...")
-             cursor.execute('''
-                 CREATE TABLE employees (
-                     employee_id TEXT PRIMARY KEY NOT NULL,
-                     name TEXT NOT NULL,
-                     face_encoding BLOB NOT NULL,
-                     department TEXT  -- Added Department column
-                 )
-             ''')
-        elif 'department' not in columns:
-             # Add 'department' column if the table exists but column is missing
-             print("Adding 'department' column to employees table...")
-             cursor.execute("ALTER TABLE employees ADD COLUMN department TEXT")
-
-
-        # --- Attendance Logs Table ---
-        # Recreate table definition string with ON DELETE CASCADE
-        attendance_logs_create_sql = '''
-            CREATE TABLE IF NOT EXISTS attendance_logs (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                detected_emotion TEXT,
-                FOREIGN KEY(employee_id) REFERENCES employees(employee_id) ON DELETE CASCADE -- Added Cascade Delete
-            )
-        '''
-        # Check if table exists and foreign key needs update (complex to check pragmatically)
-        # Simplest approach for setup script: Create if not exists with the desired FK constraint.
-        # For existing databases, manually altering FKs can be complex.
-        # This setup primarily ensures new databases are correct.
-        cursor.execute(attendance_logs_create_sql)
-
-
-        # --- Config Table (Unchanged) ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS config (
-                key TEXT PRIMARY KEY NOT NULL,
-                value TEXT NOT NULL
-            )
-        ''')
-
-        # --- Admin Password (Unchanged) ---
-        cursor.execute("SELECT value FROM config WHERE key = 'admin_password_hash'")
-        if cursor.fetchone() is None:
-            print(f"Setting default admin password '{DEFAULT_ADMIN_PASSWORD}'...")
-            salt = os.urandom(16); hashed_password = hashlib.pbkdf2_hmac('sha256', DEFAULT_ADMIN_PASSWORD.encode('utf-8'), salt, 100000)
-            salt_hex = salt.hex(); hashed_password_hex = hashed_password.hex()
-            cursor.execute("INSERT INTO config (key, value) VALUES (?, ?)", ('admin_password_salt', salt_hex))
-            cursor.execute("INSERT INTO config (key, value) VALUES (?, ?)", ('admin_password_hash', hashed_password_hex))
-            print("Default admin password set securely.")
-
-        conn.commit()
-        print(f"Database '{DATABASE_FILE}' setup/update/verification complete.")
-
-    except sqlite3.Error as e:
-        print(f"Database setup/update error: {e}")
-        if conn: conn.rollback() # Rollback changes on error
-    except Exception as e:
-        print(f"An unexpected error occurred during database setup/update: {e}")
-        if conn: conn.rollback()
-    finally:
-        if conn: conn.close()
-
-if __name__ == '__main__':
-    print("Running database setup/update...")
-    setup_database()
+# database_setup.py (Added Department column and Cascade Delete)
+import sqlite3
+import hashlib
+import os
+
+DATABASE_FILE = 'attendance_system.db'
+DEFAULT_ADMIN_PASSWORD = 'admin'
+
+def setup_database():
+    """Creates/Updates the database and necessary tables.
+       Adds 'department' column if missing. Ensures cascade delete.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        # WAL lets the camera threads write while reports read; incremental auto-vacuum lets db_maintenance.py return
+        # free pages in small steps (takes effect on new databases; existing ones switch with 'python db_maintenance.py --convert', one full VACUUM)
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode = WAL")
+
+        # --- Employees Table ---
+        # Check if 'department' column exists first
+        cursor.execute("PRAGMA table_info(employees)")
+        columns = [info[1] for info in cursor.fetchall()]
+        employees_table_exists = 'employee_id' in columns # Basic check if table exists
+
+        if not employees_table_exists:
+             # Create employees table if it doesn't exist at all
+             print("Creating employees table...")
+             cursor.execute('''
+                 CREATE TABLE employees (
+                     employee_id TEXT PRIMARY KEY NOT NULL,
+                     name TEXT NOT NULL,
+                     face_encoding BLOB NOT NULL,
+                     department TEXT,  -- Added Department column
+                     face_encoding_shadow BLOB, -- Written by gallery_rebuild.py, swapped into face_encoding when a rebuild finishes
+                     face_encoding_shadow_hash TEXT -- SHA-256 of the photo the shadow was computed from
+                 )
+             ''')
+        elif 'department' not in columns:
+             # Add 'department' column if the table exists but column is missing
+             print("Adding 'department' column to employees table...")
+             cursor.execute("ALTER TABLE employees ADD COLUMN department TEXT")
+        if employees_table_exists and 'face_encoding_shadow' not in columns:
+             print("Adding 'face_encoding_shadow' column to employees table...")
+             cursor.execute("ALTER TABLE employees ADD COLUMN face_encoding_shadow BLOB")
+        if employees_table_exists and 'face_encoding_shadow_hash' not in columns:
+             print("Adding 'face_encoding_shadow_hash' column to employees table...")
+             cursor.execute("ALTER TABLE employees ADD COLUMN face_encoding_shadow_hash TEXT")
+
+
+        # --- Attendance Logs Table ---
+        # Recreate table definition string with ON DELETE CASCADE
+        attendance_logs_create_sql = '''
+            CREATE TABLE IF NOT EXISTS attendance_logs (
+                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                detected_emotion TEXT,
+                FOREIGN KEY(employee_id) REFERENCES employees(employee_id) ON DELETE CASCADE -- Added Cascade Delete
+            )
+        '''
+        # Check if table exists and foreign key needs update (complex to check pragmatically)
+        # Simplest approach for setup script: Create if not exists with the desired FK constraint.
+        # For existing databases, manually altering FKs can be complex.
+        # This setup primarily ensures new databases are correct.
+        cursor.execute(attendance_logs_create_sql)
+
+
+        # --- Archive Manifest (attendance_archive.py) ---
+        # One row per closed month moved out of attendance_logs into its own read-only SQLite file
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive_partitions (
+                period TEXT PRIMARY KEY NOT NULL, -- 'YYYY-MM'
+                file_path TEXT NOT NULL,
+                first_date TEXT NOT NULL,
+                last_date TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                archived_at TEXT NOT NULL
+            )
+        ''')
+
+
+        # --- Presence Sessions (presence_tracker.py) ---
+        # First/last sighting of each continuous stretch of presence; written in batches from the in-memory tracker
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS presence_sessions (
+                session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id TEXT NOT NULL,
+                day TEXT NOT NULL, -- 'YYYY-MM-DD'
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                first_camera TEXT,
+                last_camera TEXT,
+                sightings INTEGER NOT NULL DEFAULT 1,
+                UNIQUE (employee_id, first_seen),
+                FOREIGN KEY(employee_id) REFERENCES employees(employee_id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_day ON presence_sessions (day, employee_id)")
+
+
+        # --- Attendance Evidence (attendance_evidence.py) ---
+        # Face crop + context JPEGs saved for each attendance row; log_id survives archiving, so no foreign key here
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_evidence (
+                log_id INTEGER PRIMARY KEY NOT NULL,
+                employee_id TEXT NOT NULL,
+                face_path TEXT,
+                context_path TEXT,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_evidence_employee ON attendance_evidence (employee_id)")
+
+
+        # --- Unknown Visitors (unknown_faces.py) ---
+        # Daily count of distinct unknown faces (clusters seen at least a few times that day)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS unknown_visitors (
+                day TEXT PRIMARY KEY NOT NULL, -- 'YYYY-MM-DD'
+                visitors INTEGER NOT NULL,
+                sightings INTEGER NOT NULL
+            )
+        ''')
+
+
+        # --- Encoding Cache (gallery_rebuild.py) ---
+        # Encoding (or failure) of each employee photo, keyed by its content hash and the encoder settings used
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS encoding_cache (
+                photo_hash TEXT NOT NULL, -- SHA-256 of the photo file
+                encoder TEXT NOT NULL,    -- gallery_rebuild.encoder_signature()
+                status TEXT NOT NULL,     -- 'ok' or the failure reason
+                face_encoding BLOB,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (photo_hash, encoder)
+            )
+        ''')
+
+
+        # --- Config Table (Unchanged) ---
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS config (
+                key TEXT PRIMARY KEY NOT NULL,
+                value TEXT NOT NULL
+            )
+        ''')
+
+        # --- Admin Password (Unchanged) ---
+        cursor.execute("SELECT value FROM config WHERE key = 'admin_password_hash'")
+        if cursor.fetchone() is None:
+            print(f"Setting default admin password '{DEFAULT_ADMIN_PASSWORD}'...")
+            salt = os.urandom(16); hashed_password = hashlib.pbkdf2_hmac('sha256', DEFAULT_ADMIN_PASSWORD.encode('utf-8'), salt, 100000)
+            salt_hex = salt.hex(); hashed_password_hex = hashed_password.hex()
+            cursor.execute("INSERT INTO config (key, value) VALUES (?, ?)", ('admin_password_salt', salt_hex))
+            cursor.execute("INSERT INTO config (key, value) VALUES (?, ?)", ('admin_password_hash', hashed_password_hex))
+            print("Default admin password set securely.")
+
+        conn.commit()
+        print(f"Database '{DATABASE_FILE}' setup/update/verification complete.")
+
+    except sqlite3.Error as e:
+        print(f"Database setup/update error: {e}")
+        if conn: conn.rollback() # Rollback changes on error
+    except Exception as e:
+        print(f"An unexpected error occurred during database setup/update: {e}")
+        if conn: conn.rollback()
+    finally:
+        if conn: conn.close()
+
+if __name__ == '__main__':
+    print("Running database setup/update...")
+    setup_database()
     print("Database setup/update script finished.")
\ No newline at end of file
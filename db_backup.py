@@ -0,0 +1,201 @@
+# db_backup.py (Online database backup with SQLite's backup API - small page steps, verified snapshots, rotation, restore)
+#
+# Copying attendance_system.db with the file system while a camera thread writes can produce a torn copy.
+# Snapshots here go through the online backup API: BACKUP_PAGES pages per step with a short sleep in between
+# (taken in the progress callback: the API's own `sleep` only applies to steps that found the database locked),
+# so the copy never holds the database for long (in WAL mode readers don't block the writer at all; in rollback
+# mode a writer waits at most one step). Each snapshot is written to a temp file, checked with
+# PRAGMA integrity_check and only then renamed into place; the oldest snapshots beyond `keep` are deleted.
+# Snapshots are switched to journal_mode=DELETE (the live database is WAL), so opening one never leaves -wal/-shm
+# files next to it; rotation and failed backups remove any such sidecar files as well.
+# Reported per backup: duration, pages, steps, restarts (source changed mid-copy) and the longest/mean step,
+# which is the worst-case writer stall. A write from another connection restarts a stepped copy; after
+# BACKUP_MAX_RESTARTS the copy is done in one step instead (a consistent read snapshot that, in WAL mode, still
+# doesn't block the writer). Archive partitions (attendance_archive.py) are never modified after
+# they are written, so a plain file copy of archive/ is enough for them.
+#   python db_backup.py backup                 snapshot now into backups/ (keeps the newest 7)
+#   python db_backup.py list
+#   python db_backup.py verify backups/attendance_20260105_020000.db
+#   python db_backup.py restore backups/attendance_20260105_020000.db   (stop the app first)
+import argparse
+import glob
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+from database_setup import DATABASE_FILE
+import event_log
+
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7                 # Snapshots kept by rotation
+BACKUP_PAGES = 64               # Pages per backup step (256 KB at the default page size)
+BACKUP_SLEEP_SECONDS = 0.01     # Pause between steps so writers get the database in between
+BACKUP_MAX_RESTARTS = 3         # Stepped copies restarted this often (busy writer) fall back to a single-step copy
+BACKUP_INTERVAL_HOURS = 24      # Scheduled snapshot interval (BackupScheduler)
+BACKUP_FILE_PREFIX = "attendance_"
+SIDECAR_SUFFIXES = ('-wal', '-shm', '-journal') # Files SQLite may create next to a database
+
+
+def integrity_check(path):
+    """Runs PRAGMA integrity_check on a database file. Returns (ok, first problem or 'ok')."""
+    conn = None
+    try:
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+        return rows == [('ok',)], rows[0][0] if rows else 'no result'
+    except sqlite3.Error as e: return False, str(e)
+    finally:
+        if conn: conn.close()
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def remove_database_file(path):
+    """Deletes a database file and its -wal/-shm/-journal files (missing ones are fine)."""
+    for file_path in (path,) + tuple(path + suffix for suffix in SIDECAR_SUFFIXES):
+        if os.path.exists(file_path): os.remove(file_path)
+
+
+def copy_database(source_path, target_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP_SECONDS, max_restarts=BACKUP_MAX_RESTARTS, journal_mode='DELETE'):
+    """Copies a live database with the online backup API, then sets the copy's journal mode (None = keep the source's).
+       Returns the step statistics."""
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0, 'max_step_ms': 0.0, 'total_step_ms': 0.0, 'single_step': pages < 0}
+    last = [time.perf_counter(), None] # (end of the previous step's pause, pages remaining then)
+    def progress(status, remaining, total):
+        step_ms = (time.perf_counter() - last[0]) * 1000
+        stats['steps'] += 1; stats['pages'] = total; stats['max_step_ms'] = max(stats['max_step_ms'], step_ms); stats['total_step_ms'] += step_ms
+        if last[1] is not None and remaining > last[1]: # Source written by another connection: the copy started over
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts: raise _TooManyRestarts()
+        last[1] = remaining
+        if remaining and sleep > 0: time.sleep(sleep) # Between steps the source is unlocked and writers get their turn
+        last[0] = time.perf_counter()
+    source = sqlite3.connect(source_path, timeout=5.0); target = sqlite3.connect(target_path)
+    try:
+        try: source.backup(target, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            stats['single_step'] = True; last[0] = time.perf_counter(); last[1] = None
+            source.backup(target, pages=-1, progress=progress)
+        if journal_mode: target.execute(f"PRAGMA journal_mode = {journal_mode}").fetchall() # A standalone file: no WAL to leave behind
+    finally: target.close(); source.close()
+    stats['mean_step_ms'] = stats['total_step_ms'] / stats['steps'] if stats['steps'] else 0.0
+    return stats
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Snapshot paths, oldest first (the timestamped names sort chronologically)."""
+    return sorted(glob.glob(os.path.join(backup_dir, f"{BACKUP_FILE_PREFIX}*.db")))
+
+
+def rotate_backups(backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    removed = []
+    for path in list_backups(backup_dir)[:-keep] if keep > 0 else []:
+        try: remove_database_file(path); removed.append(path)
+        except OSError as e: event_log.warning('backup', f"Could not delete old snapshot {path}: {e}")
+    for suffix in SIDECAR_SUFFIXES: # Left by older versions (WAL-mode snapshots) or interrupted backups
+        for sidecar in glob.glob(os.path.join(backup_dir, f"{BACKUP_FILE_PREFIX}*{suffix}")):
+            if not os.path.exists(sidecar[:-len(suffix)]):
+                try: os.remove(sidecar)
+                except OSError as e: event_log.warning('backup', f"Could not delete {sidecar}: {e}")
+    return removed
+
+
+def backup_database(db_file=DATABASE_FILE, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP_SECONDS):
+    """Takes one verified snapshot and rotates old ones. Returns a report dict, or None if it failed."""
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S'); path = os.path.join(backup_dir, f"{BACKUP_FILE_PREFIX}{stamp}.db")
+    suffix = 1
+    while os.path.exists(path): path = os.path.join(backup_dir, f"{BACKUP_FILE_PREFIX}{stamp}_{suffix}.db"); suffix += 1 # Same second
+    tmp_path = f"{path}.tmp"
+    start = time.perf_counter()
+    try:
+        stats = copy_database(db_file, tmp_path, pages, sleep)
+        copy_seconds = time.perf_counter() - start
+        ok, detail = integrity_check(tmp_path)
+        if not ok: raise sqlite3.DatabaseError(f"integrity_check failed on the copy: {detail}")
+        os.replace(tmp_path, path)
+    except (sqlite3.Error, OSError) as e:
+        event_log.error('backup', f"Backup of {db_file} failed: {e}")
+        try: remove_database_file(tmp_path)
+        except OSError as cleanup_error: event_log.warning('backup', f"Could not delete {tmp_path}: {cleanup_error}")
+        return None
+    report = dict(stats, path=path, size=os.path.getsize(path), copy_seconds=round(copy_seconds, 3),
+                  total_seconds=round(time.perf_counter() - start, 3), removed=rotate_backups(backup_dir, keep))
+    report['max_step_ms'] = round(report['max_step_ms'], 2); report['mean_step_ms'] = round(report['mean_step_ms'], 2); del report['total_step_ms']
+    event_log.info('backup', f"Snapshot {path}: {report['pages']} pages in {report['copy_seconds']:.2f}s ({report['steps']} steps, "
+                             f"{report['restarts']} restarts), longest step {report['max_step_ms']:.1f} ms (worst-case writer stall), verified in "
+                             f"{report['total_seconds'] - report['copy_seconds']:.2f}s.", **{k: v for k, v in report.items() if k != 'removed'})
+    return report
+
+
+def restore_database(backup_path, db_file=DATABASE_FILE, backup_dir=BACKUP_DIR):
+    """Replaces the live database with a verified snapshot. The current database is snapshotted first.
+       Stop the GUI/headless service before restoring: their open connections would keep working on old data."""
+    ok, detail = integrity_check(backup_path)
+    if not ok: event_log.error('backup', f"Not restoring {backup_path}: integrity_check failed ({detail})."); return False
+    if os.path.exists(db_file) and backup_database(db_file, backup_dir, keep=0) is None: # keep=0: never rotate away the safety copy
+        event_log.error('backup', "Not restoring: could not snapshot the current database first."); return False
+    start = time.perf_counter()
+    try: copy_database(backup_path, db_file, pages=-1, sleep=0, journal_mode='WAL') # Through SQLite, so the WAL and locks are handled properly
+    except sqlite3.Error as e: event_log.error('backup', f"Restore from {backup_path} failed: {e}"); return False
+    event_log.info('backup', f"Restored {db_file} from {backup_path} in {time.perf_counter() - start:.2f}s.")
+    return True
+
+
+class BackupScheduler:
+    """Takes a snapshot every `interval_hours` (counted from the newest existing snapshot) in a background thread."""
+    def __init__(self, db_file=DATABASE_FILE, backup_dir=BACKUP_DIR, interval_hours=BACKUP_INTERVAL_HOURS, keep=BACKUP_KEEP, check_seconds=60.0):
+        self.db_file = db_file; self.backup_dir = backup_dir; self.interval_seconds = interval_hours * 3600
+        self.keep = keep; self.check_seconds = check_seconds
+        self._stop_event = threading.Event(); self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True); self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread: self._thread.join(timeout)
+
+    def is_due(self):
+        snapshots = list_backups(self.backup_dir)
+        return not snapshots or time.time() - os.path.getmtime(snapshots[-1]) >= self.interval_seconds
+
+    def _run(self):
+        while not self._stop_event.wait(self.check_seconds):
+            if self.is_due(): backup_database(self.db_file, self.backup_dir, self.keep)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Online backup, verification and restore of the attendance database.")
+    parser.add_argument('--dir', default=BACKUP_DIR, help="Snapshot directory.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup = commands.add_parser('backup', help="Take a verified snapshot now.")
+    backup.add_argument('--keep', type=int, default=BACKUP_KEEP, help="Snapshots kept by rotation (0 = keep all).")
+    commands.add_parser('list', help="List snapshots.")
+    verify = commands.add_parser('verify', help="Run integrity_check on a snapshot.")
+    verify.add_argument('path')
+    restore = commands.add_parser('restore', help="Replace the database with a snapshot (stop the app first).")
+    restore.add_argument('path')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'backup': return 0 if backup_database(backup_dir=args.dir, keep=args.keep) else 1
+    if args.command == 'list':
+        for path in list_backups(args.dir): print(f"{path}  {os.path.getsize(path) / 1024:.0f} KB  {datetime.fromtimestamp(os.path.getmtime(path)):%Y-%m-%d %H:%M}")
+        return 0
+    if args.command == 'verify':
+        ok, detail = integrity_check(args.path); print(f"{args.path}: {detail}"); return 0 if ok else 1
+    return 0 if restore_database(args.path, backup_dir=args.dir) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+# db_maintenance.py (Background SQLite maintenance - ANALYZE, PRAGMA optimize, incremental vacuum, WAL checkpoints in idle windows)
+#
+# Kiosks run for months without anyone touching the database. DatabaseMaintenance runs the housekeeping steps
+# below when the cameras have seen no face for `idle_seconds`, each step at most once per its interval. A window
+# is time-boxed (`budget_seconds`) and is abandoned as soon as a face shows up again: a SQLite progress handler
+# interrupts the running statement, which then rolls back cleanly. Every step logs its duration and the database
+# size (main file + WAL) before and after. Last run times are kept in the config table, so restarts don't reset them.
+#   python db_maintenance.py            run the due steps now (no idle check)
+#   python db_maintenance.py --all      run every step now
+#   python db_maintenance.py --convert  switch an older database to incremental vacuum (one full VACUUM, no time box)
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from database_setup import setup_database, DATABASE_FILE
+import event_log
+
+IDLE_SECONDS = 600          # No face seen for this long = idle window
+BUDGET_SECONDS = 30.0       # Wall-clock cap for one maintenance window
+CHECK_SECONDS = 30.0        # How often the scheduler thread looks for an idle window
+INCREMENTAL_VACUUM_PAGES = 500 # Pages freed per incremental_vacuum call (checked against the budget between calls)
+PROGRESS_OPCODES = 10000    # SQLite VM instructions between budget/activity checks
+# (step, minimum seconds between runs) in execution order; the vacuum writes to the WAL, so the checkpoint comes last
+MAINTENANCE_STEPS = (('analyze', 7 * 86400), ('optimize', 86400), ('incremental_vacuum', 86400), ('wal_checkpoint', 3600))
+
+
+def database_size(db_file=DATABASE_FILE):
+    """Bytes used by the database file plus its WAL."""
+    return sum(os.path.getsize(path) for path in (db_file, f"{db_file}-wal") if os.path.exists(path))
+
+
+class DatabaseMaintenance:
+    """Idle-window maintenance scheduler. Call note_activity() whenever a camera sees a face."""
+    def __init__(self, db_file=DATABASE_FILE, idle_seconds=IDLE_SECONDS, budget_seconds=BUDGET_SECONDS,
+                 check_seconds=CHECK_SECONDS, steps=MAINTENANCE_STEPS, convert_vacuum=False):
+        self.db_file = db_file; self.idle_seconds = idle_seconds; self.budget_seconds = budget_seconds # None = no time box
+        self.check_seconds = check_seconds; self.steps = steps
+        self.convert_vacuum = convert_vacuum # Allow the one-time full VACUUM that enables incremental vacuum
+        self.last_activity = time.monotonic() # Startup counts as activity: the first window opens after idle_seconds
+        self._stop_event = threading.Event(); self._thread = None
+
+    def note_activity(self, *_):
+        self.last_activity = time.monotonic()
+
+    def is_idle(self):
+        return time.monotonic() - self.last_activity >= self.idle_seconds
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True); self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread: self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop_event.wait(self.check_seconds):
+            if self.is_idle(): self.run_window()
+
+    # --- One maintenance window ---
+    def run_window(self, force=False, steps=None):
+        """Runs the due steps (all of `steps` when force=True) within the budget. Returns [(step, seconds, size_before, size_after, status)]."""
+        window_start = time.monotonic(); results = []; conn = None
+        deadline = window_start + self.budget_seconds if self.budget_seconds is not None else float('inf')
+        activity_mark = self.last_activity
+        def should_abort(): return time.monotonic() > deadline or self._stop_event.is_set() or (not force and self.last_activity != activity_mark)
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=1.0, isolation_level=None) # Autocommit: each step is its own transaction
+            conn.set_progress_handler(lambda: 1 if should_abort() else 0, PROGRESS_OPCODES)
+            last_runs = dict(conn.execute("SELECT key, value FROM config WHERE key LIKE 'maintenance.%'").fetchall())
+            for step, interval in self.steps:
+                if steps is not None and step not in steps: continue
+                if not force and time.time() - float(last_runs.get(f"maintenance.{step}", 0)) < interval: continue
+                if should_abort(): results.append((step, 0.0, None, None, 'skipped')); continue
+                size_before = database_size(self.db_file); start = time.perf_counter()
+                try: getattr(self, f"_{step}")(conn, should_abort); status = 'ok'
+                except sqlite3.OperationalError as e: status = 'interrupted' if 'interrupt' in str(e) else f"error: {e}"
+                seconds = time.perf_counter() - start; size_after = database_size(self.db_file)
+                if status == 'ok':
+                    conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", (f"maintenance.{step}", str(time.time())))
+                event_log.info('maintenance', f"{step}: {status} in {seconds * 1000:.0f} ms, database {size_before / 1024:.0f} -> {size_after / 1024:.0f} KB.",
+                               step=step, status=status, duration_ms=round(seconds * 1000, 1), size_before=size_before, size_after=size_after)
+                results.append((step, seconds, size_before, size_after, status))
+        except sqlite3.Error as e:
+            event_log.warning('maintenance', f"Maintenance window skipped: {e}", sample_key='maintenance.window')
+        finally:
+            if conn: conn.close()
+        return results
+
+    # --- Steps (each raises sqlite3.OperationalError 'interrupted' when the window is cut short) ---
+    def _analyze(self, conn, should_abort):
+        conn.execute("ANALYZE")
+
+    def _optimize(self, conn, should_abort):
+        conn.execute("PRAGMA optimize")
+
+    def _incremental_vacuum(self, conn, should_abort):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Databases created before incremental vacuum was enabled need one full VACUUM to switch modes. It rewrites the
+            # whole file, so it never runs inside an idle window (it would be cut off by the budget and retried every day).
+            if not self.convert_vacuum:
+                event_log.warning('maintenance', "Incremental vacuum is not enabled on this database; run 'python db_maintenance.py --convert' once while the kiosk is closed.",
+                                  sample_key='maintenance.auto_vacuum'); return
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL"); conn.execute("VACUUM"); return
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0 and not should_abort():
+            conn.execute(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})").fetchall()
+
+    def _wal_checkpoint(self, conn, should_abort):
+        if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal':
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall() # Gives up after the 1s busy timeout if a reader/writer holds the WAL
+
+
+MAINTENANCE = DatabaseMaintenance() # Shared scheduler for the GUI and the headless service
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run SQLite maintenance (ANALYZE, optimize, incremental vacuum, WAL checkpoint) now.")
+    parser.add_argument('--all', action='store_true', help="Run every step, not only the ones that are due.")
+    parser.add_argument('--budget', type=float, default=300.0, help="Time box in seconds for this run.")
+    parser.add_argument('--convert', action='store_true', help="Switch the database to incremental vacuum with one full VACUUM (no time box).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_database()
+    if args.convert:
+        maintenance = DatabaseMaintenance(budget_seconds=None, convert_vacuum=True)
+        results = maintenance.run_window(force=True, steps=('incremental_vacuum', 'wal_checkpoint'))
+    else:
+        maintenance = DatabaseMaintenance(budget_seconds=args.budget)
+        results = maintenance.run_window(force=args.all)
+    if not results: print("Nothing due.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
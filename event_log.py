@@ -0,0 +1,137 @@
+# event_log.py (Leveled, rate-limited structured event log - in-memory ring buffer + asynchronous console/file sink)
+import atexit
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+RING_BUFFER_SIZE = 2000       # Events kept in memory for post-mortems
+SINK_QUEUE_SIZE = 10000       # Events waiting for the writer thread; beyond this new events are dropped (and counted)
+SAMPLE_WINDOW_SECONDS = 10.0  # Repetitive events sharing a sample_key...
+SAMPLE_BURST = 3              # ...are let through at most this many times per window
+
+
+class EventLog:
+    """Structured event log whose hot path never does I/O.
+
+    log() stamps the event, applies per-key sampling, appends it to a ring buffer and hands it to a
+    background writer thread that prints to the console and/or appends JSON lines to a file.
+    Events with a `sample_key` (e.g. per-frame warnings) are limited to SAMPLE_BURST per
+    SAMPLE_WINDOW_SECONDS; the next event let through carries a `suppressed` count.
+    """
+    def __init__(self, ring_size=RING_BUFFER_SIZE, console_level=INFO):
+        self.console_level = console_level
+        self.file_level = DEBUG
+        self.file_path = None
+        self.dropped = 0
+        self._ring = deque(maxlen=ring_size)
+        self._queue = queue.Queue(maxsize=SINK_QUEUE_SIZE)
+        self._samples = {} # sample_key -> [window_start, count_in_window, suppressed]
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def configure(self, console_level=None, file_path=None, file_level=None):
+        if console_level is not None: self.console_level = LEVELS_BY_NAME.get(str(console_level).upper(), console_level)
+        if file_level is not None: self.file_level = LEVELS_BY_NAME.get(str(file_level).upper(), file_level)
+        if file_path is not None: self.file_path = file_path or None
+
+    def log(self, level, source, message, sample_key=None, **fields):
+        now = time.time()
+        if sample_key is not None:
+            with self._lock:
+                state = self._samples.get(sample_key)
+                if state is None or now - state[0] >= SAMPLE_WINDOW_SECONDS:
+                    suppressed = state[2] if state else 0
+                    state = self._samples[sample_key] = [now, 0, 0]
+                    if suppressed: fields['suppressed'] = suppressed
+                if state[1] >= SAMPLE_BURST: state[2] += 1; return
+                state[1] += 1
+        event = {'time': now, 'level': level, 'source': source, 'message': message}
+        if fields: event['fields'] = fields
+        self._ring.append(event) # Always kept for post-mortems, even if no sink wants it
+        if level < self.console_level and (self.file_path is None or level < self.file_level): return
+        self._ensure_writer()
+        try: self._queue.put_nowait(event)
+        except queue.Full: self.dropped += 1
+
+    def debug(self, source, message, **fields): self.log(DEBUG, source, message, **fields)
+    def info(self, source, message, **fields): self.log(INFO, source, message, **fields)
+    def warning(self, source, message, **fields): self.log(WARNING, source, message, **fields)
+    def error(self, source, message, **fields): self.log(ERROR, source, message, **fields)
+
+    def recent(self, count=100, min_level=DEBUG):
+        """The last `count` events at or above `min_level`, oldest first (copies, safe to keep)."""
+        events = [dict(e) for e in list(self._ring) if e['level'] >= min_level]
+        return events[-count:]
+
+    def dump_recent(self, path, count=RING_BUFFER_SIZE, min_level=DEBUG):
+        """Writes the ring buffer to a JSON-lines file for a post-mortem. Returns the number of events written."""
+        events = self.recent(count, min_level)
+        with open(path, 'w', encoding='utf-8') as f:
+            for event in events: f.write(json.dumps(self._to_record(event), default=str) + '\n')
+        return len(events)
+
+    def flush(self, timeout=2.0):
+        """Blocks until the writer has handled everything queued so far (used at shutdown)."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline: time.sleep(0.01)
+
+    # --- Writer thread ---
+    def _ensure_writer(self):
+        if self._writer is not None: return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True); self._writer.start()
+
+    def _write_loop(self):
+        file_handle = None; open_path = None
+        while True:
+            event = self._queue.get()
+            try:
+                if event['level'] >= self.console_level: print(self._format_console(event))
+                if self.file_path and event['level'] >= self.file_level:
+                    if open_path != self.file_path:
+                        if file_handle: file_handle.close()
+                        file_handle = open(self.file_path, 'a', encoding='utf-8', buffering=64 * 1024); open_path = self.file_path
+                    file_handle.write(json.dumps(self._to_record(event), default=str) + '\n')
+                if file_handle and self._queue.empty(): file_handle.flush() # Flush only when idle: batches writes under load
+            except Exception as e: print(f"Event log writer error: {e}")
+            finally: self._queue.task_done()
+
+    @staticmethod
+    def _to_record(event):
+        record = {'time': datetime.fromtimestamp(event['time']).isoformat(timespec='milliseconds'),
+                  'level': LEVEL_NAMES.get(event['level'], str(event['level'])), 'source': event['source'], 'message': event['message']}
+        record.update(event.get('fields', {}))
+        return record
+
+    @staticmethod
+    def _format_console(event):
+        text = f"[{LEVEL_NAMES.get(event['level'], event['level'])}] {event['source']}: {event['message']}"
+        fields = event.get('fields')
+        if fields:
+            detail = fields.get('traceback')
+            extra = " ".join(f"{k}={v}" for k, v in fields.items() if k != 'traceback')
+            if extra: text += f" ({extra})"
+            if detail: text += "\n" + detail
+        return text
+
+
+EVENTS = EventLog()
+atexit.register(EVENTS.flush)
+
+
+# --- Module-level shortcuts: event_log.info('face_engine', 'Loaded gallery', count=12) ---
+def debug(source, message, **fields): EVENTS.log(DEBUG, source, message, **fields)
+def info(source, message, **fields): EVENTS.log(INFO, source, message, **fields)
+def warning(source, message, **fields): EVENTS.log(WARNING, source, message, **fields)
+def error(source, message, **fields): EVENTS.log(ERROR, source, message, **fields)
@@ -0,0 +1,110 @@
+# face_detectors.py (Pluggable face detector backends - dlib HOG/CNN, OpenCV cascades from cv2.data, optional OpenCV DNN)
+#
+# Every backend takes an RGB uint8 image and returns face boxes as (top, right, bottom, left), the same
+# format face_recognition uses, so any of them can feed face_recognition.face_encodings. Specs:
+#   'hog'                                   dlib HOG (the default)
+#   'cnn'                                   dlib CNN (accurate, slow on CPU)
+#   'haar' / 'haar:<cascade file>'          OpenCV cascade; bare file names are looked up in cv2.data.haarcascades,
+#                                           so LBP cascades work too when given a path
+#   'dnn:<model file>[:<config file>]'      OpenCV DNN: res10 SSD (.caffemodel + deploy.prototxt) or YuNet (.onnx)
+import os
+import cv2
+import face_recognition
+import numpy as np
+
+DETECTOR_BACKENDS = ('hog', 'cnn', 'haar', 'dnn')
+DEFAULT_DETECTOR = 'hog'
+DEFAULT_CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+DNN_CONFIDENCE = 0.6
+DNN_INPUT_SIZE = (300, 300)
+
+
+class FaceDetector:
+    """Base class. `window_px` is the smallest face (px, in the image it is given) the backend finds at upsample 0;
+       AdaptiveScaleController uses it to size the scan. `stage` is the perf_metrics stage name."""
+    name = 'base'
+    window_px = 80
+    supports_upsample = False
+    stage = 'detection'
+
+    def detect(self, rgb_image, upsample=0):
+        raise NotImplementedError
+
+
+class DlibHogDetector(FaceDetector):
+    name = 'hog'; window_px = 80; supports_upsample = True; stage = 'hog_detection'
+
+    def detect(self, rgb_image, upsample=0):
+        return face_recognition.face_locations(rgb_image, number_of_times_to_upsample=upsample, model='hog')
+
+
+class DlibCnnDetector(FaceDetector):
+    name = 'cnn'; window_px = 40; supports_upsample = True; stage = 'cnn_detection'
+
+    def detect(self, rgb_image, upsample=0):
+        return face_recognition.face_locations(rgb_image, number_of_times_to_upsample=upsample, model='cnn')
+
+
+class OpenCVCascadeDetector(FaceDetector):
+    """Viola-Jones cascade (Haar or LBP). Cheapest backend; frontal faces only, more false positives."""
+    name = 'haar'; stage = 'cascade_detection'
+
+    def __init__(self, cascade_file=DEFAULT_CASCADE_FILE, scale_factor=1.1, min_neighbors=5, min_size=40):
+        path = cascade_file if os.path.isfile(cascade_file) else os.path.join(cv2.data.haarcascades, cascade_file)
+        self.classifier = cv2.CascadeClassifier(path)
+        if self.classifier.empty(): raise ValueError(f"Cannot load cascade classifier '{cascade_file}' (looked for {path}).")
+        self.scale_factor = scale_factor; self.min_neighbors = min_neighbors
+        self.min_size = min_size; self.window_px = min_size
+
+    def detect(self, rgb_image, upsample=0):
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY))
+        boxes = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in boxes]
+
+
+class OpenCVDnnDetector(FaceDetector):
+    """OpenCV DNN detector from a local model file: res10 SSD (Caffe) or YuNet (ONNX, OpenCV >= 4.5.4)."""
+    name = 'dnn'; window_px = 24; stage = 'dnn_detection'
+
+    def __init__(self, model_path, config_path=None, confidence=DNN_CONFIDENCE, input_size=DNN_INPUT_SIZE):
+        if not os.path.isfile(model_path): raise ValueError(f"DNN face model not found: {model_path}")
+        self.confidence = confidence; self.input_size = input_size; self._yunet = None; self._net = None
+        if model_path.lower().endswith('.onnx') and hasattr(cv2, 'FaceDetectorYN'):
+            self._yunet = cv2.FaceDetectorYN.create(model_path, "", input_size, confidence)
+        else:
+            self._net = cv2.dnn.readNet(model_path, config_path or "")
+
+    def detect(self, rgb_image, upsample=0):
+        h, w = rgb_image.shape[:2]
+        bgr = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR)
+        if self._yunet is not None:
+            self._yunet.setInputSize((w, h))
+            _, faces = self._yunet.detect(bgr)
+            boxes = [] if faces is None else [(x, y, x + bw, y + bh) for x, y, bw, bh in faces[:, :4]]
+        else:
+            self._net.setInput(cv2.dnn.blobFromImage(cv2.resize(bgr, self.input_size), 1.0, self.input_size, (104.0, 177.0, 123.0)))
+            detections = self._net.forward()[0, 0]
+            detections = detections[detections[:, 2] >= self.confidence]
+            boxes = detections[:, 3:7] * np.array([w, h, w, h])
+        faces = []
+        for x1, y1, x2, y2 in boxes:
+            left, top = max(0, int(x1)), max(0, int(y1)); right, bottom = min(w, int(x2)), min(h, int(y2))
+            if right > left and bottom > top: faces.append((top, right, bottom, left))
+        return faces
+
+
+def create_detector(spec=DEFAULT_DETECTOR):
+    """Builds a detector from a spec string (see the file header) or returns `spec` if it already is one."""
+    if isinstance(spec, FaceDetector): return spec
+    backend, _, argument = (spec or DEFAULT_DETECTOR).partition(':')
+    backend = backend.strip().lower()
+    if backend == 'hog': return DlibHogDetector()
+    if backend == 'cnn': return DlibCnnDetector()
+    if backend in ('haar', 'lbp', 'cascade'): return OpenCVCascadeDetector(argument or DEFAULT_CASCADE_FILE)
+    if backend == 'dnn':
+        if not argument: raise ValueError("The 'dnn' detector needs a model file: 'dnn:<model>[:<config>]'.")
+        model_path, _, config_path = argument.partition(':')
+        if len(model_path) == 1 and config_path: # Windows drive letter, e.g. dnn:C:\models\res10.caffemodel
+            drive_rest, _, config_path = config_path.partition(':'); model_path = f"{model_path}:{drive_rest}"
+        return OpenCVDnnDetector(model_path, config_path or None)
+    raise ValueError(f"Unknown face detector '{spec}' (expected one of {DETECTOR_BACKENDS}).")
@@ -1,53 +1,234 @@
-# face_engine.py (Added Input Validation)
-import face_recognition
-import numpy as np
-import cv2 # Only needed if doing CV operations here
-
-class FaceRecognitionSystem:
-    def __init__(self):
-        """Initializes the system with empty lists for known faces."""
-        self.known_face_ids = []
-        self.known_face_encodings = []
-        print("FaceRecognitionSystem initialized (waiting for known faces).")
-
-    def recognize_faces_in_frame(self, rgb_frame_input):
-        """Detects and recognizes faces in a single frame (HOG model)."""
-        # Input Validation
-        if not isinstance(rgb_frame_input, np.ndarray): print("Error face_engine: Input not numpy array."); return []
-        if rgb_frame_input.ndim != 3: print(f"Error face_engine: Wrong dimensions ({rgb_frame_input.ndim})"); return []
-        if rgb_frame_input.shape[2] != 3: print(f"Error face_engine: Wrong channels ({rgb_frame_input.shape[2]})"); return []
-        if rgb_frame_input.dtype != np.uint8:
-            print(f"Error face_engine: Wrong dtype ({rgb_frame_input.dtype}). Trying conversion.")
-            try: rgb_frame_input = rgb_frame_input.astype(np.uint8, copy=False); print("Info: Converted frame to uint8.")
-            except Exception as e: print(f"Error face_engine: Convert frame failed: {e}"); return []
-
-        rgb_frame = np.ascontiguousarray(rgb_frame_input)
-        face_locations = []
-        face_encodings = []
-
-        try: # Find faces using HOG (faster but less accurate than CNN)
-            face_locations = face_recognition.face_locations(rgb_frame, model='hog')
-        except RuntimeError as rte: print(f"!!! RUNTIME ERROR face_locations (hog): {rte}"); print(f"Input frame: dtype={rgb_frame.dtype}, shape={rgb_frame.shape}, flags={rgb_frame.flags}"); return []
-        except Exception as e: print(f"!!! UNEXPECTED ERROR face_locations (hog): {e}"); return []
-
-        if face_locations and self.known_face_encodings: # Encode faces if found and known faces exist
-            try: face_encodings = face_recognition.face_encodings(rgb_frame, face_locations) # Uses 'small' model by default
-            except Exception as e: print(f"Error during face_encodings: {e}"); return [('Unknown', None, loc) for loc in face_locations]
-
-        # Recognition logic
-        recognized_faces = []
-        for i, loc in enumerate(face_locations):
-            employee_id = "Unknown"
-            if self.known_face_encodings and i < len(face_encodings):
-                 current_face_encoding = face_encodings[i]
-                 matches = face_recognition.compare_faces(self.known_face_encodings, current_face_encoding, tolerance=0.5) # Adjust tolerance if needed
-                 face_distances = face_recognition.face_distance(self.known_face_encodings, current_face_encoding)
-                 if face_distances.size > 0:
-                      best_match_index = np.argmin(face_distances)
-                      if matches[best_match_index]:
-                           employee_id = self.known_face_ids[best_match_index]
-            recognized_faces.append((employee_id, None, loc)) # Append result (ID or Unknown)
-        return recognized_faces
-
-# --- Example Usage (Keep commented out) ---
+# face_engine.py (Added Input Validation)
+import threading
+import time
+from collections import deque
+import face_recognition
+import numpy as np
+import cv2 # Only needed if doing CV operations here
+from perf_metrics import METRICS
+from face_detectors import create_detector, DEFAULT_DETECTOR
+from quantized_gallery import QuantizedGallery
+import event_log
+
+MATCH_TOLERANCE = 0.5 # Maximum encoding distance for a match (face_recognition's default is 0.6; lower = stricter)
+ENCODING_MODEL = 'small' # face_recognition landmark model for live and enrollment encodings; after changing it run gallery_rebuild.py
+
+class FaceRecognitionSystem:
+    def __init__(self, detector=DEFAULT_DETECTOR):
+        """Initializes the system with empty lists for known faces.
+           `detector` is the default backend (face_detectors spec or instance); callers may pass one per camera."""
+        # (IDs, encodings, version), only ever replaced as a whole by set_gallery(): a match never pairs one gallery's IDs
+        # with another's encodings. Encodings are a list, a quantized_gallery.QuantizedGallery, or a shared_gallery (n, 128) array view.
+        self._gallery = ([], [], 0); self._gallery_lock = threading.Lock()
+        self.unknown_store = None # Optional unknown_faces.UnknownFaceStore: clusters unmatched faces, skips gallery scans for returning ones
+        self.detector = create_detector(detector)
+        event_log.info('face_engine', "FaceRecognitionSystem initialized (waiting for known faces).")
+
+    def set_gallery(self, ids, encodings):
+        """Swaps in a new gallery (row i of `encodings` belongs to ids[i]) and bumps the version (the unknown store keys its bounds on it)."""
+        with self._gallery_lock: self._gallery = (ids, encodings, self._gallery[2] + 1)
+
+    @property
+    def known_face_ids(self):
+        return self._gallery[0]
+
+    @property
+    def known_face_encodings(self):
+        return self._gallery[1]
+
+    @property
+    def gallery_version(self):
+        return self._gallery[2]
+
+    def recognize_faces_in_frame(self, rgb_frame_input, detector=None, quality_gate=None, frame_scale=1.0):
+        """Detects and recognizes faces in a single frame (self.detector unless another backend is given).
+           Returns [(employee_id or "Unknown", best match distance or None, (top, right, bottom, left))].
+           With a face_quality.QualityGate, low-quality faces are not encoded and come back with ID None (deferred);
+           frame_scale is the size of the input relative to the full-resolution frame (for the gate's size check)."""
+        rgb_frame = self._validate_frame(rgb_frame_input)
+        if rgb_frame is None: return []
+        detector = detector or self.detector
+        face_locations = []
+
+        try: # Find faces (HOG by default: faster but less accurate than CNN); one upsample as face_recognition's default
+            with METRICS.timer(detector.stage): face_locations = detector.detect(rgb_frame, upsample=1)
+        except RuntimeError as rte: event_log.error('face_engine', f"RUNTIME ERROR face detection ({detector.name}): {rte}", dtype=str(rgb_frame.dtype), shape=rgb_frame.shape, contiguous=rgb_frame.flags['C_CONTIGUOUS'], sample_key='face_engine.detect'); return []
+        except Exception as e: event_log.error('face_engine', f"UNEXPECTED ERROR face detection ({detector.name}): {e}", sample_key='face_engine.detect'); return []
+        return self._encode_and_match(rgb_frame, face_locations, quality_gate, frame_scale)
+
+    def recognize_faces_adaptive(self, rgb_frame_input, scale_controller, detector=None, quality_gate=None):
+        """Like recognize_faces_in_frame, but takes the FULL-resolution RGB frame: detection runs on a copy shrunk
+           as far as `scale_controller` (one per camera) allows, encoding on the full-resolution face boxes.
+           Returned boxes are in full-resolution coordinates (scale 1.0)."""
+        rgb_frame = self._validate_frame(rgb_frame_input)
+        if rgb_frame is None: return []
+        detector = detector or self.detector
+        scale, upsample = scale_controller.choose(detector)
+        try:
+            with METRICS.timer('resize'):
+                small_frame = rgb_frame if scale >= 1.0 else cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            with METRICS.timer(detector.stage): small_locations = detector.detect(small_frame, upsample=upsample)
+        except Exception as e: event_log.error('face_engine', f"Error during adaptive face detection: {e}", scale=scale, upsample=upsample, sample_key='face_engine.detect'); return []
+        h, w = rgb_frame.shape[:2]
+        face_locations = [(max(0, int(t / scale)), min(w, int(r / scale)), min(h, int(b / scale)), max(0, int(l / scale))) for t, r, b, l in small_locations]
+        scale_controller.update(face_locations)
+        return self._encode_and_match(rgb_frame, face_locations, quality_gate, 1.0)
+
+    def _validate_frame(self, rgb_frame_input):
+        """Returns a contiguous uint8 RGB frame, or None (repeated errors are sampled by the event log)."""
+        if not isinstance(rgb_frame_input, np.ndarray): event_log.error('face_engine', "Input not numpy array.", sample_key='face_engine.input'); return None
+        if rgb_frame_input.ndim != 3: event_log.error('face_engine', "Wrong dimensions", ndim=rgb_frame_input.ndim, sample_key='face_engine.input'); return None
+        if rgb_frame_input.shape[2] != 3: event_log.error('face_engine', "Wrong channels", channels=rgb_frame_input.shape[2], sample_key='face_engine.input'); return None
+        if rgb_frame_input.dtype != np.uint8:
+            event_log.warning('face_engine', "Wrong dtype, converting frame to uint8.", dtype=str(rgb_frame_input.dtype), sample_key='face_engine.dtype')
+            try: rgb_frame_input = rgb_frame_input.astype(np.uint8, copy=False)
+            except Exception as e: event_log.error('face_engine', f"Convert frame failed: {e}", sample_key='face_engine.input'); return None
+        return np.ascontiguousarray(rgb_frame_input)
+
+    def _encode_and_match(self, rgb_frame, face_locations, quality_gate=None, frame_scale=1.0):
+        if face_locations and len(self.known_face_encodings) and quality_gate is not None:
+            # Quality gate: only faces likely to give a confident match get the encoding (and later emotion) budget
+            try:
+                with METRICS.timer('quality_gate'): verdicts = quality_gate.evaluate(rgb_frame, face_locations, frame_scale)
+            except Exception as e: event_log.warning('face_engine', f"Quality gate failed, encoding all faces: {e}", sample_key='face_engine.quality'); verdicts = [(True, None)] * len(face_locations)
+            deferred = [loc for loc, (passed, _) in zip(face_locations, verdicts) if not passed]
+            if deferred:
+                METRICS.increment('faces_deferred', len(deferred))
+                passed_locations = [loc for loc, (passed, _) in zip(face_locations, verdicts) if passed]
+                return self._encode_and_match(rgb_frame, passed_locations) + [(None, None, loc) for loc in deferred]
+
+        face_encodings = []
+        if face_locations and len(self.known_face_encodings): # Encode faces if found and known faces exist (len(): may be an array)
+            try:
+                with METRICS.timer('encoding'): face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, model=ENCODING_MODEL)
+            except Exception as e: event_log.error('face_engine', f"Error during face_encodings: {e}", sample_key='face_engine.encode'); return [('Unknown', None, loc) for loc in face_locations]
+
+        # Recognition logic
+        recognized_faces = []
+        match_start = time.perf_counter()
+        known_ids, known_encodings, gallery_key = self._gallery; store = self.unknown_store # One snapshot; a reload bumps the version and the store drops its bounds
+        quantized = isinstance(known_encodings, QuantizedGallery) # Its distance is exact only among the re-ranked candidates: an upper bound, no use for bounds
+        for i, loc in enumerate(face_locations):
+            employee_id = "Unknown"; distance = None
+            if len(known_encodings) and i < len(face_encodings):
+                 current_face_encoding = face_encodings[i]
+                 # A returning unknown visitor is settled against the (smaller) cluster set without scanning the gallery
+                 if store is not None and not quantized and len(known_encodings) > store.size and store.match_unknown(current_face_encoding, gallery_key, MATCH_TOLERANCE, rgb_frame, loc) is not None:
+                      METRICS.increment('unknown_cluster_hits'); recognized_faces.append((employee_id, None, loc)); continue
+                 if quantized: best_match_index, distance = known_encodings.best_match(current_face_encoding)
+                 else:
+                      face_distances = face_recognition.face_distance(known_encodings, current_face_encoding) # compare_faces is just distance <= tolerance
+                      best_match_index = int(np.argmin(face_distances)) if face_distances.size > 0 else None
+                      distance = float(face_distances[best_match_index]) if best_match_index is not None else None
+                 if distance is not None and distance <= MATCH_TOLERANCE:
+                      employee_id = known_ids[best_match_index]
+                 if employee_id == "Unknown" and store is not None: store.add(current_face_encoding, None if quantized else distance, gallery_key, rgb_frame, loc) # Still clustered, just no bound
+            recognized_faces.append((employee_id, distance, loc)) # Append result (ID or Unknown, distance to the closest known face)
+        if face_encodings and METRICS.enabled:
+            METRICS.record('matching', time.perf_counter() - match_start)
+            METRICS.increment('faces_detected', len(face_locations)); METRICS.increment('faces_recognized', sum(1 for r in recognized_faces if r[0] != "Unknown"))
+        return recognized_faces
+
+
+HOG_WINDOW_PX = 80 # dlib's frontal HOG detector finds faces down to about 80x80 px in the image it scans
+
+class AdaptiveScaleController:
+    """Chooses the detection scale and upsample count for the next frame of ONE camera.
+
+    A face is only found if it is at least the detector's window (HOG_WINDOW_PX for dlib HOG) in the
+    scanned image, so the cheapest scan that still finds a face of height H px (full resolution) uses
+    scale window / H.
+    While faces are being seen, the scan is sized for the smallest recent face (with a margin for
+    people stepping back); otherwise it looks for faces down to `min_face_px`. Every
+    `probe_every`-th frame also scans at full sensitivity to catch people further away.
+    The default min_face_px=80 matches the old fixed path (scale 0.5 with one upsample).
+    """
+    def __init__(self, min_face_px=80, min_scale=0.15, max_scale=1.0, memory_seconds=2.0, shrink_margin=0.6, probe_every=8):
+        self.min_face_px = min_face_px; self.min_scale = min_scale; self.max_scale = max_scale
+        self.memory_seconds = memory_seconds; self.shrink_margin = shrink_margin; self.probe_every = max(1, probe_every)
+        self.last_settings = (1.0, 0)
+        self._sizes = deque(maxlen=64) # (time, smallest face height in that frame)
+        self._frame_counter = 0
+
+    def settings_for(self, smallest_face_px, window_px=HOG_WINDOW_PX, allow_upsample=True):
+        """(scale, upsample) for the cheapest scan that still finds faces of `smallest_face_px`."""
+        scale = window_px / float(smallest_face_px); upsample = 0
+        if scale > self.max_scale:
+            if allow_upsample: scale = scale / 2.0; upsample = 1 # Upsampling doubles the resolution dlib scans
+            scale = min(self.max_scale, scale)
+        return max(self.min_scale, scale), upsample
+
+    def choose(self, detector=None):
+        self._frame_counter += 1
+        now = time.time()
+        recent = [height for t, height in self._sizes if now - t <= self.memory_seconds]
+        if recent and self._frame_counter % self.probe_every != 0: target = max(self.min_face_px, min(recent) * self.shrink_margin)
+        else: target = self.min_face_px
+        if detector is None: self.last_settings = self.settings_for(target)
+        else: self.last_settings = self.settings_for(target, detector.window_px, detector.supports_upsample)
+        return self.last_settings
+
+    def update(self, face_locations):
+        """Feeds back the full-resolution boxes found in the frame just scanned."""
+        if face_locations: self._sizes.append((time.time(), min(bottom - top for top, _, bottom, _ in face_locations)))
+
+def crop_face(frame, location, scale=1.0, padding=15):
+    """Crops a face from the full-size frame given a (top, right, bottom, left) box found at `scale`.
+       Returns None if the padded box is empty."""
+    top, right, bottom, left = location
+    h, w = frame.shape[:2]
+    top = max(0, int(top / scale) - padding); left = max(0, int(left / scale) - padding)
+    bottom = min(h, int(bottom / scale) + padding); right = min(w, int(right / scale) + padding)
+    if bottom <= top or right <= left: return None
+    return frame[top:bottom, left:right]
+
+# --- Enrollment face detection (still photos, often 12 MP phone pictures) ---
+ENROLLMENT_STRATEGIES = ('pyramid', 'hog', 'cnn') # 'cnn' = legacy full-resolution CNN
+DEFAULT_ENROLLMENT_STRATEGY = 'pyramid'
+ENROLL_HOG_PYRAMID = ((512, 0), (1024, 1)) # (max working side in px, HOG upsamples), tried in order until a face is found
+ENROLL_CNN_MAX_SIDE = 640                  # CNN fallback never runs on more than this
+ENROLL_CENTER_CROP = 0.7                   # CNN fallback looks at the central 70% first (where portraits put the face)
+ENROLL_ENCODE_MARGIN = 0.5                 # Encoding crop = face box + 50% of its size on every side, at full resolution
+
+def _downscale(image, max_side):
+    """Returns (image no larger than max_side, factor applied)."""
+    h, w = image.shape[:2]; factor = min(1.0, max_side / float(max(h, w)))
+    if factor >= 1.0: return image, 1.0
+    return np.ascontiguousarray(cv2.resize(image, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA)), factor
+
+def _to_full_resolution(locations, factor, offset, shape):
+    oy, ox = offset; h, w = shape[:2]
+    return [(max(0, int(t / factor) + oy), min(w, int(r / factor) + ox), min(h, int(b / factor) + oy), max(0, int(l / factor) + ox)) for t, r, b, l in locations]
+
+def detect_enrollment_faces(image_rgb, strategy=DEFAULT_ENROLLMENT_STRATEGY):
+    """Face boxes (top, right, bottom, left) in full-resolution coordinates of an enrollment photo.
+       'pyramid': HOG on capped-resolution copies, then CNN on a capped centre crop / whole image only if HOG finds nothing.
+       'hog': the HOG pyramid only. 'cnn': CNN on the full-resolution image (slow on CPU)."""
+    if strategy == 'cnn': return face_recognition.face_locations(image_rgb, model='cnn')
+    for max_side, upsample in ENROLL_HOG_PYRAMID:
+        small, factor = _downscale(image_rgb, max_side)
+        locations = face_recognition.face_locations(small, number_of_times_to_upsample=upsample, model='hog')
+        if locations: return _to_full_resolution(locations, factor, (0, 0), image_rgb.shape)
+    if strategy == 'hog': return []
+    h, w = image_rgb.shape[:2]; crop_h, crop_w = int(h * ENROLL_CENTER_CROP), int(w * ENROLL_CENTER_CROP)
+    y0, x0 = (h - crop_h) // 2, (w - crop_w) // 2
+    for region, offset in ((image_rgb[y0:y0 + crop_h, x0:x0 + crop_w], (y0, x0)), (image_rgb, (0, 0))):
+        small, factor = _downscale(np.ascontiguousarray(region), ENROLL_CNN_MAX_SIDE)
+        locations = face_recognition.face_locations(small, model='cnn')
+        if locations: return _to_full_resolution(locations, factor, offset, image_rgb.shape)
+    return []
+
+def largest_face(locations):
+    return max(locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+
+def encode_enrollment_face(image_rgb, location, margin=ENROLL_ENCODE_MARGIN):
+    """128-d encoding of one face, computed on a full-resolution crop around it (None if it fails)."""
+    top, right, bottom, left = location; h, w = image_rgb.shape[:2]
+    pad_y = int((bottom - top) * margin); pad_x = int((right - left) * margin)
+    y0, x0 = max(0, top - pad_y), max(0, left - pad_x); y1, x1 = min(h, bottom + pad_y), min(w, right + pad_x)
+    crop = np.ascontiguousarray(image_rgb[y0:y1, x0:x1])
+    encodings = face_recognition.face_encodings(crop, known_face_locations=[(top - y0, right - x0, bottom - y0, left - x0)], model=ENCODING_MODEL)
+    return encodings[0] if encodings else None
+
+# --- Example Usage (Keep commented out) ---
 # if __name__ == '__main__': pass
\ No newline at end of file
@@ -0,0 +1,87 @@
+# face_quality.py (Cheap per-face quality gate - sharpness, brightness, size and pose - run before encoding/emotion)
+import numpy as np
+import cv2
+import face_recognition
+
+MIN_FACE_PX = 48                # Box height in full-resolution px; smaller faces give unreliable encodings/emotions
+MIN_SHARPNESS = 40.0            # Laplacian variance of the face resized to SCORE_SIZE (motion/focus blur scores low)
+BRIGHTNESS_RANGE = (40, 220)    # Mean grey level of the face (under/over-exposed outside this)
+MAX_YAW_RATIO = 0.35            # |nose offset from eye midpoint| / eye distance; ~0 frontal, ~0.5 at a strong side view
+MAX_DEFERRALS = 8               # After this many deferred frames in a row the same face is processed anyway
+SCORE_SIZE = 64                 # Faces are compared at a common size so the sharpness threshold doesn't depend on distance
+TRACK_IOU = 0.3                 # Overlap for "same face as in the previous frame"
+
+
+def score_faces(rgb_frame, face_locations):
+    """(sharpness, brightness) arrays for all boxes at once: one SCORE_SIZE grey patch per face, then vectorised maths."""
+    patches = np.empty((len(face_locations), SCORE_SIZE, SCORE_SIZE), dtype=np.float32)
+    for i, (top, right, bottom, left) in enumerate(face_locations):
+        crop = rgb_frame[max(0, top):max(top + 1, bottom), max(0, left):max(left + 1, right)]
+        patches[i] = cv2.resize(cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY), (SCORE_SIZE, SCORE_SIZE), interpolation=cv2.INTER_AREA)
+    laplacian = (patches[:, :-2, 1:-1] + patches[:, 2:, 1:-1] + patches[:, 1:-1, :-2] + patches[:, 1:-1, 2:]
+                 - 4.0 * patches[:, 1:-1, 1:-1])
+    return laplacian.var(axis=(1, 2)), patches.mean(axis=(1, 2))
+
+
+def yaw_ratios(rgb_frame, face_locations):
+    """Horizontal head turn from the 5-point landmarks (nan where they are missing)."""
+    ratios = []
+    for landmarks in face_recognition.face_landmarks(rgb_frame, face_locations, model='small'):
+        try:
+            left_eye = np.mean(landmarks['left_eye'], axis=0); right_eye = np.mean(landmarks['right_eye'], axis=0)
+            nose = np.mean(landmarks['nose_tip'], axis=0)
+            eye_distance = np.linalg.norm(right_eye - left_eye)
+            ratios.append(abs(nose[0] - (left_eye[0] + right_eye[0]) / 2.0) / eye_distance if eye_distance > 0 else np.nan)
+        except KeyError: ratios.append(np.nan)
+    return np.array(ratios, dtype=np.float32)
+
+
+def _iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    union = (a[1] - a[3]) * (a[2] - a[0]) + (b[1] - b[3]) * (b[2] - b[0]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class QualityGate:
+    """Decides which detected faces are worth encoding in this frame. Keep one per camera.
+
+    Faces that fail are *deferred*: the camera keeps delivering frames of the same person, and a
+    later, sharper or more frontal one goes through. A face deferred MAX_DEFERRALS times in a row
+    (matched across frames by box overlap) is let through anyway, so nobody is ignored for good.
+    """
+    def __init__(self, min_face_px=MIN_FACE_PX, min_sharpness=MIN_SHARPNESS, brightness_range=BRIGHTNESS_RANGE,
+                 max_yaw_ratio=MAX_YAW_RATIO, max_deferrals=MAX_DEFERRALS, check_pose=True):
+        self.min_face_px = min_face_px; self.min_sharpness = min_sharpness; self.brightness_range = brightness_range
+        self.max_yaw_ratio = max_yaw_ratio; self.max_deferrals = max_deferrals; self.check_pose = check_pose
+        self._tracks = [] # [(full-resolution box, consecutive deferrals)] from the previous frame
+
+    def evaluate(self, rgb_frame, face_locations, scale=1.0):
+        """Returns [(passed, reason)] per box; `scale` is the size of rgb_frame relative to the full-resolution frame."""
+        if not face_locations: self._tracks = []; return []
+        count = len(face_locations)
+        reasons = [None] * count
+        heights = np.array([(bottom - top) / scale for top, _, bottom, _ in face_locations], dtype=np.float32)
+        sharpness, brightness = score_faces(rgb_frame, face_locations)
+        low, high = self.brightness_range
+        for i in range(count):
+            if heights[i] < self.min_face_px: reasons[i] = 'too_small'
+            elif brightness[i] < low: reasons[i] = 'too_dark'
+            elif brightness[i] > high: reasons[i] = 'too_bright'
+            elif sharpness[i] < self.min_sharpness: reasons[i] = 'blurred'
+        if self.check_pose:
+            candidates = [i for i in range(count) if reasons[i] is None] # Landmarks only for faces that passed the cheap checks
+            if candidates:
+                for i, ratio in zip(candidates, yaw_ratios(rgb_frame, [face_locations[i] for i in candidates])):
+                    if ratio > self.max_yaw_ratio: reasons[i] = 'turned_away'
+
+        results = []; tracks = []
+        for location, reason in zip(face_locations, reasons):
+            box = tuple(int(v / scale) for v in location)
+            previous = max(self._tracks, key=lambda track: _iou(track[0], box), default=None)
+            deferrals = previous[1] if previous is not None and _iou(previous[0], box) >= TRACK_IOU else 0
+            if reason is not None and deferrals >= self.max_deferrals: reason = None # Waited long enough: best effort
+            tracks.append((box, deferrals + 1 if reason is not None else 0))
+            results.append((reason is None, reason))
+        self._tracks = tracks
+        return results
@@ -0,0 +1,100 @@
+# frame_pacer.py (Frame pacing for the camera loop - sleeps only the unused frame budget)
+import time
+import threading
+from collections import deque
+
+DEFAULT_TARGET_FPS = 30
+FPS_WINDOW_SECONDS = 2.0 # Rolling window used for the achieved FPS figures
+MAX_STALE_FRAMES_TO_DRAIN = 4 # Never grab more than this many buffered frames in one go
+
+
+class RateMeter:
+    """Counts events over a short rolling window and reports them as events per second."""
+    def __init__(self, window_seconds=FPS_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._stamps = deque()
+        self._lock = threading.Lock() # tick() and rate() may be called from different threads
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self._stamps.append(now)
+            self._trim(now)
+
+    def rate(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self._trim(now)
+            if len(self._stamps) < 2: return 0.0
+            span = self._stamps[-1] - self._stamps[0]
+            return (len(self._stamps) - 1) / span if span > 0 else 0.0
+
+    def _trim(self, now):
+        cutoff = now - self.window_seconds
+        while self._stamps and self._stamps[0] < cutoff: self._stamps.popleft()
+
+
+class FramePacer:
+    """Keeps a capture loop on a fixed frame budget.
+
+    Call begin_iteration() at the top of the loop and end_iteration() at the bottom;
+    only the part of the budget not used by processing is slept. When an iteration
+    overruns, drain_stale_frames() skips the frames the driver buffered meanwhile so
+    the next read returns the freshest one.
+    """
+    def __init__(self, target_fps=DEFAULT_TARGET_FPS, max_drain=MAX_STALE_FRAMES_TO_DRAIN):
+        self.target_fps = target_fps
+        self.frame_budget = 1.0 / target_fps
+        self.max_drain = max_drain
+        self.capture_meter = RateMeter(); self.process_meter = RateMeter(); self.render_meter = RateMeter()
+        self.last_iteration_cost = 0.0
+        self.last_processing_cost = 0.0 # Time from the last frame's capture to the end of its iteration
+        self.frames_dropped = 0
+        self._iteration_start = None; self._capture_time = None
+
+    def begin_iteration(self):
+        self._iteration_start = time.perf_counter()
+
+    def stale_frame_count(self):
+        """Frames that arrived in the driver buffer while the previous frame was being processed.
+           Time blocked inside read() is waiting for a new frame, not falling behind, so it is excluded."""
+        if self.last_processing_cost <= self.frame_budget: return 0
+        return min(int(self.last_processing_cost / self.frame_budget), self.max_drain)
+
+    def drain_stale_frames(self, cap):
+        """Grabs (without decoding) the frames buffered during the last overrun."""
+        drained = 0
+        for _ in range(self.stale_frame_count()):
+            try:
+                if not cap.grab(): break
+            except Exception: break # Source doesn't support grab(), nothing to drain
+            drained += 1
+        self.frames_dropped += drained
+        return drained
+
+    def mark_capture(self):
+        self._capture_time = time.perf_counter(); self.capture_meter.tick()
+    def mark_process(self): self.process_meter.tick()
+    def mark_render(self): self.render_meter.tick()
+
+    def end_iteration(self, stop_event=None):
+        """Sleeps for the rest of the frame budget. Returns the time slept in seconds."""
+        if self._iteration_start is None: return 0.0
+        now = time.perf_counter()
+        self.last_iteration_cost = now - self._iteration_start
+        self.last_processing_cost = now - self._capture_time if self._capture_time is not None else 0.0
+        self._iteration_start = None; self._capture_time = None
+        remaining = self.frame_budget - self.last_iteration_cost
+        if remaining <= 0: return 0.0
+        # Waiting on the stop event keeps shutdown responsive
+        if stop_event is not None: stop_event.wait(remaining)
+        else: time.sleep(remaining)
+        return remaining
+
+    def get_fps(self):
+        """Achieved capture, process (recognition) and render rates over the rolling window."""
+        return {'capture': self.capture_meter.rate(), 'process': self.process_meter.rate(), 'render': self.render_meter.rate()}
+
+    def get_fps_summary(self):
+        fps = self.get_fps()
+        return f"Cap {fps['capture']:.1f} | Proc {fps['process']:.1f} | Disp {fps['render']:.1f} fps"
@@ -0,0 +1,76 @@
+# frame_ring.py (Preallocated ring of camera frames - written in place by the capture thread, read without locks)
+#
+# The capture loop used to copy every frame just so enrollment could grab one. FrameRing keeps the last `slots`
+# frames in one preallocated block; the camera decodes straight into the next slot (cap.read(image)), so steady
+# state capture allocates nothing. Every slot carries the sequence number of the frame in it. Readers copy a slot
+# and then check its sequence number is unchanged (the writer zeroes it before overwriting), so they never block
+# the capture thread and never return a half-written frame. Single writer, any number of readers.
+import time
+
+import numpy as np
+
+FRAME_RING_SLOTS = 30  # ~1 s of frames at 30 fps (640x480 BGR: 27 MB)
+READ_RETRIES = 3       # A reader lapped by the writer this often gives up
+
+
+class FrameRing:
+    """Last `slots` frames. The capture thread calls next_buffer()/publish(); other threads call latest()/get()."""
+    def __init__(self, slots=FRAME_RING_SLOTS):
+        self.slots = max(2, int(slots))
+        self._block = None; self._views = [] # One (slots, h, w, c) array and a fixed view per slot
+        self._sequences = [0] * self.slots   # Sequence number held by each slot (0 = empty or being written)
+        self._timestamps = [0.0] * self.slots
+        self._sequence = 0                   # Newest published sequence number
+        self.reallocations = 0
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def next_buffer(self):
+        """Slot the next frame should be decoded into (pass it to cap.read()); None until the frame size is known."""
+        if self._block is None: return None
+        index = (self._sequence + 1) % self.slots
+        self._sequences[index] = 0 # Readers of the old frame in this slot will notice and retry
+        return self._views[index]
+
+    def publish(self, frame, timestamp=None):
+        """Makes `frame` the newest one and returns its in-ring view (valid until the ring wraps around).
+           Frames decoded into next_buffer() are not copied; anything else is copied into the slot."""
+        sequence = self._sequence + 1; index = sequence % self.slots
+        if self._block is None or self._block.shape[1:] != frame.shape or self._block.dtype != frame.dtype: self._allocate(frame)
+        slot = self._views[index]
+        if frame is not slot and not np.may_share_memory(frame, slot):
+            self._sequences[index] = 0; np.copyto(slot, frame)
+        self._timestamps[index] = timestamp if timestamp is not None else time.time()
+        self._sequences[index] = sequence; self._sequence = sequence
+        return slot
+
+    def _allocate(self, frame):
+        # First frame or a new resolution (camera reconnected with other settings): one block for all slots
+        self._sequences = [0] * self.slots
+        block = np.empty((self.slots,) + frame.shape, dtype=frame.dtype)
+        self._views = [block[i] for i in range(self.slots)]; self._block = block
+        self.reallocations += 1
+
+    def get(self, sequence, out=None):
+        """(timestamp, copy of frame `sequence`), or None once it has been overwritten. `out` is reused if it fits."""
+        if sequence <= 0: return None
+        index = sequence % self.slots; views = self._views
+        if not views or self._sequences[index] != sequence: return None
+        slot = views[index]; timestamp = self._timestamps[index]
+        if out is not None and out.shape == slot.shape and out.dtype == slot.dtype: np.copyto(out, slot); frame = out
+        else: frame = slot.copy()
+        return (timestamp, frame) if self._sequences[index] == sequence else None # Overwritten while copying
+
+    def latest(self, out=None):
+        """(sequence, timestamp, copy of the newest frame), or (0, None, None) before the first frame."""
+        for _ in range(READ_RETRIES):
+            sequence = self._sequence
+            if not sequence: break
+            result = self.get(sequence, out)
+            if result is not None: return (sequence,) + result
+        return 0, None, None
+
+    def nbytes(self):
+        return self._block.nbytes if self._block is not None else 0
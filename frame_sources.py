@@ -0,0 +1,291 @@
+# frame_sources.py (Pluggable frame sources - live camera, video file, image-directory replay and synthetic frames - camera cache/probing)
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import cv2
+import numpy as np
+
+PLAYBACK_REALTIME = 'realtime' # Deliver recorded frames at their original pace (like a live camera)
+PLAYBACK_FAST = 'fast'         # Deliver recorded frames as fast as the consumer reads them
+DEFAULT_REPLAY_FPS = 30.0
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Live camera capture settings: MJPG is decoded cheaply and keeps USB bandwidth low; a 1-frame driver buffer keeps latency down
+CAPTURE_FOURCC = 'MJPG'
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
+CAPTURE_BUFFER_SIZE = 1
+DEFAULT_CAMERA_CANDIDATES = (0, 1, 2, -1)
+CAMERA_CACHE_FILE = "camera_cache.json" # Last working camera (device, backend, resolution, FOURCC), tried first on the next start
+PROBE_TIMEOUT_SECONDS = 10.0             # Parallel probing gives up on devices that have not opened by then
+RECONNECT_INITIAL_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class FrameSource:
+    """Common interface, compatible with the parts of cv2.VideoCapture the camera loops use.
+
+    read() returns (ok, frame) and sets `timestamp` to the frame's time in seconds.
+    Recorded and synthetic sources use deterministic timestamps (frame_index / fps),
+    so replays of the same input give identical timings regardless of machine speed.
+    `exhausted` becomes True once a finite source has no more frames.
+    """
+    is_live = False
+
+    def __init__(self, playback=PLAYBACK_REALTIME, fps=DEFAULT_REPLAY_FPS, loop=False):
+        if playback not in (PLAYBACK_REALTIME, PLAYBACK_FAST): raise ValueError(f"Unknown playback mode '{playback}'")
+        self.playback = playback; self.fps = float(fps) if fps else DEFAULT_REPLAY_FPS; self.loop = loop
+        self.frame_index = 0; self.timestamp = None; self.exhausted = False
+        self._start_wall = None
+
+    def isOpened(self): return True
+    def release(self): pass
+
+    def grab(self):
+        """Skips one frame. In fast playback nothing is ever buffered, so there is nothing to skip."""
+        if self.playback == PLAYBACK_FAST: return False
+        ok, _ = self._next_frame(decode=False)
+        return ok
+
+    def read(self, image=None):
+        ok, frame = self._next_frame(decode=True)
+        if not ok: return False, None
+        if self.playback == PLAYBACK_REALTIME: self._wait_until(self.timestamp)
+        if image is not None and image.shape == frame.shape: np.copyto(image, frame); frame = image
+        return True, frame
+
+    def _next_frame(self, decode=True):
+        frame = self._produce(self.frame_index, decode)
+        if frame is None and self.loop and self.frame_index > 0:
+            self._rewind(); frame = self._produce(self.frame_index, decode)
+        if frame is None: self.exhausted = True; return False, None
+        self.timestamp = self.frame_index / self.fps; self.frame_index += 1
+        return True, frame
+
+    def _wait_until(self, timestamp):
+        now = time.perf_counter()
+        if self._start_wall is None: self._start_wall = now - timestamp
+        delay = self._start_wall + timestamp - now
+        if delay > 0: time.sleep(delay)
+
+    def _produce(self, index, decode):
+        raise NotImplementedError
+
+    def _rewind(self):
+        self.frame_index = 0; self._start_wall = None
+
+
+class CameraSource(FrameSource):
+    """Live camera (index, device path or stream URL). Timestamps are wall-clock capture times.
+       Local cameras get the requested FOURCC/resolution/buffer size; stream URLs are opened as they are."""
+    is_live = True
+
+    def __init__(self, device, api_preference=None, width=CAPTURE_WIDTH, height=CAPTURE_HEIGHT, fourcc=CAPTURE_FOURCC, buffer_size=CAPTURE_BUFFER_SIZE):
+        super().__init__(PLAYBACK_REALTIME)
+        self.device = device
+        self.cap = cv2.VideoCapture(device, api_preference) if api_preference is not None else cv2.VideoCapture(device)
+        if self.cap.isOpened() and not (isinstance(device, str) and '://' in device): self.apply_settings(width, height, fourcc, buffer_size)
+
+    def apply_settings(self, width=None, height=None, fourcc=None, buffer_size=None):
+        """Requests capture settings. Drivers silently ignore what they don't support; describe() shows what was granted."""
+        if fourcc: self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc)) # Before the size: some drivers only offer large sizes in MJPG
+        if width: self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height: self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if buffer_size: self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    def describe(self):
+        """Negotiated settings as a JSON-friendly dict (the camera cache entry)."""
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code > 0 else ''
+        try: backend = self.cap.getBackendName()
+        except cv2.error: backend = None
+        return {'device': self.device, 'backend': backend, 'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), 'fourcc': fourcc if fourcc.isprintable() and fourcc.strip() else None}
+
+    def isOpened(self): return self.cap is not None and self.cap.isOpened()
+    def grab(self): return self.cap.grab()
+    def set(self, prop, value): return self.cap.set(prop, value)
+    def get(self, prop): return self.cap.get(prop)
+
+    def read(self, image=None):
+        ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+        if not ret or frame is None: return False, None
+        self.timestamp = time.time(); self.frame_index += 1
+        return True, frame
+
+    def release(self):
+        if self.cap is not None: self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video replay. Frame rate comes from the file unless overridden."""
+    def __init__(self, path, playback=PLAYBACK_REALTIME, fps=None, loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        file_fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        super().__init__(playback, fps or (file_fps if file_fps and file_fps > 0 else DEFAULT_REPLAY_FPS), loop)
+
+    def isOpened(self): return self.cap.isOpened()
+
+    def _produce(self, index, decode):
+        if decode:
+            ret, frame = self.cap.read()
+            return frame if ret else None
+        return True if self.cap.grab() else None
+
+    def _rewind(self):
+        super()._rewind(); self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self): self.cap.release()
+
+
+class ImageSequenceSource(FrameSource):
+    """Replays the images in a directory in filename order at a fixed frame rate."""
+    def __init__(self, directory, playback=PLAYBACK_REALTIME, fps=None, loop=False):
+        super().__init__(playback, fps or DEFAULT_REPLAY_FPS, loop)
+        self.directory = directory
+        self.paths = sorted(p for p in glob.glob(os.path.join(directory, '*')) if p.lower().endswith(IMAGE_EXTENSIONS))
+
+    def isOpened(self): return bool(self.paths)
+
+    def _produce(self, index, decode):
+        while index < len(self.paths):
+            if not decode: return True
+            frame = cv2.imread(self.paths[index])
+            if frame is not None: return frame
+            print(f"Warning: Skipping unreadable image {self.paths[index]}")
+            self.frame_index = index = index + 1
+        return None
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generated frames: a textured background with optional face images moving across it.
+
+    `face_images` are BGR arrays pasted `faces_per_frame` times per frame, so detection and
+    recognition can be exercised without a camera or any recorded footage.
+    """
+    def __init__(self, width=640, height=480, playback=PLAYBACK_FAST, fps=None, frame_count=300,
+                 face_images=None, faces_per_frame=1, seed=0, loop=False):
+        super().__init__(playback, fps or DEFAULT_REPLAY_FPS, loop)
+        self.width = width; self.height = height; self.frame_count = frame_count
+        self.face_images = list(face_images or []); self.faces_per_frame = faces_per_frame if self.face_images else 0
+        rng = np.random.default_rng(seed)
+        self._background = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        self._background = cv2.GaussianBlur(self._background, (0, 0), 5) # Smooth noise, roughly camera-like texture
+
+    def _produce(self, index, decode):
+        if self.frame_count is not None and index >= self.frame_count: return None
+        if not decode: return True
+        frame = self._background.copy()
+        for slot in range(self.faces_per_frame):
+            face = self.face_images[(index + slot) % len(self.face_images)]
+            fh, fw = face.shape[:2]
+            if fh >= self.height or fw >= self.width: continue
+            # Each face drifts horizontally in its own lane; positions depend only on (index, slot)
+            lanes = max(1, self.faces_per_frame)
+            x = (index * 4 + slot * (self.width // lanes)) % (self.width - fw)
+            y = min(self.height - fh, (slot * self.height) // lanes)
+            frame[y:y + fh, x:x + fw] = face
+        return frame
+
+
+class Backoff:
+    """Reconnect delays: `initial`, doubling up to `maximum`. reset() once the source delivers frames again."""
+    def __init__(self, initial=RECONNECT_INITIAL_SECONDS, maximum=RECONNECT_MAX_SECONDS):
+        self.initial = initial; self.maximum = maximum; self.delay = initial
+
+    def next_delay(self):
+        delay = self.delay; self.delay = min(self.maximum, self.delay * 2)
+        return delay
+
+    def reset(self): self.delay = self.initial
+
+
+def is_camera_spec(spec):
+    """True if open_frame_source would open `spec` as a live camera."""
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.lstrip('-').isdigit()): return True
+    return isinstance(spec, str) and not spec.startswith('synthetic') and not os.path.isdir(spec) and not os.path.isfile(spec)
+
+
+def load_camera_cache(path=CAMERA_CACHE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+
+def save_camera_cache(entry, path=CAMERA_CACHE_FILE):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(entry, f, indent=2)
+        os.replace(tmp_path, path); return True
+    except OSError as e: print(f"Warning: Could not save camera cache {path}: {e}"); return False
+
+
+def _try_camera(device, api_preference=None, **settings):
+    """Opens a camera and reads one test frame. Returns the open CameraSource or None."""
+    source = None
+    try:
+        source = CameraSource(device, api_preference, **settings)
+        if source.isOpened():
+            ok, _ = source.read()
+            if ok: return source
+    except cv2.error: pass
+    if source is not None: source.release()
+    return None
+
+
+def _release_result(future):
+    if not future.cancelled() and future.exception() is None and future.result() is not None: future.result().release()
+
+
+def probe_cameras(candidates, timeout=PROBE_TIMEOUT_SECONDS, **settings):
+    """Opens all candidates in parallel (a missing or virtual device can take seconds to fail) and returns the first
+       working one in candidate order, or None. The other cameras are released, including ones that open after the timeout."""
+    if not candidates: return None
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="camera-probe")
+    futures = [pool.submit(_try_camera, device, **settings) for device in candidates]
+    wait(futures, timeout=timeout)
+    chosen = None
+    for future in futures:
+        if chosen is None and future.done() and future.exception() is None and future.result() is not None: chosen = future.result()
+        else: future.add_done_callback(_release_result) # Runs now if already done, else when the slow open finishes
+    pool.shutdown(wait=False)
+    return chosen
+
+
+def open_camera(candidates=DEFAULT_CAMERA_CANDIDATES, cache_file=CAMERA_CACHE_FILE, timeout=PROBE_TIMEOUT_SECONDS,
+                width=CAPTURE_WIDTH, height=CAPTURE_HEIGHT, fourcc=CAPTURE_FOURCC, buffer_size=CAPTURE_BUFFER_SIZE):
+    """Opens a live camera: the cached last working one first (same device, backend and negotiated mode),
+       then all candidates probed in parallel. The camera that worked is written back to the cache."""
+    requested = {'width': width, 'height': height, 'fourcc': fourcc, 'buffer_size': buffer_size}
+    cached = load_camera_cache(cache_file) if cache_file else None
+    source = None
+    if cached and cached.get('requested') == requested and cached.get('device') in candidates:
+        api_preference = getattr(cv2, f"CAP_{cached['backend'].upper()}", None) if cached.get('backend') else None
+        source = _try_camera(cached['device'], api_preference, width=cached.get('width') or width, height=cached.get('height') or height,
+                             fourcc=cached.get('fourcc') or fourcc, buffer_size=buffer_size)
+    if source is None: source = probe_cameras(list(candidates), timeout, **requested)
+    if source is not None and cache_file:
+        entry = source.describe(); entry['requested'] = requested
+        if entry != cached: save_camera_cache(entry, cache_file)
+    return source
+
+
+def open_frame_source(spec, playback=PLAYBACK_REALTIME, fps=None, loop=False, face_images=None):
+    """Builds a source from a config value.
+
+    Integers (or digit strings) are camera indices, 'synthetic' or 'synthetic:WxH' gives generated
+    frames, a directory replays its images, an existing file replays as video and anything else
+    (device path, RTSP/HTTP URL) is opened as a live camera.
+    """
+    if isinstance(spec, FrameSource): return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.lstrip('-').isdigit()): return CameraSource(int(spec))
+    if spec.startswith('synthetic'):
+        width, height = 640, 480
+        if ':' in spec: width, height = (int(v) for v in spec.split(':', 1)[1].lower().split('x'))
+        return SyntheticSource(width, height, playback=playback, fps=fps, face_images=face_images, loop=loop)
+    if os.path.isdir(spec): return ImageSequenceSource(spec, playback=playback, fps=fps, loop=loop)
+    if os.path.isfile(spec): return VideoFileSource(spec, playback=playback, fps=fps, loop=loop)
+    return CameraSource(spec)
@@ -0,0 +1,247 @@
+# gallery_rebuild.py (Re-encode every employee from employee_photos/ in a process pool - cached by photo hash, resumable, swapped in atomically)
+#
+# After ENCODING_MODEL or the enrollment detection settings change, the stored encodings no longer match what the
+# cameras compute. GalleryRebuild re-encodes each employee's photo (employee_photos/<safe id>.<ext>) in worker
+# processes and writes the result into employees.face_encoding_shadow; the live face_encoding column is untouched
+# until every employee has been processed, then one transaction moves all shadows into place. Results are cached in
+# encoding_cache by (SHA-256 of the photo, encoder settings), so unchanged photos are never encoded twice and a
+# killed run resumes where it stopped (shadows are committed in batches; the settings of the unfinished run are kept
+# in config). Only outcomes that depend on the photo alone are cached; a worker exception is retried next time, and a
+# broken pool (a worker killed, e.g. out of memory) stops the run like stop() does. Each shadow carries the hash of the photo it came from and is only written or swapped in while that is
+# still the employee's photo, so a photo updated mid-rebuild is never overwritten by the old one's encoding.
+# Employees without a photo, or whose photo fails, keep their current encoding. Workers are spawned, not
+# forked (the GUI starts rebuilds from a process holding Tk, camera threads and open handles), and by default one core
+# is left for the cameras.
+#   python gallery_rebuild.py --workers 8 [--strategy pyramid] [--restart]
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from database_setup import setup_database, DATABASE_FILE
+from bulk_enroll import encode_photo, safe_photo_name, EMPLOYEE_PHOTO_DIR, PHOTO_EXTENSIONS
+from data_manager import ENROLLMENT_DETECTION_STRATEGY
+from face_engine import (ENCODING_MODEL, ENROLLMENT_STRATEGIES, ENROLL_HOG_PYRAMID, ENROLL_CNN_MAX_SIDE,
+                         ENROLL_CENTER_CROP, ENROLL_ENCODE_MARGIN)
+import event_log
+
+DEFAULT_BATCH_SIZE = 50     # Shadow encodings committed per transaction (= how much a killed run can lose)
+IN_FLIGHT_PER_WORKER = 4    # Photos queued ahead per worker process (bounded so stop() takes effect quickly)
+MAX_DEFAULT_WORKERS = 4     # Default pool size cap (CPU count - 1, at least 1); --workers overrides it
+HASH_CHUNK_BYTES = 1 << 20
+CACHED_STATUSES = ('ok', 'no_face', 'multiple_faces', 'encoding_failed', 'unreadable_image') # Deterministic for a photo + settings
+REBUILD_STATE_KEY = 'gallery_rebuild_encoder' # config: encoder settings of the rebuild in progress (absent = none)
+GALLERY_ENCODER_KEY = 'gallery_encoder'       # config: encoder settings of the last completed rebuild
+
+
+def encoder_signature(strategy=ENROLLMENT_DETECTION_STRATEGY):
+    """Every setting that changes the encoding computed from a photo; part of the cache key."""
+    return (f"model={ENCODING_MODEL};strategy={strategy};pyramid={ENROLL_HOG_PYRAMID};cnn_side={ENROLL_CNN_MAX_SIDE};"
+            f"center_crop={ENROLL_CENTER_CROP};margin={ENROLL_ENCODE_MARGIN}")
+
+
+def default_workers():
+    return max(1, min(MAX_DEFAULT_WORKERS, (os.cpu_count() or 1) - 1))
+
+
+def find_employee_photo(employee_id, photo_dir=EMPLOYEE_PHOTO_DIR):
+    base_path = os.path.join(photo_dir, safe_photo_name(employee_id))
+    return next((base_path + ext for ext in PHOTO_EXTENSIONS if os.path.exists(base_path + ext)), None)
+
+
+def photo_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_rebuild_state(db_file=DATABASE_FILE):
+    """(encoder settings of an unfinished rebuild or None, encoder settings of the last completed one or None)."""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        values = dict(conn.execute("SELECT key, value FROM config WHERE key IN (?, ?)", (REBUILD_STATE_KEY, GALLERY_ENCODER_KEY)).fetchall())
+        return values.get(REBUILD_STATE_KEY), values.get(GALLERY_ENCODER_KEY)
+    except sqlite3.Error as e: event_log.error('gallery_rebuild', f"Reading the rebuild state failed: {e}"); return None, None
+    finally:
+        if conn: conn.close()
+
+
+class GalleryRebuild:
+    """One rebuild pass. run() blocks (call it from a thread in the GUI); stop() makes it return early, resumable."""
+    def __init__(self, db_file=DATABASE_FILE, photo_dir=EMPLOYEE_PHOTO_DIR, workers=None, strategy=ENROLLMENT_DETECTION_STRATEGY,
+                 batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+        self.db_file = db_file; self.photo_dir = photo_dir; self.workers = workers or default_workers()
+        self.strategy = strategy; self.batch_size = max(1, batch_size); self.on_progress = on_progress # on_progress(done, total, photos encoded/s)
+        self.encoder = encoder_signature(strategy)
+        self.counts = {'employees': 0, 'resumed': 0, 'cached': 0, 'encoded': 0, 'failed': 0, 'missing_photo': 0, 'stale': 0, 'swapped': 0}
+        self.failures = [] # (employee_id, status, detail)
+        self._stop_event = threading.Event(); self._conn = None; self._pool_error = None # Set when the worker pool broke
+        self._shadows = []; self._cache_rows = []; self._done = 0; self._total = 0; self._start = 0.0
+        self._encoded_photos = 0 # Photos a worker actually processed (cache hits, missing photos and shared photos excluded)
+        self._hashes = {} # employee_id -> ((path, mtime_ns, size) when hashed, photo hash)
+
+    def stop(self):
+        self._stop_event.set()
+
+    # --- Photo hashes ---
+    def _hash_photo(self, employee_id, path):
+        stat = os.stat(path); digest = photo_hash(path) # Stat first: a write during hashing changes it, so the next check rehashes
+        self._hashes[employee_id] = ((path, stat.st_mtime_ns, stat.st_size), digest); return digest
+
+    def _current_hash(self, employee_id):
+        """Hash of the employee's photo as it is now (None if it is gone); only rehashed when the file changed since the last hash."""
+        path = find_employee_photo(employee_id, self.photo_dir)
+        if path is None: return None
+        try:
+            stat = os.stat(path); known = self._hashes.get(employee_id)
+            if known and known[0] == (path, stat.st_mtime_ns, stat.st_size): return known[1]
+            return self._hash_photo(employee_id, path)
+        except OSError: return None
+
+    def _drop_stale(self, employee_ids):
+        if not employee_ids: return
+        self.counts['stale'] += len(employee_ids)
+        event_log.info('gallery_rebuild', f"Photo of {len(employee_ids)} employee(s) changed during the rebuild; keeping their current encoding: {', '.join(employee_ids[:10])}")
+
+    # --- Results ---
+    def _record(self, employee_ids, digest, status, detail, encoding, cached):
+        if not cached and status in CACHED_STATUSES: self._cache_rows.append((digest, self.encoder, status, encoding, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        for employee_id in employee_ids:
+            self._done += 1
+            if status == 'ok':
+                self._shadows.append((encoding, digest, employee_id)); self.counts['cached' if cached else 'encoded'] += 1
+            else:
+                self.counts['failed'] += 1; self.failures.append((employee_id, status, detail or ''))
+        if len(self._shadows) + len(self._cache_rows) >= self.batch_size: self._flush()
+
+    def _flush(self):
+        # Shadows and cache rows of a batch commit together: after a crash, committed shadows are skipped and the rest hit the cache or re-encode
+        # The photo check runs under the write lock: update_employee_photo's clearing of the shadow can't slip in between
+        if not self._shadows and not self._cache_rows: return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = [shadow for shadow in self._shadows if self._current_hash(shadow[2]) == shadow[1]]
+            self._conn.executemany("INSERT OR REPLACE INTO encoding_cache (photo_hash, encoder, status, face_encoding, created_at) VALUES (?, ?, ?, ?, ?)", self._cache_rows)
+            self._conn.executemany("UPDATE employees SET face_encoding_shadow = ?, face_encoding_shadow_hash = ? WHERE employee_id = ?", current)
+            self._conn.commit()
+        except sqlite3.Error: self._conn.rollback(); raise
+        self._drop_stale([shadow[2] for shadow in self._shadows if shadow not in current]); self._shadows = []; self._cache_rows = []
+        rate = self.photos_per_second()
+        event_log.info('gallery_rebuild', f"Processed {self._done}/{self._total} employees ({rate:.1f} photos/s encoded): {self.counts['cached']} cached, {self.counts['encoded']} encoded, {self.counts['failed']} failed.", sample_key='gallery_rebuild.progress')
+        if self.on_progress: self.on_progress(self._done, self._total, rate)
+
+    def photos_per_second(self):
+        elapsed = time.perf_counter() - self._start
+        return self._encoded_photos / elapsed if elapsed > 0 else 0.0
+
+    # --- Phases ---
+    def _begin(self, restart):
+        """Returns the employee IDs still to process; clears stale shadows unless an unfinished run with the same settings is resumed."""
+        row = self._conn.execute("SELECT value FROM config WHERE key = ?", (REBUILD_STATE_KEY,)).fetchone()
+        if restart or row is None or row[0] != self.encoder:
+            if row is not None and row[0] != self.encoder: event_log.info('gallery_rebuild', "Encoder settings changed since the unfinished rebuild; starting over.")
+            self._conn.execute("UPDATE employees SET face_encoding_shadow = NULL, face_encoding_shadow_hash = NULL WHERE face_encoding_shadow IS NOT NULL")
+            self._conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", (REBUILD_STATE_KEY, self.encoder)); self._conn.commit()
+        rows = self._conn.execute("SELECT employee_id, face_encoding_shadow IS NOT NULL AND face_encoding_shadow_hash IS NOT NULL FROM employees ORDER BY employee_id").fetchall()
+        self.counts['employees'] = len(rows); self.counts['resumed'] = sum(1 for _, done in rows if done)
+        return [employee_id for employee_id, done in rows if not done]
+
+    def _encode_all(self, pending):
+        in_flight = {}; by_hash = {} # future -> (hash, [employee IDs]); hash -> future (employees sharing a photo share the work)
+        def collect(futures):
+            for future in futures:
+                digest, employee_ids = in_flight.pop(future); by_hash.pop(digest, None)
+                try: status, detail, encoding = future.result()
+                except BrokenProcessPool as e: self._pool_error = str(e) or "a worker process died"; continue # Not recorded: retried when the run resumes
+                except Exception as e: status, detail, encoding = 'error', f"Worker failed: {e}", None
+                self._encoded_photos += 1; self._record(employee_ids, digest, status, detail, encoding, cached=False)
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            for employee_id in pending:
+                if self._stop_event.is_set() or self._pool_error: break
+                path = find_employee_photo(employee_id, self.photo_dir)
+                if path is None: self._done += 1; self.counts['missing_photo'] += 1; continue
+                try: digest = self._hash_photo(employee_id, path)
+                except OSError as e: self._record([employee_id], None, 'unreadable_image', str(e), None, cached=True); continue
+                if digest in by_hash: in_flight[by_hash[digest]][1].append(employee_id); continue
+                cached = self._conn.execute(f"SELECT status, face_encoding FROM encoding_cache WHERE photo_hash = ? AND encoder = ? AND status IN ({', '.join('?' * len(CACHED_STATUSES))})",
+                                            (digest, self.encoder) + CACHED_STATUSES).fetchone() # Skips 'error' rows written by older versions
+                if cached: self._record([employee_id], digest, cached[0], "cached result", cached[1], cached=True); continue
+                try: future = executor.submit(encode_photo, path, self.strategy, True) # allow_multiple: largest face, as update_employee_photo does
+                except BrokenProcessPool as e: self._pool_error = str(e) or "a worker process died"; break
+                in_flight[future] = (digest, [employee_id]); by_hash[digest] = future
+                if len(in_flight) >= self.workers * IN_FLIGHT_PER_WORKER: collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            if self._stop_event.is_set() or self._pool_error:
+                for future in list(in_flight):
+                    if future.cancel(): digest, _ = in_flight.pop(future); by_hash.pop(digest, None)
+            collect(wait(in_flight).done)
+        self._flush()
+
+    def _swap(self):
+        """Moves every shadow encoding whose photo is unchanged into face_encoding in one transaction. Returns the number of employees updated."""
+        shadow_sql = "SELECT employee_id, face_encoding_shadow_hash FROM employees WHERE face_encoding_shadow IS NOT NULL"
+        for employee_id, _ in self._conn.execute(shadow_sql).fetchall(): self._current_hash(employee_id) # Hash resumed shadows' photos outside the lock
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = [employee_id for employee_id, digest in self._conn.execute(shadow_sql).fetchall() if self._current_hash(employee_id) != digest]
+            self._conn.executemany("UPDATE employees SET face_encoding_shadow = NULL, face_encoding_shadow_hash = NULL WHERE employee_id = ?", [(employee_id,) for employee_id in stale])
+            swapped = self._conn.execute("UPDATE employees SET face_encoding = face_encoding_shadow, face_encoding_shadow = NULL, face_encoding_shadow_hash = NULL WHERE face_encoding_shadow IS NOT NULL").rowcount
+            self._conn.execute("DELETE FROM config WHERE key = ?", (REBUILD_STATE_KEY,))
+            self._conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", (GALLERY_ENCODER_KEY, self.encoder))
+            self._conn.commit()
+        except sqlite3.Error: self._conn.rollback(); raise
+        self._drop_stale(stale); return swapped
+
+    def run(self, restart=False):
+        """Returns the counts plus 'completed' (False if stopped or failed; run again to resume), 'elapsed_s' and 'photos_per_s'
+           (photos encoded by the workers per second; cache hits are not counted)."""
+        self._start = time.perf_counter(); completed = False
+        try:
+            self._conn = sqlite3.connect(self.db_file, timeout=10.0)
+            pending = self._begin(restart); self._total = len(pending)
+            event_log.info('gallery_rebuild', f"Rebuilding the gallery ({self.encoder}): {len(pending)} employee(s) to process, {self.counts['resumed']} already done. Using {self.workers} worker process(es).")
+            self._encode_all(pending)
+            if self._pool_error: event_log.error('gallery_rebuild', f"Worker pool broke ({self._pool_error}); stopped after {self._done}/{self._total} employees, run it again to resume.")
+            elif self._stop_event.is_set(): event_log.info('gallery_rebuild', f"Rebuild stopped after {self._done}/{self._total} employees; run it again to resume.")
+            else: self.counts['swapped'] = self._swap(); completed = True
+        except sqlite3.Error as e: event_log.error('gallery_rebuild', f"Gallery rebuild failed (resumable): {e}")
+        finally:
+            if self._conn: self._conn.close(); self._conn = None
+        elapsed = time.perf_counter() - self._start
+        self.counts.update(completed=completed, elapsed_s=round(elapsed, 1), photos_per_s=round(self.photos_per_second(), 2))
+        if completed:
+            event_log.info('gallery_rebuild', f"Gallery rebuilt in {elapsed:.1f}s ({self.counts['photos_per_s']} photos/s encoded): {self.counts['swapped']} encoding(s) swapped in, "
+                                              f"{self.counts['cached']} from cache, {self.counts['encoded']} encoded, {self.counts['failed']} failed and {self.counts['missing_photo']} without a photo kept their old encoding"
+                                              + (f", {self.counts['stale']} with a photo updated meanwhile kept the new one." if self.counts['stale'] else "."))
+        return self.counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-encode every employee from their stored photo and swap the new encodings in.")
+    parser.add_argument("--workers", type=int, help=f"Detection/encoding processes (default: CPU count - 1, at most {MAX_DEFAULT_WORKERS}).")
+    parser.add_argument("--strategy", choices=ENROLLMENT_STRATEGIES, default=ENROLLMENT_DETECTION_STRATEGY, help="Face detection strategy for the photos.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Encodings committed per transaction.")
+    parser.add_argument("--photo-dir", default=EMPLOYEE_PHOTO_DIR)
+    parser.add_argument("--restart", action="store_true", help="Discard the progress of an unfinished rebuild.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_database()
+    job = GalleryRebuild(photo_dir=args.photo_dir, workers=args.workers, strategy=args.strategy, batch_size=args.batch_size)
+    try: counts = job.run(restart=args.restart)
+    except KeyboardInterrupt: print("Interrupted; run again to resume."); return 1
+    for employee_id, status, detail in job.failures: print(f"  {employee_id}: {status} {detail}")
+    return 0 if counts['completed'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
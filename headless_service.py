@@ -0,0 +1,223 @@
+# headless_service.py (Headless attendance runner for display-less door units - no Tk, PIL or matplotlib)
+import argparse
+import datetime
+import json
+import signal
+import threading
+import time
+import cv2
+
+from database_setup import setup_database
+from data_manager import load_known_faces
+from quantized_gallery import QuantizedGallery
+from shared_gallery import SharedGalleryReader, publish_gallery
+from face_engine import FaceRecognitionSystem
+from camera_manager import CameraManager
+from perf_metrics import METRICS
+import emotion_engine
+from attendance_archive import archive_closed_months
+from db_maintenance import MAINTENANCE
+from db_backup import BackupScheduler
+from sighting_journal import SightingJournal
+from presence_tracker import PRESENCE
+from attendance_evidence import EvidenceWriter
+from unknown_faces import UnknownFaceStore
+import event_log
+
+# --- Defaults (overridden by the config file, then by CLI flags) ---
+DEFAULT_CONFIG = {
+    "cameras": [],                   # Camera indices/device paths/URLs, video files, image folders or 'synthetic',
+                                     # or {"name": ..., "source": ..., "detector": ...}; empty = probe 0, 1, 2, -1
+    "detector": "hog",               # Default face detector: hog, cnn, haar[:file], dnn:<model>[:<config>] (face_detectors.py)
+    "playback": "realtime",          # Replay sources: 'realtime' (original pace) or 'fast' (as fast as possible)
+    "loop_replay": False,
+    "recognition_scale": 0.5,        # Fixed detection scale (used when adaptive_detection is off)
+    "adaptive_detection": True,      # Per-camera detection scale/upsampling from recent face sizes
+    "quality_gate": True,            # Defer blurred/dark/tiny/turned faces to a later frame instead of encoding them
+    "min_face_px": 80,               # Smallest face (full-resolution px) adaptive detection must find; raise for close-range kiosks
+    "max_recognition_fps": 6,        # Per camera
+    "worker_count": 2,               # Recognition/emotion workers shared by all cameras
+    "target_fps": 30,
+    "log_cooldown_seconds": 10,
+    "detect_emotion": True,
+    "gallery_reload_seconds": 300,   # Pick up employees enrolled from the admin GUI; 0 disables
+    "db_maintenance": True,          # ANALYZE/optimize/incremental vacuum/WAL checkpoint when no camera has seen a face for a while
+    "backup_interval_hours": 24,     # Verified online snapshots (db_backup.py); 0 disables
+    "backup_dir": "backups",
+    "backup_keep": 7,                # Snapshots kept by rotation
+    "sighting_journal_dir": "sightings", # Every recognition (not just the daily log) in memory-mapped segments; null disables
+    "evidence_dir": "evidence",          # Face crop + context JPEG per attendance row (attendance_evidence.py); null disables
+    "quantized_gallery": False,          # int8 gallery + memory-mapped float32 re-ranking (quantized_gallery.py) for low-RAM boxes
+    "shared_gallery": None,              # Base path (e.g. "gallery_shared"): map one published gallery instead of a private copy per process (shared_gallery.py)
+    "shared_gallery_publisher": False,   # true in exactly one process per box (unless the GUI runs there): it loads the database and publishes, the others only attach
+    "unknown_clustering": True,          # Cluster unmatched faces (returning visitors skip the gallery scan; daily counts in unknown_visitors)
+    "presence_gap_seconds": 900,         # A recognition this long after the previous one starts a new presence session
+    "archive_keep_months": 1,        # Once a day, move months older than this out of attendance_logs (attendance_archive.py); 0 disables
+    "status_interval_seconds": 60,   # Periodic FPS/status line; 0 disables
+    "metrics_enabled": False,        # Per-stage timers (perf_metrics.py)
+    "metrics_file": None,            # Append a metrics snapshot (JSON lines) to this file periodically
+    "metrics_interval_seconds": 30,
+    "log_level": "INFO",             # Console level of the event log: DEBUG, INFO, WARNING or ERROR
+    "event_log_file": None,          # Also append every event (JSON lines, DEBUG and up) to this file
+}
+CAMERA_INDICES_TO_TRY = [0, 1, 2, -1]
+
+
+def load_config(config_path=None, overrides=None):
+    """Merges DEFAULT_CONFIG, an optional JSON config file and CLI overrides (None values are ignored)."""
+    config = dict(DEFAULT_CONFIG)
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f: file_config = json.load(f)
+        unknown_keys = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown_keys: print(f"Warning: Ignoring unknown config keys: {sorted(unknown_keys)}")
+        config.update({k: v for k, v in file_config.items() if k in DEFAULT_CONFIG})
+    if overrides: config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+def probe_camera_index():
+    """Returns the first camera index that opens and delivers a frame (same order as the GUI)."""
+    for index in CAMERA_INDICES_TO_TRY:
+        cap = cv2.VideoCapture(index)
+        try:
+            if cap is not None and cap.isOpened():
+                ret, frame = cap.read()
+                if ret and frame is not None: event_log.info('headless', f"Camera found (index {index})."); return index
+                event_log.warning('headless', f"Camera index {index} opened but failed to read frame.")
+            else: event_log.info('headless', f"Camera index {index} failed to open.")
+        finally:
+            if cap is not None: cap.release()
+    raise IOError(f"Cannot open any camera (tried indices {CAMERA_INDICES_TO_TRY}).")
+
+
+def resolve_camera_sources(cameras):
+    """Normalises the "cameras" config entry into [(name, source, detector or None), ...]."""
+    if not cameras: return [("cam0", probe_camera_index(), None)]
+    sources = []
+    for i, entry in enumerate(cameras):
+        if isinstance(entry, dict): sources.append((entry.get("name", f"cam{i}"), entry["source"], entry.get("detector")))
+        else: sources.append((f"cam{i}", int(entry) if str(entry).lstrip('-').isdigit() else entry, None))
+    return sources
+
+
+class HeadlessAttendanceService:
+    """Runs the shared-gallery camera manager without any GUI."""
+    def __init__(self, config):
+        self.config = config
+        self.stop_event = threading.Event()
+        self.face_system = FaceRecognitionSystem()
+        self.unknown_store = UnknownFaceStore() if config["unknown_clustering"] else None; self.face_system.unknown_store = self.unknown_store
+        self.last_gallery_load = 0.0
+        self.shared_gallery = SharedGalleryReader(config["shared_gallery"]) if config["shared_gallery"] else None
+        self.reload_known_faces()
+        self.journal = SightingJournal(config["sighting_journal_dir"]) if config["sighting_journal_dir"] else None
+        self.camera_manager = CameraManager(
+            self.face_system, resolve_camera_sources(config["cameras"]), worker_count=config["worker_count"],
+            recognition_scale=config["recognition_scale"], max_recognition_fps=config["max_recognition_fps"],
+            detect_emotion=config["detect_emotion"], log_cooldown_seconds=config["log_cooldown_seconds"],
+            target_fps=config["target_fps"], playback=config["playback"], loop_replay=config["loop_replay"],
+            adaptive_detection=config["adaptive_detection"], min_face_px=config["min_face_px"], detector=config["detector"],
+            quality_gate=config["quality_gate"], on_faces=MAINTENANCE.note_activity, journal=self.journal, presence=PRESENCE,
+            evidence=EvidenceWriter(config["evidence_dir"]) if config["evidence_dir"] else None)
+
+    def reload_known_faces(self):
+        self.last_gallery_load = time.time()
+        if self.shared_gallery is not None:
+            if self.config["shared_gallery_publisher"]:
+                ids, encodings = load_known_faces()
+                try: publish_gallery(ids, encodings, self.config["shared_gallery"]) # No-op when nothing changed
+                except OSError as e: event_log.error('headless', f"Publishing the shared gallery failed: {e}")
+            if not self.refresh_shared_gallery() and not self.shared_gallery.generation:
+                event_log.warning('headless', f"No shared gallery published at {self.config['shared_gallery']} yet; recognizing nobody until one is.", sample_key='headless.shared_gallery')
+            return
+        ids, encodings = load_known_faces()
+        if self.config["quantized_gallery"]: encodings = QuantizedGallery.from_encodings(encodings)
+        self.face_system.set_gallery(ids, encodings)
+        event_log.info('headless', f"Loaded {len(ids)} known faces.")
+
+    def refresh_shared_gallery(self):
+        # Cheap (one mapped read) unless a new generation was published, e.g. after an enrollment in the GUI
+        if not self.shared_gallery.refresh(): return False
+        self.face_system.set_gallery(self.shared_gallery.ids, self.shared_gallery.encodings)
+        return True
+
+    def stop(self, *_):
+        """Signal-safe: only sets the stop flag, run() does the actual shutdown."""
+        self.stop_event.set()
+
+    def run(self):
+        reload_seconds = self.config["gallery_reload_seconds"]; status_seconds = self.config["status_interval_seconds"]
+        last_status = time.time(); keep_months = self.config["archive_keep_months"]; archive_day = None
+        METRICS.enable(self.config["metrics_enabled"] or bool(self.config["metrics_file"]))
+        if self.config["metrics_file"]: METRICS.start_file_dump(self.config["metrics_file"], self.config["metrics_interval_seconds"])
+        if self.unknown_store: self.unknown_store.start()
+        PRESENCE.gap_seconds = self.config["presence_gap_seconds"]; PRESENCE.start() # Continues today's open sessions after a restart
+        self.camera_manager.start()
+        if self.config["db_maintenance"]: MAINTENANCE.start() # Idle windows are detected from the cameras (on_faces)
+        backups = BackupScheduler(backup_dir=self.config["backup_dir"], interval_hours=self.config["backup_interval_hours"], keep=self.config["backup_keep"]) if self.config["backup_interval_hours"] else None
+        if backups: backups.start()
+        if self.config["detect_emotion"]: # Load DeepFace/TensorFlow while the cameras open instead of on the first logged face
+            threading.Thread(target=emotion_engine.preload_emotion_model, daemon=True, name="emotion-preload").start()
+        try:
+            while not self.stop_event.wait(1.0):
+                now = time.time()
+                if keep_months and archive_day != datetime.date.today(): # Small, quick transactions; runs beside the cameras
+                    archive_day = datetime.date.today(); threading.Thread(target=archive_closed_months, args=(keep_months,), daemon=True, name="archive").start()
+                if reload_seconds and now - self.last_gallery_load > reload_seconds: self.reload_known_faces()
+                elif self.shared_gallery is not None: self.refresh_shared_gallery()
+                if status_seconds and now - last_status > status_seconds:
+                    event_log.info('headless', f"Status: {self.camera_manager.get_status_summary()}, {PRESENCE.occupancy_count()} present"); last_status = now
+        finally:
+            self.camera_manager.stop()
+            MAINTENANCE.stop()
+            if backups: backups.stop()
+            if self.journal: self.journal.close()
+            PRESENCE.stop() # Final flush of the sessions
+            if self.unknown_store: self.unknown_store.stop()
+            METRICS.stop_file_dump()
+
+
+def install_signal_handlers(service):
+    signal.signal(signal.SIGINT, service.stop)
+    signal.signal(signal.SIGTERM, service.stop)
+    if hasattr(signal, 'SIGBREAK'): signal.signal(signal.SIGBREAK, service.stop) # Ctrl+Break on Windows consoles
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the attendance system without a GUI.")
+    parser.add_argument("--config", help="JSON config file (keys as in DEFAULT_CONFIG).")
+    parser.add_argument("--camera", dest="cameras", action="append", help="Camera index, device path or URL; repeat for several cameras (default: probe 0, 1, 2, -1).")
+    parser.add_argument("--playback", choices=["realtime", "fast"], help="Pace for video-file/image-folder sources.")
+    parser.add_argument("--workers", dest="worker_count", type=int, help="Recognition workers shared by all cameras.")
+    parser.add_argument("--scale", dest="recognition_scale", type=float, help="Recognition downscale factor (fixed detection).")
+    parser.add_argument("--fixed-scale", dest="adaptive_detection", action="store_const", const=False, help="Disable adaptive detection scaling.")
+    parser.add_argument("--detector", help="Face detector for all cameras: hog, cnn, haar[:file] or dnn:<model>[:<config>].")
+    parser.add_argument("--no-quality-gate", dest="quality_gate", action="store_const", const=False, help="Encode every detected face, whatever its quality.")
+    parser.add_argument("--min-face-px", type=int, help="Smallest face height in px that adaptive detection must find.")
+    parser.add_argument("--max-recognition-fps", type=float, help="Per-camera recognition rate limit.")
+    parser.add_argument("--fps", dest="target_fps", type=float, help="Target capture frame rate.")
+    parser.add_argument("--cooldown", dest="log_cooldown_seconds", type=float, help="Seconds between log attempts per employee.")
+    parser.add_argument("--metrics-file", help="Enable per-stage metrics and append snapshots to this JSON-lines file.")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], type=str.upper, help="Console level of the event log.")
+    parser.add_argument("--event-log", dest="event_log_file", help="Append structured events (JSON lines) to this file.")
+    parser.add_argument("--no-emotion", dest="detect_emotion", action="store_const", const=False, help="Skip emotion detection.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    overrides = {k: v for k, v in vars(args).items() if k != "config"}
+    try: config = load_config(args.config, overrides)
+    except (OSError, ValueError) as e: print(f"Error loading config file {args.config}: {e}"); return 1
+    event_log.EVENTS.configure(console_level=config["log_level"], file_path=config["event_log_file"])
+    setup_database()
+    try: service = HeadlessAttendanceService(config)
+    except IOError as e: event_log.error('headless', str(e)); return 1
+    install_signal_handlers(service)
+    service.run()
+    event_log.info('headless', "Headless attendance service stopped.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
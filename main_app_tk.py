@@ -1,25 +1,25 @@
-# main_app_tk.py (Final Version v4 - Includes L275 Syntax Fix and All Features - Updated Shutdown)
+# main_app_tk.py (Final Version v4 - Includes L275 Syntax Fix and All Features - Updated Shutdown - Lazy heavy imports/admin tabs)
+import time
+_STARTUP_T0 = time.perf_counter() # Startup milestones (see mark_startup) are measured from here
 import tkinter as tk
 from tkinter import ttk # Themed widgets
 from tkinter import messagebox, filedialog
 import cv2
 from PIL import Image, ImageTk
 import threading
-import time
 import os
+import sys
 import sqlite3
 from datetime import datetime, date, timedelta
 import calendar
 import itertools
 import shutil
+import traceback
 
 # --- Plotting and Data Handling ---
-import matplotlib
-matplotlib.use('TkAgg') # Explicitly set backend BEFORE importing pyplot
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+# matplotlib is imported on first use (Emotion Analysis tab) or by the background preload, see load_matplotlib()
+plt = None; FigureCanvasTkAgg = None
 from collections import Counter, defaultdict
-import pandas as pd
 import numpy as np
 
 # --- Optional Imports for UI Enhancements ---
@@ -37,12 +37,28 @@ except ImportError:
 # Ensure these files exist in the same directory
 try:
     from database_setup import setup_database, DATABASE_FILE
+    from attendance_archive import archive_closed_months
+    from db_maintenance import MAINTENANCE
+    from db_backup import BackupScheduler, backup_database
+    from sighting_journal import SightingJournal
+    from presence_tracker import PRESENCE
+    from frame_ring import FrameRing
+    from unknown_faces import UnknownFaceStore, get_daily_counts
+    from gallery_rebuild import GalleryRebuild
+    from attendance_evidence import EvidenceWriter, prepare_evidence, get_evidence
     from data_manager import (
-        add_employee, load_known_faces, get_employee_name, log_attendance,
+        add_employee, add_employee_from_frame, load_known_faces, get_employee_name, log_attendance,
         get_all_employees, update_employee_details, update_employee_photo, delete_employee_data
     )
-    from face_engine import FaceRecognitionSystem
-    from emotion_engine import detect_emotion_from_face # Uses updated emotion_engine.py
+    from quantized_gallery import QuantizedGallery
+    from shared_gallery import SharedGalleryReader, publish_gallery
+    from face_engine import FaceRecognitionSystem, AdaptiveScaleController, crop_face, largest_face
+    from face_quality import QualityGate
+    from frame_pacer import FramePacer
+    from frame_sources import open_frame_source, open_camera, is_camera_spec, Backoff, DEFAULT_CAMERA_CANDIDATES, CAMERA_CACHE_FILE
+    from perf_metrics import METRICS
+    import event_log
+    from emotion_engine import detect_emotion_from_face, preload_emotion_model # DeepFace/TensorFlow load on first use or preload
     from admin_logic import (
         verify_admin_password, get_attendance_logs, export_logs_to_csv,
         reset_attendance_emotion_data, analyze_notification_data
@@ -58,12 +74,67 @@ WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
 CAMERA_FRAME_WIDTH = 640
 CAMERA_FRAME_HEIGHT = 480
-RECOGNITION_SCALE = 0.5
+RECOGNITION_SCALE = 0.5 # Fixed detection scale, used when ADAPTIVE_DETECTION is off
+ADAPTIVE_DETECTION = True # Pick detection scale/upsampling per frame from recent face sizes (face_engine.AdaptiveScaleController)
+DETECTOR_BACKEND = 'hog' # Face detector: 'hog', 'cnn', 'haar[:cascade.xml]' or 'dnn:<model>[:<config>]' (see face_detectors.py)
+QUALITY_GATE_ENABLED = True # Skip encoding/emotion for blurred, badly lit, tiny or turned faces until a better frame arrives (face_quality.py)
+MIN_FACE_PX = 80 # Smallest face height (full-resolution px) adaptive detection must still find; raise for close-range kiosks
+TARGET_FPS = 30 # Frame budget for the camera loop (only the unused part is slept)
+SHOW_FPS_OVERLAY = False # Draw achieved capture/process/render FPS on the video feed
+PERF_METRICS_ENABLED = False # Per-stage timers (can also be toggled from the admin 'Performance' tab)
+PERF_METRICS_FILE = None # e.g. "perf_metrics.jsonl" to append a metrics snapshot periodically
+PERF_METRICS_DUMP_SECONDS = 30
+EVENT_LOG_LEVEL = 'INFO'  # Console level of the event log (DEBUG shows enrollment/gallery details)
+EVENT_LOG_FILE = None     # e.g. 'events.jsonl' to also keep a JSON-lines event file
+PERF_PANEL_REFRESH_MS = 1000
+PRESENCE_GAP_SECONDS = 900 # Recognitions further apart than this start a new presence session; also how long someone counts as 'in the building'
+PRESENCE_PANEL_REFRESH_MS = 2000
+VIDEO_SOURCE = None # None = last working camera (camera_cache.json), else probe cameras 0, 1, 2, -1 in parallel; or a camera index, video file, image folder or 'synthetic' (see frame_sources.py)
+CAMERA_MAX_FAILED_READS = 20 # Consecutive failed reads (~0.1s apart) before the camera is released and reopened
 LOG_COOLDOWN_SECONDS = 10
 ENROLL_COUNTDOWN_SECONDS = 3
+ENROLL_DETECTION_MAX_AGE_SECONDS = 1.0 # Capture enrollment reuses the live face box if it is at most this old
 EMPLOYEE_PHOTO_DIR = "employee_photos" # Make sure this directory exists
 NOTIFICATION_EMOTION_THRESHOLD = 2 # Days for negative emotion streak
 NOTIFICATION_ATTENDANCE_THRESHOLD = 3 # Days for attendance streak
+DB_MAINTENANCE_ENABLED = True # ANALYZE/optimize/incremental vacuum/WAL checkpoint once the camera has seen no face for a while (db_maintenance.py)
+BACKUP_INTERVAL_HOURS = 24 # Verified online snapshots into backups/ (db_backup.py, keeps the newest 7); 0 disables
+SIGHTING_JOURNAL_DIR = "sightings" # Every recognition (not only the first one per day) in memory-mapped segments (sighting_journal.py); None disables
+EVIDENCE_DIR = "evidence" # Face crop + small context frame saved per attendance row, in the background (attendance_evidence.py); None disables
+UNKNOWN_CLUSTERING = True # Cluster unmatched faces (unknown_faces.py): returning visitors skip the gallery scan, daily counts, promotion in the admin tab
+QUANTIZED_GALLERY = False # Keep the gallery as int8 + a memory-mapped float32 file (quantized_gallery.py): ~136 B/employee in RAM instead of ~1.1 KB
+SHARED_GALLERY_FILE = None # e.g. "gallery_shared": publish the gallery for headless recognition processes on this box and use the shared copy (shared_gallery.py); takes precedence over QUANTIZED_GALLERY
+FRAME_RING_SLOTS = 30 # Preallocated frames kept by the camera thread (~1 s); enrollment and evidence read from them
+ARCHIVE_KEEP_MONTHS = 1 # On start, months older than this move from attendance_logs to archive/ files (attendance_archive.py); 0 disables
+PRELOAD_DELAY_MS = 1500 # DeepFace/TensorFlow and matplotlib are imported in the background this long after the window is up
+PROFILE_STARTUP = '--profile-startup' in sys.argv or os.environ.get('AIAS_PROFILE_STARTUP') == '1' # Log startup milestones and profile app construction
+STARTUP_PROFILE_FILE = "startup_profile.prof" # cProfile stats of AttendanceApp construction when PROFILE_STARTUP is on (view with snakeviz/pstats)
+
+# --- Startup profiling and lazy imports ---
+STARTUP_MILESTONES = {} # milestone -> seconds since launch (first occurrence only)
+
+def mark_startup(milestone):
+    """Records a startup milestone once. Logged when PROFILE_STARTUP is on; time to first recognition is always logged."""
+    if milestone in STARTUP_MILESTONES: return
+    STARTUP_MILESTONES[milestone] = elapsed = time.perf_counter() - _STARTUP_T0
+    if PROFILE_STARTUP or milestone == 'first_recognition':
+        event_log.info('startup', f"{milestone}: {elapsed * 1000:.0f} ms after launch", milestone=milestone, elapsed_ms=round(elapsed * 1000, 1))
+
+_matplotlib_lock = threading.Lock()
+
+def load_matplotlib():
+    """Imports matplotlib with the TkAgg backend on first call (sets the module-level plt / FigureCanvasTkAgg)."""
+    global plt, FigureCanvasTkAgg
+    with _matplotlib_lock:
+        if plt is None:
+            import matplotlib
+            matplotlib.use('TkAgg') # Explicitly set backend BEFORE importing pyplot
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg as canvas_class
+            import matplotlib.pyplot as pyplot
+            FigureCanvasTkAgg = canvas_class; plt = pyplot
+    return plt
+
+mark_startup('imports')
 
 # --- Custom Admin Login Dialog ---
 class AdminLoginDialog(tk.Toplevel):
@@ -108,17 +179,40 @@ class AttendanceApp:
         self.style.configure('Blue.TButton', foreground='white', background='#007bff', font=('Arial', 10, 'bold'), padding=[10, 5, 10, 5]); self.style.map('Blue.TButton', background=[('active', '#0056b3'), ('disabled', '#cccccc')], foreground=[('disabled', '#666666')])
         self.style.configure('AccentBlue.TButton', foreground='white', background='#0d6efd', font=('Arial', 10, 'bold'), padding=[10, 5, 10, 5]); self.style.map('AccentBlue.TButton', background=[('active', '#0b5ed7'), ('disabled', '#cccccc')], foreground=[('disabled', '#666666')])
         self.style.configure('Red.TButton', foreground='white', background='#dc3545', font=('Arial', 10, 'bold'), padding=[10, 5, 10, 5]); self.style.map('Red.TButton', background=[('active', '#bb2d3b'), ('disabled', '#cccccc')], foreground=[('disabled', '#666666')])
-        self.style.configure('Enroll.TFrame', background='#E6E6FA'); self.style.configure('Logs.TFrame', background='#F0F8FF'); self.style.configure('Details.TFrame', background='#FFFACD'); self.style.configure('Emotion.TFrame', background='#F5FFFA'); self.style.configure('Notify.TFrame', background='#FFE4E1'); self.style.configure('Manage.TFrame', background='#E0FFFF')
+        self.style.configure('Enroll.TFrame', background='#E6E6FA'); self.style.configure('Logs.TFrame', background='#F0F8FF'); self.style.configure('Details.TFrame', background='#FFFACD'); self.style.configure('Emotion.TFrame', background='#F5FFFA'); self.style.configure('Notify.TFrame', background='#FFE4E1'); self.style.configure('Manage.TFrame', background='#E0FFFF'); self.style.configure('Perf.TFrame', background='#F5F5F5'); self.style.configure('Presence.TFrame', background='#F0FFF0'); self.style.configure('Unknown.TFrame', background='#FFF5EE')
 
         # Initialize variables
-        self.is_admin_mode = False; self.camera_active = False; self.video_thread = None; self.latest_frame = None
+        self.is_admin_mode = False; self.camera_active = False; self.video_thread = None; self.latest_detection = None # (frame sequence in frame_ring, face boxes, box scale, time)
+        self.frame_ring = FrameRing(FRAME_RING_SLOTS) # Written in place by the camera thread; no per-frame copies
+        self.scale_controller = AdaptiveScaleController(MIN_FACE_PX); self.results_scale = RECOGNITION_SCALE # Scale of the boxes in recognition_results
+        self.quality_gate = QualityGate() if QUALITY_GATE_ENABLED else None
         self.frame_lock = threading.Lock(); self.stop_video_event = threading.Event(); self.last_log_time = {}; self.enrollment_in_progress = False; self.emp_details_list = {}
         self.emp_id_to_enroll = None; self.emp_name_to_enroll = None; self.emp_dept_to_enroll = None; self.selected_manage_emp_id = None
         self.enroll_photo_source = tk.StringVar(value="Capture"); self.uploaded_photo_path = tk.StringVar(value="")
+        self.frame_pacer = FramePacer(TARGET_FPS)
+        METRICS.enable(PERF_METRICS_ENABLED or bool(PERF_METRICS_FILE)); self.perf_metrics_enabled = tk.BooleanVar(value=METRICS.enabled) # A metrics file needs them on
+        self.perf_panel_after = None # Pending root.after() of the Performance tab refresh (one chain at a time)
+        self.presence_panel_after = None # Same for the Presence tab
+        if PERF_METRICS_FILE: METRICS.start_file_dump(PERF_METRICS_FILE, PERF_METRICS_DUMP_SECONDS)
+        event_log.EVENTS.configure(console_level=EVENT_LOG_LEVEL, file_path=EVENT_LOG_FILE)
+        if DB_MAINTENANCE_ENABLED: MAINTENANCE.start() # Idle windows come from note_activity() in the camera loop
+        self.backup_scheduler = BackupScheduler(interval_hours=BACKUP_INTERVAL_HOURS) if BACKUP_INTERVAL_HOURS else None
+        if self.backup_scheduler: self.backup_scheduler.start()
+        PRESENCE.gap_seconds = PRESENCE_GAP_SECONDS; PRESENCE.start() # Loads today's sessions, then flushes changes every 30 s
+        self.evidence_writer = EvidenceWriter(EVIDENCE_DIR) if EVIDENCE_DIR else None
+        if self.evidence_writer: self.evidence_writer.start()
+        self.sighting_journal = SightingJournal(SIGHTING_JOURNAL_DIR) if SIGHTING_JOURNAL_DIR else None; self.camera_label = ""
 
         # Initialize systems
-        print("Initializing Face Recognition..."); self.face_system = FaceRecognitionSystem()
-        print("Loading known faces..."); known_face_ids, known_face_encodings = load_known_faces(); self.face_system.known_face_ids = known_face_ids; self.face_system.known_face_encodings = known_face_encodings; print(f"Loaded {len(self.face_system.known_face_ids)} faces.")
+        print("Initializing Face Recognition...")
+        try: self.face_system = FaceRecognitionSystem(DETECTOR_BACKEND)
+        except (ValueError, cv2.error) as e: event_log.error('face_engine', f"Detector '{DETECTOR_BACKEND}' unavailable ({e}); using dlib HOG."); self.face_system = FaceRecognitionSystem()
+        self.shared_gallery = SharedGalleryReader(SHARED_GALLERY_FILE) if SHARED_GALLERY_FILE else None
+        print("Loading known faces..."); print(f"Loaded {self.reload_gallery()} faces.")
+        mark_startup('gallery_loaded')
+        self.unknown_store = UnknownFaceStore() if UNKNOWN_CLUSTERING else None; self.face_system.unknown_store = self.unknown_store
+        self.gallery_rebuild = None # Running GalleryRebuild job (admin 'Rebuild Face Gallery' button)
+        if self.unknown_store: self.unknown_store.start()
 
         # Create main frames
         self.main_frame = ttk.Frame(root, padding="10"); self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -133,6 +227,15 @@ class AttendanceApp:
 
         # Show initial view and start camera
         self.show_attendance_view(); self.start_camera_thread(); self.set_status("Camera starting...", "blue")
+        self.root.after(PRELOAD_DELAY_MS, self.start_background_preload); mark_startup('window_ready')
+
+    def start_background_preload(self):
+        """Imports the heavy modules (DeepFace/TensorFlow, matplotlib) off the Tk thread once the camera is up."""
+        def _preload():
+            if preload_emotion_model(): mark_startup('emotion_model_ready')
+            try: load_matplotlib(); mark_startup('matplotlib_ready')
+            except Exception as e: event_log.warning('startup', f"matplotlib preload failed: {e}")
+        if not self.shutting_down: threading.Thread(target=_preload, daemon=True, name="preload").start()
 
     def create_attendance_view(self):
         self.attendance_frame = ttk.Frame(self.content_frame, padding="10")
@@ -145,17 +248,28 @@ class AttendanceApp:
         # Frame for admin-specific actions like reset
         admin_action_frame = ttk.Frame(self.admin_frame); admin_action_frame.pack(fill=tk.X, pady=(0, 10))
         self.reset_button = ttk.Button(admin_action_frame, text="Reset All Attendance Data", command=self.confirm_and_reset_data, style='Red.TButton'); self.reset_button.pack(side=tk.RIGHT, padx=10)
+        self.backup_button = ttk.Button(admin_action_frame, text="Backup Database Now", command=self.backup_now, style='Blue.TButton'); self.backup_button.pack(side=tk.RIGHT, padx=10)
+        self.rebuild_button = ttk.Button(admin_action_frame, text="Rebuild Face Gallery", command=self.rebuild_gallery_now, style='Blue.TButton'); self.rebuild_button.pack(side=tk.RIGHT, padx=10)
         # Notebook for different admin panels
         self.admin_notebook = ttk.Notebook(self.admin_frame)
-        # Create and add tabs
-        enroll_tab = ttk.Frame(self.admin_notebook, padding="15", style='Enroll.TFrame'); self.create_enrollment_tab(enroll_tab); self.admin_notebook.add(enroll_tab, text=' Enroll Employee ')
-        logs_tab = ttk.Frame(self.admin_notebook, padding="15", style='Logs.TFrame'); self.create_logs_tab(logs_tab); self.admin_notebook.add(logs_tab, text=' View Logs ')
-        emp_details_tab = ttk.Frame(self.admin_notebook, padding="15", style='Details.TFrame'); self.create_employee_details_tab(emp_details_tab); self.admin_notebook.add(emp_details_tab, text=' Employee Details ')
-        emotion_tab = ttk.Frame(self.admin_notebook, padding="15", style='Emotion.TFrame'); self.create_emotion_analysis_tab(emotion_tab); self.admin_notebook.add(emotion_tab, text=' Emotion Analysis ')
-        notify_tab = ttk.Frame(self.admin_notebook, padding="15", style='Notify.TFrame'); self.create_notification_tab(notify_tab); self.admin_notebook.add(notify_tab, text=' Notification Panel ')
-        manage_tab = ttk.Frame(self.admin_notebook, padding="15", style='Manage.TFrame'); self.create_manage_employee_tab(manage_tab); self.admin_notebook.add(manage_tab, text=' Manage Employee ')
+        # Add empty tabs; each one's widgets are built the first time it is selected (see ensure_admin_tab)
+        self.admin_tab_builders = {} # tab text -> (tab frame, builder) for tabs not built yet
+        for text, style, builder in ((' Enroll Employee ', 'Enroll.TFrame', self.create_enrollment_tab), (' View Logs ', 'Logs.TFrame', self.create_logs_tab),
+                                     (' Employee Details ', 'Details.TFrame', self.create_employee_details_tab), (' Emotion Analysis ', 'Emotion.TFrame', self.create_emotion_analysis_tab),
+                                     (' Notification Panel ', 'Notify.TFrame', self.create_notification_tab), (' Manage Employee ', 'Manage.TFrame', self.create_manage_employee_tab),
+                                     (' Presence ', 'Presence.TFrame', self.create_presence_tab),
+                                     (' Unknown Visitors ', 'Unknown.TFrame', self.create_unknown_visitors_tab), (' Performance ', 'Perf.TFrame', self.create_performance_tab)):
+            tab = ttk.Frame(self.admin_notebook, padding="15", style=style); self.admin_notebook.add(tab, text=text)
+            self.admin_tab_builders[text.strip()] = (tab, builder)
         self.admin_notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5); self.admin_notebook.bind("<<NotebookTabChanged>>", self.on_admin_tab_change)
 
+    def ensure_admin_tab(self, tab_text):
+        """Builds an admin tab's widgets the first time it is needed (no-op afterwards)."""
+        tab, builder = self.admin_tab_builders.pop(tab_text, (None, None))
+        if builder is None: return
+        start = time.perf_counter(); builder(tab)
+        event_log.debug('admin', f"Built admin tab '{tab_text}' in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
     # --- Helper methods for creating tabs ---
     def create_enrollment_tab(self, parent_tab):
         # Frame for employee details input
@@ -217,9 +331,11 @@ class AttendanceApp:
         log_display_frame.grid_rowconfigure(0, weight=1); log_display_frame.grid_columnconfigure(0, weight=1)
         # Configure alternating row colors
         self.log_tree.tag_configure('oddrow', background='white'); self.log_tree.tag_configure('evenrow', background='#E8E8E8')
+        self.log_tree.bind('<Double-1>', self.show_log_evidence) # Face crop + context frame saved when the row was written
         # Frame for export button
         export_frame = ttk.Frame(parent_tab); export_frame.pack(fill=tk.X, pady=10)
         self.export_button = ttk.Button(export_frame, text="Export Displayed Logs to CSV", command=self.export_displayed_logs, style='Blue.TButton'); self.export_button.pack()
+        ttk.Label(export_frame, text="Double-click a log to see its evidence photos.", foreground="grey").pack(pady=(5, 0))
 
     def create_employee_details_tab(self, parent_tab):
         # Frame for employee selection and month input
@@ -241,6 +357,7 @@ class AttendanceApp:
         self.emp_attendance_tree.tag_configure('oddrow', background='white'); self.emp_attendance_tree.tag_configure('evenrow', background='#E8E8E8')
 
     def create_emotion_analysis_tab(self, parent_tab):
+        load_matplotlib() # First use of matplotlib unless the background preload got there first
         # Frame to hold the Matplotlib chart
         chart_frame = ttk.LabelFrame(parent_tab, text="Overall Emotion Distribution (All Logs)", padding=10); chart_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0), padx=5)
         # Create Matplotlib figure and axes
@@ -294,6 +411,150 @@ class AttendanceApp:
         self.manage_photo_label = tk.Label(manage_photo_frame, text="Select Employee", anchor=tk.CENTER, background="lightgrey", relief=tk.GROOVE, width=20, height=10); self.manage_photo_label.pack(expand=True)
         ttk.Button(photo_delete_frame, text="Delete Employee", command=self.delete_employee_action, style='Red.TButton').pack(fill=tk.X)
 
+    def create_performance_tab(self, parent_tab):
+        # Controls: enable/disable timers, reset, live FPS line
+        control_frame = ttk.Frame(parent_tab); control_frame.pack(fill=tk.X, pady=5)
+        ttk.Checkbutton(control_frame, text="Enable performance metrics", variable=self.perf_metrics_enabled, command=self.toggle_perf_metrics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Reset Metrics", command=METRICS.reset, style='Blue.TButton').pack(side=tk.LEFT, padx=10)
+        ttk.Button(control_frame, text="Export Recent Events", command=self.export_recent_events, style='Blue.TButton').pack(side=tk.LEFT, padx=10)
+        self.perf_fps_label = ttk.Label(control_frame, text="", font=("Arial", 10, "bold")); self.perf_fps_label.pack(side=tk.RIGHT, padx=5)
+        # Per-stage latency table (rolling window)
+        stage_frame = ttk.LabelFrame(parent_tab, text="Stage Latency (last 60 s)", padding=10); stage_frame.pack(fill=tk.BOTH, expand=True, pady=5); stage_frame.columnconfigure(0, weight=1); stage_frame.rowconfigure(0, weight=1)
+        cols_perf = ('Stage', 'Count', 'Mean ms', 'p50 ms', 'p95 ms', 'p99 ms'); self.perf_tree = ttk.Treeview(stage_frame, columns=cols_perf, show='headings', height=10)
+        for col in cols_perf: self.perf_tree.heading(col, text=col); self.perf_tree.column(col, width=150 if col == 'Stage' else 90, stretch=(col == 'Stage'), anchor=tk.W if col == 'Stage' else tk.E)
+        self.perf_tree.grid(row=0, column=0, sticky='nsew'); self.perf_tree.tag_configure('oddrow', background='white'); self.perf_tree.tag_configure('evenrow', background='#E8E8E8')
+        # Counters
+        self.perf_counters_label = ttk.Label(parent_tab, text="", font=("Arial", 10), anchor=tk.W, justify=tk.LEFT); self.perf_counters_label.pack(fill=tk.X, pady=5)
+
+    def create_presence_tab(self, parent_tab):
+        # Live occupancy ("who is in the building now") on top, the day's presence sessions below; both come from the in-memory tracker
+        control_frame = ttk.Frame(parent_tab); control_frame.pack(fill=tk.X, pady=5)
+        self.occupancy_label = ttk.Label(control_frame, text="", font=("Arial", 12, "bold")); self.occupancy_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Load Day", command=lambda: self.refresh_presence_panel(reschedule=False), style='Blue.TButton').pack(side=tk.RIGHT, padx=5)
+        if CALENDAR_AVAILABLE: self.presence_date_entry = DateEntry(control_frame, width=12, date_pattern='yyyy-mm-dd', maxdate=date.today())
+        else: self.presence_date_entry = ttk.Entry(control_frame, width=12); self.presence_date_entry.insert(0, date.today().isoformat())
+        self.presence_date_entry.pack(side=tk.RIGHT, padx=5); ttk.Label(control_frame, text="Sessions on:").pack(side=tk.RIGHT, padx=5)
+        panes = ttk.Frame(parent_tab); panes.pack(fill=tk.BOTH, expand=True); panes.columnconfigure(0, weight=1); panes.rowconfigure(0, weight=1); panes.rowconfigure(1, weight=2)
+        occupancy_frame = ttk.LabelFrame(panes, text="In the Building Now", padding=10); occupancy_frame.grid(row=0, column=0, sticky='nsew', pady=5)
+        sessions_frame = ttk.LabelFrame(panes, text="Presence Sessions", padding=10); sessions_frame.grid(row=1, column=0, sticky='nsew', pady=5)
+        cols_now = ('Employee ID', 'Name', 'Since', 'Last Seen', 'Camera'); cols_sessions = ('Employee ID', 'Name', 'First Seen', 'Last Seen', 'Duration', 'Sightings', 'Cameras')
+        self.occupancy_tree = ttk.Treeview(occupancy_frame, columns=cols_now, show='headings', height=6); self.presence_tree = ttk.Treeview(sessions_frame, columns=cols_sessions, show='headings', height=10)
+        for tree, cols, frame in ((self.occupancy_tree, cols_now, occupancy_frame), (self.presence_tree, cols_sessions, sessions_frame)):
+            for col in cols: tree.heading(col, text=col); tree.column(col, width=160 if col == 'Name' else 100, stretch=(col == 'Name'))
+            vsb = ttk.Scrollbar(frame, orient="vertical", command=tree.yview); tree.configure(yscrollcommand=vsb.set)
+            tree.grid(row=0, column=0, sticky='nsew'); vsb.grid(row=0, column=1, sticky='ns'); frame.grid_rowconfigure(0, weight=1); frame.grid_columnconfigure(0, weight=1)
+            tree.tag_configure('oddrow', background='white'); tree.tag_configure('evenrow', background='#E8E8E8'); tree.tag_configure('open', foreground='#006400')
+
+    def refresh_presence_panel(self, reschedule=True):
+        # Refresh the Presence tab from PRESENCE (no DB access for today); keeps rescheduling itself while the tab is visible
+        if reschedule and self.presence_panel_after: self.root.after_cancel(self.presence_panel_after); self.presence_panel_after = None # Revisiting the tab restarts the chain
+        if self.shutting_down or not hasattr(self, 'presence_tree') or not self.presence_tree.winfo_exists(): return
+        try:
+            day = self.presence_date_entry.get().strip() or date.today().isoformat()
+            try: datetime.strptime(day, '%Y-%m-%d')
+            except ValueError: self.set_status(f"Invalid date '{day}' (use YYYY-MM-DD).", "red"); return
+            names = {row[0]: row[1] for row in get_all_employees()}; present = PRESENCE.occupancy()
+            for tree in (self.occupancy_tree, self.presence_tree): tree.delete(*tree.get_children())
+            for i, (employee_id, since, last_seen, camera) in enumerate(present):
+                self.occupancy_tree.insert('', tk.END, values=(employee_id, names.get(employee_id, "?"), f"{datetime.fromtimestamp(since):%H:%M:%S}", f"{datetime.fromtimestamp(last_seen):%H:%M:%S}", camera), tags=('evenrow' if i % 2 == 0 else 'oddrow',))
+            sessions = PRESENCE.sessions_for_day(day)
+            for i, (employee_id, first_seen, last_seen, first_camera, last_camera, sightings, is_open) in enumerate(sessions):
+                minutes = (datetime.strptime(last_seen, '%Y-%m-%d %H:%M:%S') - datetime.strptime(first_seen, '%Y-%m-%d %H:%M:%S')).total_seconds() / 60
+                cameras = first_camera if first_camera == last_camera else f"{first_camera} -> {last_camera}"
+                self.presence_tree.insert('', tk.END, values=(employee_id, names.get(employee_id, "?"), first_seen[11:], "(present)" if is_open else last_seen[11:], f"{minutes:.0f} min", sightings, cameras),
+                                          tags=('evenrow' if i % 2 == 0 else 'oddrow',) + (('open',) if is_open else ()))
+            self.occupancy_label.config(text=f"In the building now: {len(present)}    Sessions on {day}: {len(sessions)} ({len({row[0] for row in sessions})} people)")
+            if reschedule and self.is_admin_mode and self.admin_notebook.tab(self.admin_notebook.select(), "text").strip() == 'Presence':
+                self.presence_panel_after = self.root.after(PRESENCE_PANEL_REFRESH_MS, self.refresh_presence_panel)
+        except tk.TclError: pass # Widgets destroyed during refresh
+
+    def create_unknown_visitors_tab(self, parent_tab):
+        # Clusters of unmatched faces (in memory since start) with their best crop; a cluster can be enrolled as a new employee
+        top_frame = ttk.Frame(parent_tab); top_frame.pack(fill=tk.BOTH, expand=True); top_frame.columnconfigure(0, weight=3); top_frame.columnconfigure(1, weight=1); top_frame.rowconfigure(0, weight=1)
+        cluster_frame = ttk.LabelFrame(top_frame, text="Unknown Faces (since start)", padding=10); cluster_frame.grid(row=0, column=0, sticky='nsew', padx=(0, 5))
+        cols = ('Cluster', 'Sightings', 'First Seen', 'Last Seen', 'Spread'); self.unknown_tree = ttk.Treeview(cluster_frame, columns=cols, show='headings', height=12, selectmode='browse')
+        for col in cols: self.unknown_tree.heading(col, text=col); self.unknown_tree.column(col, width=130 if 'Seen' in col else 80, stretch=('Seen' in col))
+        vsb = ttk.Scrollbar(cluster_frame, orient="vertical", command=self.unknown_tree.yview); self.unknown_tree.configure(yscrollcommand=vsb.set)
+        self.unknown_tree.grid(row=0, column=0, sticky='nsew'); vsb.grid(row=0, column=1, sticky='ns'); cluster_frame.grid_rowconfigure(0, weight=1); cluster_frame.grid_columnconfigure(0, weight=1)
+        self.unknown_tree.tag_configure('oddrow', background='white'); self.unknown_tree.tag_configure('evenrow', background='#E8E8E8')
+        self.unknown_tree.bind('<<TreeviewSelect>>', self.on_unknown_cluster_select)
+        promote_frame = ttk.LabelFrame(top_frame, text="Promote to Employee", padding=10); promote_frame.grid(row=0, column=1, sticky='nsew', padx=(5, 0))
+        self.unknown_crop_label = ttk.Label(promote_frame, text="Select a cluster", anchor=tk.CENTER); self.unknown_crop_label.pack(pady=5)
+        self.unknown_promote_entries = {}
+        for label in ('Employee ID', 'Name', 'Department'):
+            ttk.Label(promote_frame, text=f"{label}:").pack(anchor=tk.W); entry = ttk.Entry(promote_frame, width=25); entry.pack(fill=tk.X, pady=(0, 5)); self.unknown_promote_entries[label] = entry
+        ttk.Button(promote_frame, text="Promote Cluster", command=self.promote_unknown_cluster, style='Blue.TButton').pack(pady=5)
+        ttk.Button(promote_frame, text="Refresh", command=self.refresh_unknown_visitors).pack(pady=5)
+        self.unknown_counts_label = ttk.Label(parent_tab, text="", font=("Arial", 10), anchor=tk.W, justify=tk.LEFT); self.unknown_counts_label.pack(fill=tk.X, pady=5)
+
+    def refresh_unknown_visitors(self):
+        if not hasattr(self, 'unknown_tree') or not self.unknown_tree.winfo_exists(): return
+        self.unknown_tree.delete(*self.unknown_tree.get_children())
+        if not self.unknown_store: self.unknown_counts_label.config(text="Unknown face clustering is disabled (UNKNOWN_CLUSTERING)."); return
+        for i, cluster in enumerate(self.unknown_store.clusters()):
+            self.unknown_tree.insert('', tk.END, iid=str(cluster['cluster_id']), values=(cluster['cluster_id'], cluster['sightings'], f"{datetime.fromtimestamp(cluster['first_seen']):%Y-%m-%d %H:%M:%S}",
+                                     f"{datetime.fromtimestamp(cluster['last_seen']):%Y-%m-%d %H:%M:%S}", cluster['spread']), tags=('evenrow' if i % 2 == 0 else 'oddrow',))
+        self.unknown_store.flush() # Today's count into the table, then show the stored history
+        counts = get_daily_counts(14)
+        self.unknown_counts_label.config(text="Unknown visitors per day: " + (", ".join(f"{day}: {visitors}" for day, visitors, _ in counts) if counts else "(none yet)")
+                                              + f"\nGallery scans skipped for returning unknown faces: {self.unknown_store.gallery_scans_skipped}")
+
+    def on_unknown_cluster_select(self, event=None):
+        selection = self.unknown_tree.selection()
+        if not selection or not self.unknown_store: return
+        crop, _ = self.unknown_store.best_crop(int(selection[0]))
+        if crop is None: self.unknown_crop_label.config(image='', text="No crop stored"); return
+        img = Image.fromarray(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)); img.thumbnail((200, 200), Image.Resampling.LANCZOS); img_tk = ImageTk.PhotoImage(img)
+        self.unknown_crop_label.config(image=img_tk, text=""); self.unknown_crop_label.imgtk = img_tk # Keep reference
+
+    def promote_unknown_cluster(self):
+        # Enroll the selected cluster from its best crop (off the Tk thread), then save the photo and reload the gallery
+        selection = self.unknown_tree.selection()
+        if not selection or not self.unknown_store: messagebox.showwarning("No Cluster", "Select an unknown face cluster first.", parent=self.root); return
+        emp_id, emp_name, emp_dept = (self.unknown_promote_entries[k].get().strip() for k in ('Employee ID', 'Name', 'Department'))
+        if not emp_id or not emp_name: messagebox.showerror("Input Error", "Employee ID and Name are required.", parent=self.root); return
+        cluster_id = int(selection[0]); self.set_status(f"Promoting unknown cluster {cluster_id} to {emp_name}...", "blue")
+        def worker():
+            crop = self.unknown_store.promote(cluster_id, emp_id, emp_name, emp_dept or None)
+            if not self.shutting_down: self.root.after(0, self.finish_unknown_promotion, emp_id, emp_name, crop)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def finish_unknown_promotion(self, emp_id, emp_name, crop):
+        if crop is None: messagebox.showerror("Promotion Failed", f"Could not enroll '{emp_name}' from this cluster (ID taken or no usable face). See the console.", parent=self.root); self.set_status("Promotion failed.", "red"); return
+        photo_path = self.get_employee_photo_path(emp_id, find_existing=False)
+        if photo_path and not cv2.imwrite(photo_path, crop): print(f"Warning: Failed to save photo to {photo_path}")
+        self.reload_gallery()
+        for entry in self.unknown_promote_entries.values(): entry.delete(0, tk.END)
+        self.unknown_crop_label.config(image='', text="Select a cluster"); self.refresh_unknown_visitors()
+        self.set_status(f"Employee {emp_name} enrolled from unknown faces.", "green"); messagebox.showinfo("Promotion Success", f"Employee '{emp_name}' (ID: {emp_id}) enrolled.", parent=self.root)
+
+    def export_recent_events(self):
+        # Save the in-memory event log (ring buffer of recent events) for a post-mortem
+        filepath = filedialog.asksaveasfilename(title="Export Recent Events", defaultextension=".jsonl", initialfile=f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl", filetypes=[("JSON Lines", "*.jsonl"), ("All Files", "*.*")], parent=self.root)
+        if not filepath: return
+        try: count = event_log.EVENTS.dump_recent(filepath); self.set_status(f"Exported {count} recent events to {os.path.basename(filepath)}.", "green")
+        except OSError as e: messagebox.showerror("Export Error", f"Failed to export events: {e}", parent=self.root)
+
+    def toggle_perf_metrics(self):
+        METRICS.enable(self.perf_metrics_enabled.get()); self.refresh_performance_panel(reschedule=False)
+
+    def refresh_performance_panel(self, reschedule=True):
+        # Refresh the Performance tab; keeps rescheduling itself while the tab is visible
+        if reschedule and self.perf_panel_after: self.root.after_cancel(self.perf_panel_after); self.perf_panel_after = None # Revisiting the tab restarts the chain
+        if self.shutting_down or not hasattr(self, 'perf_tree') or not self.perf_tree.winfo_exists(): return
+        try:
+            snapshot = METRICS.snapshot()
+            for item in self.perf_tree.get_children(): self.perf_tree.delete(item)
+            for i, (stage, stats) in enumerate(snapshot['stages'].items()):
+                if not stats.get('count'): continue
+                self.perf_tree.insert('', tk.END, values=(stage, stats['count'], stats['mean_ms'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms']), tags=('evenrow' if i % 2 == 0 else 'oddrow',))
+            counters = ", ".join(f"{name}: {value}" for name, value in sorted(snapshot['counters'].items()))
+            self.perf_counters_label.config(text=f"Counters: {counters}" if counters else ("Counters: (none yet)" if METRICS.enabled else "Metrics are disabled."))
+            self.perf_fps_label.config(text=self.frame_pacer.get_fps_summary())
+            if reschedule and self.is_admin_mode and self.admin_notebook.tab(self.admin_notebook.select(), "text").strip() == 'Performance':
+                self.perf_panel_after = self.root.after(PERF_PANEL_REFRESH_MS, self.refresh_performance_panel)
+        except tk.TclError: pass # Widgets destroyed during refresh
+
     # --- Tab change handler ---
     def on_admin_tab_change(self, event):
         # Refresh data when switching tabs
@@ -301,6 +562,7 @@ class AttendanceApp:
             if not self.admin_notebook.winfo_exists(): return # Check if notebook exists
             selected_tab_index = self.admin_notebook.index(self.admin_notebook.select())
             selected_tab_text = self.admin_notebook.tab(selected_tab_index, "text").strip() # Get text label of selected tab
+            self.ensure_admin_tab(selected_tab_text) # Build the tab's widgets on first visit
 
             # Load data relevant to the selected tab
             if selected_tab_text == 'View Logs': self.load_and_display_logs()
@@ -311,8 +573,11 @@ class AttendanceApp:
             elif selected_tab_text == 'Emotion Analysis': self.update_emotion_analysis()
             elif selected_tab_text == 'Notification Panel': self.update_notification_panel()
             elif selected_tab_text == 'Manage Employee': self.load_all_employees_to_tree()
+            elif selected_tab_text == 'Presence': self.refresh_presence_panel()
+            elif selected_tab_text == 'Unknown Visitors': self.refresh_unknown_visitors()
+            elif selected_tab_text == 'Performance': self.refresh_performance_panel()
         except tk.TclError as e: print(f"TclError on tab change (widget might be destroyed): {e}")
-        except Exception as e: print(f"Error handling admin tab change: {e}"); import traceback; traceback.print_exc()
+        except Exception as e: print(f"Error handling admin tab change: {e}"); traceback.print_exc()
 
     # --- View Management ---
     def show_attendance_view(self):
@@ -341,109 +606,125 @@ class AttendanceApp:
         # Reset stop event, create and start thread
         self.stop_video_event.clear(); self.video_thread = threading.Thread(target=self.video_loop, daemon=True); self.video_thread.start(); self.camera_active = True; self.set_status("Camera starting...", "blue")
 
+    def open_video_source(self):
+        """Opens VIDEO_SOURCE; cameras go through the camera cache and parallel probing (frame_sources.open_camera). Returns (source, label)."""
+        candidates = DEFAULT_CAMERA_CANDIDATES if VIDEO_SOURCE is None else (VIDEO_SOURCE,)
+        if all(is_camera_spec(c) for c in candidates):
+            cap = open_camera(tuple(int(c) if isinstance(c, str) and c.lstrip('-').isdigit() else c for c in candidates), CAMERA_CACHE_FILE)
+            if cap is None: return None, None
+            settings = cap.describe(); event_log.info('camera', f"Camera opened successfully (index {cap.device}, {settings['backend']}, {settings['width']}x{settings['height']} {settings['fourcc']}).", **settings)
+            return cap, cap.device
+        cap = open_frame_source(VIDEO_SOURCE) # Replay source (video file, image folder, synthetic)
+        if cap.isOpened(): event_log.info('camera', f"Replay source opened ({VIDEO_SOURCE})."); return cap, VIDEO_SOURCE
+        cap.release(); return None, None
+
     def video_loop(self):
-        # Main loop for camera capture and processing (runs in a separate thread)
-        cap = None; cam_index_tried = -1
+        # Camera thread: open the camera (cached one first, then parallel probe), process frames, reconnect with backoff when it fails
+        cap = None; backoff = Backoff()
         try:
-            # Try different camera indices (0, 1, 2, -1)
-            indices_to_try = [0, 1, 2, -1]; camera_found = False
-            for index in indices_to_try:
-                cap = None # Reset cap for each attempt
-                try:
-                    cap = cv2.VideoCapture(index) # Try opening camera
-                    if cap is not None and cap.isOpened():
-                        ret, frame_test = cap.read() # Try reading a frame
-                        if ret and frame_test is not None:
-                            # Success! Store index, set status, break loop
-                            cam_index_tried = index; print(f"Camera opened successfully (index {cam_index_tried})."); self.set_status(f"Camera Ready (Index {cam_index_tried})", "green"); camera_found = True; break
-                        else:
-                            # Opened but failed read, release and try next
-                            print(f"Camera index {index} opened but failed to read frame."); cap.release(); cap = None
-                    else:
-                         # Failed to open, release (if needed) and try next
-                         print(f"Camera index {index} failed to open.");
-                         if cap is not None: cap.release(); cap = None
+            while not self.stop_video_event.is_set():
+                try: cap, source_label = self.open_video_source()
+                except Exception as e: event_log.error('camera', f"Error opening camera: {e}", traceback=traceback.format_exc()); cap = None
+                if cap is None:
+                    delay = backoff.next_delay(); self.set_status(f"No camera available. Retrying in {delay:.0f}s...", "red")
+                    event_log.warning('camera', f"Cannot open any camera (tried {VIDEO_SOURCE if VIDEO_SOURCE is not None else DEFAULT_CAMERA_CANDIDATES}). Retrying in {delay:.1f}s.", sample_key='camera.open')
+                    self.stop_video_event.wait(delay); continue
+                self.set_status(f"Camera Ready (Index {source_label})", "green"); mark_startup('camera_open'); self.camera_label = str(source_label)
+                try: finished = self.capture_loop(cap, source_label, backoff)
                 except Exception as e:
-                    # Handle errors during probing for a specific index
-                    print(f"Error during camera check for index {index}: {e}")
-                    if cap is not None: # Release if open but error occurred
-                        cap.release()
-                        cap = None
-            # If no camera found after trying all indices, raise error
-            if not camera_found: raise IOError(f"Cannot open any camera (tried indices {indices_to_try}).")
-
-            # --- Main camera loop ---
-            frame_count = 0; recognition_results = [] # Store last recognition results
-            while not self.stop_video_event.is_set(): # Loop until stop event is set
-                ret, frame = cap.read()
-                if not ret or frame is None:
-                    self.set_status(f"Warning: Can't receive frame (Cam {cam_index_tried}). Check connection.", "orange"); time.sleep(0.1); continue # Skip if frame read fails
-
-                display_frame_orig = frame.copy() # Copy frame for display modifications
-                # Store the latest raw frame for enrollment capture
-                with self.frame_lock: self.latest_frame = frame.copy()
-
-                # Decide whether to perform face recognition (every few frames in non-admin mode)
-                should_process = not self.is_admin_mode or self.enrollment_in_progress; # Process in attendance mode or during enrollment
-                process_interval = 5; # Process every 5 frames to save resources
-                process_this_frame = (frame_count % process_interval == 0)
-
-                if should_process and process_this_frame and not self.enrollment_in_progress:
-                    # Resize frame for faster recognition
-                    small_frame = cv2.resize(frame, (0, 0), fx=RECOGNITION_SCALE, fy=RECOGNITION_SCALE)
-                    try:
-                        # Convert to RGB (face_recognition library expects RGB)
-                        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                    except cv2.error as e:
-                        print(f"Error converting frame to RGB: {e}. Skipping recognition for this frame."); continue # Skip if conversion fails
-                    # Perform face recognition
-                    recognition_results = self.face_system.recognize_faces_in_frame(rgb_small_frame)
-                    # Process results (log attendance, etc.) only if in attendance mode
-                    if not self.is_admin_mode:
-                        self.process_recognition_results(recognition_results, frame, RECOGNITION_SCALE)
-
-                # Draw bounding boxes and names/status on the display frame
-                # Always draw if not enrolling, or draw countdown if enrolling
-                if not self.is_admin_mode or self.enrollment_in_progress:
-                     self.draw_on_frame(display_frame_orig, recognition_results, frame.shape[1], frame.shape[0], RECOGNITION_SCALE)
-
-                # Resize frame for display in the Tkinter label
-                display_frame_resized = cv2.resize(display_frame_orig, (CAMERA_FRAME_WIDTH, CAMERA_FRAME_HEIGHT))
-                img_rgb_display = None
-                try:
-                    # Convert display frame back to RGB for PIL/Tkinter
-                    img_rgb_display = cv2.cvtColor(display_frame_resized, cv2.COLOR_BGR2RGB)
-                except Exception as conversion_err:
-                    print(f"Error preparing frame for display: {conversion_err}")
-                # Schedule update on the main thread if frame is valid and root window exists
-                if img_rgb_display is not None and hasattr(self, 'root') and self.root.winfo_exists():
-                     self.root.after(0, self.update_video_label, img_rgb_display)
-
-                frame_count += 1; time.sleep(1 / 30) # Approx 30 FPS target (adjust as needed)
-
-        except (IOError, cv2.error, Exception) as e:
-            # Handle critical errors in the camera loop (e.g., camera disconnects)
-            error_msg = f"Camera loop critical error: {e}"; self.set_status(error_msg, "red"); print(f"!!! {error_msg}"); import traceback; traceback.print_exc();
+                    # Camera disconnects and other errors no longer end the thread: release and reconnect
+                    finished = False; self.set_status(f"Camera error: {e}. Reconnecting...", "red"); event_log.error('camera', f"Camera loop error: {e}", traceback=traceback.format_exc())
+                finally:
+                    cap.release(); cap = None
+                if finished: break
+                if not self.stop_video_event.is_set():
+                    delay = backoff.next_delay(); event_log.info('camera', f"Reconnecting camera in {delay:.1f}s."); self.stop_video_event.wait(delay)
         finally:
             # Cleanup: Release camera and set flag
-            if cap and cap.isOpened(): cap.release()
-            self.camera_active = False; print("Camera thread finished.")
+            if cap is not None: cap.release()
+            self.camera_active = False; event_log.info('camera', "Camera thread finished.")
             # Clear video label on main thread if window still exists and not shutting down
             if not self.stop_video_event.is_set() and hasattr(self, 'root') and self.root.winfo_exists():
                  self.root.after(0, self.clear_video_label, "Camera Stopped")
 
+    def capture_loop(self, cap, source_label, backoff):
+        # Reads and processes frames until stopped (returns True when a replay is finished) or the camera fails (returns False)
+        frame_count = 0; failed_reads = 0; recognition_results = [] # Store last recognition results
+        while not self.stop_video_event.is_set(): # Loop until stop event is set
+            self.frame_pacer.begin_iteration()
+            self.frame_pacer.drain_stale_frames(cap) # Skip frames buffered while the last iteration was busy
+            with METRICS.timer('capture'): ret, frame = cap.read(self.frame_ring.next_buffer()) # Decoded straight into the next ring slot
+            if not ret or frame is None:
+                if cap.exhausted: self.set_status(f"Replay of {source_label} finished.", "blue"); return True # Recorded source has no more frames
+                failed_reads += 1
+                if failed_reads >= CAMERA_MAX_FAILED_READS: event_log.warning('camera', f"Camera {source_label} stopped delivering frames; reconnecting."); return False
+                self.set_status(f"Warning: Can't receive frame (Cam {source_label}). Check connection.", "orange")
+                event_log.warning('camera', f"Can't receive frame from camera {source_label}.", sample_key='camera.read'); time.sleep(0.1); continue # Skip if frame read fails
+            failed_reads = 0; backoff.reset(); self.frame_pacer.mark_capture()
+            # Publish in the ring (enrollment reads it from there); `frame` stays valid until the ring wraps around
+            frame = self.frame_ring.publish(frame, cap.timestamp); frame_sequence = self.frame_ring.sequence
+
+            # Decide whether to perform face recognition (every few frames in non-admin mode)
+            should_process = not self.is_admin_mode or self.enrollment_in_progress; # Process in attendance mode or during enrollment
+            process_interval = 5; # Process every 5 frames to save resources
+            process_this_frame = (frame_count % process_interval == 0)
+
+            if should_process and process_this_frame: # Also runs during enrollment: capture reuses the detected face box
+                # Adaptive: full-resolution RGB in, the engine shrinks it for detection. Fixed: shrink by RECOGNITION_SCALE here
+                self.results_scale = 1.0 if ADAPTIVE_DETECTION else RECOGNITION_SCALE
+                if not ADAPTIVE_DETECTION:
+                    with METRICS.timer('resize'): small_frame = cv2.resize(frame, (0, 0), fx=RECOGNITION_SCALE, fy=RECOGNITION_SCALE)
+                try:
+                    # Convert to RGB (face_recognition library expects RGB)
+                    with METRICS.timer('color_convert'): rgb_frame = cv2.cvtColor(frame if ADAPTIVE_DETECTION else small_frame, cv2.COLOR_BGR2RGB)
+                except cv2.error as e:
+                    event_log.warning('camera', f"Error converting frame to RGB: {e}. Skipping recognition for this frame.", sample_key='camera.color_convert'); continue # Skip if conversion fails
+                # Perform face recognition
+                if ADAPTIVE_DETECTION: recognition_results = self.face_system.recognize_faces_adaptive(rgb_frame, self.scale_controller, quality_gate=self.quality_gate)
+                else: recognition_results = self.face_system.recognize_faces_in_frame(rgb_frame, quality_gate=self.quality_gate, frame_scale=RECOGNITION_SCALE)
+                self.frame_pacer.mark_process(); mark_startup('first_detection_pass')
+                if recognition_results: MAINTENANCE.note_activity() # Faces in view: no database maintenance now
+                if any(emp_id and emp_id != "Unknown" for emp_id, _, _ in recognition_results): mark_startup('first_recognition') # Startup SLA
+                with self.frame_lock: self.latest_detection = (frame_sequence, [loc for _, _, loc in recognition_results], self.results_scale, time.time())
+                # Process results (log attendance, etc.) only if in attendance mode
+                if not self.is_admin_mode and not self.enrollment_in_progress:
+                    self.process_recognition_results(recognition_results, frame, self.results_scale)
+
+            # Resize frame for display in the Tkinter label (a new array, so drawing never touches the ring slot)
+            display_frame_resized = cv2.resize(frame, (CAMERA_FRAME_WIDTH, CAMERA_FRAME_HEIGHT))
+            # Draw bounding boxes and names/status on the display frame (boxes are scaled to the display size)
+            # Always draw if not enrolling, or draw countdown if enrolling
+            if not self.is_admin_mode or self.enrollment_in_progress:
+                 self.draw_on_frame(display_frame_resized, recognition_results, frame.shape[1], frame.shape[0], self.results_scale)
+            if SHOW_FPS_OVERLAY:
+                 cv2.putText(display_frame_resized, self.frame_pacer.get_fps_summary(), (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1, lineType=cv2.LINE_AA)
+            img_rgb_display = None
+            try:
+                # Convert display frame back to RGB for PIL/Tkinter
+                img_rgb_display = cv2.cvtColor(display_frame_resized, cv2.COLOR_BGR2RGB)
+            except Exception as conversion_err:
+                event_log.warning('camera', f"Error preparing frame for display: {conversion_err}", sample_key='camera.display_convert')
+            # Schedule update on the main thread if frame is valid and root window exists
+            if img_rgb_display is not None and hasattr(self, 'root') and self.root.winfo_exists():
+                 self.root.after(0, self.update_video_label, img_rgb_display)
+
+            frame_count += 1; self.frame_pacer.end_iteration(self.stop_video_event) # Sleep only the rest of the frame budget
+        return True
+
     def process_recognition_results(self, results, original_frame, scale):
         # Process recognized faces for attendance logging
         current_time = time.time(); display_status_update = ""; status_color = "blue"
-        for employee_id, _, (top, right, bottom, left) in results:
+        for employee_id, distance, (top, right, bottom, left) in results:
              if employee_id and employee_id != "Unknown":
                    emp_name = get_employee_name(employee_id) # Get name from DB
+                   emotion_str = None; PRESENCE.note_sighting(employee_id, self.camera_label)
                    # Check if cooldown period has passed since last log attempt for this employee
                    if employee_id not in self.last_log_time or (current_time - self.last_log_time[employee_id]) > LOG_COOLDOWN_SECONDS:
                         # Attempt to log attendance and detect emotion
                         logged, emotion_str = self.log_attendance_with_emotion(employee_id, original_frame, top, bottom, left, right, scale)
                         if logged:
-                            # Successfully logged
+                            # Successfully logged (logged is the new log_id): keep the face crop and a context frame as evidence
+                            if self.evidence_writer: self.evidence_writer.submit(logged, employee_id, prepare_evidence(original_frame, (top, right, bottom, left), scale))
                             self.last_log_time[employee_id] = current_time # Update last log time
                             display_status_update = f"Welcome {emp_name}! Attendance marked ({emotion_str})."; status_color = "green"
                         else:
@@ -451,6 +732,7 @@ class AttendanceApp:
                             self.last_log_time[employee_id] = current_time;
                             # Optional: Update status about already being logged in?
                             # display_status_update = f"{emp_name} already logged today."; status_color = "orange"
+                   if self.sighting_journal: self.sighting_journal.append(employee_id, self.camera_label, distance, emotion_str) # Labels that are not emotions are stored as 'none'
         # Update the main status bar if there's a message
         if display_status_update: self.set_status(display_status_update, status_color)
 
@@ -458,28 +740,22 @@ class AttendanceApp:
         # Log attendance for an employee and detect their emotion
         emotion_str = "N/A"; logged = False
         try:
-            # Calculate original coordinates from scaled recognition results
-            orig_top=int(top/scale); orig_right=int(right/scale); orig_bottom=int(bottom/scale); orig_left=int(left/scale)
-            # Add padding around the face for better emotion detection
-            h, w, _ = original_frame.shape; padding = 15
-            # Ensure padded coordinates stay within frame boundaries
-            orig_top=max(0, orig_top-padding); orig_left=max(0, orig_left-padding); orig_bottom=min(h, orig_bottom+padding); orig_right=min(w, orig_right+padding)
-
-            if orig_bottom > orig_top and orig_right > orig_left: # Check if crop dimensions are valid
-                face_crop = original_frame[orig_top:orig_bottom, orig_left:orig_right]
+            # Crop the face (with padding for better emotion detection) from the full-size frame
+            face_crop = crop_face(original_frame, (top, right, bottom, left), scale, padding=15)
+            if face_crop is not None: # Check if crop dimensions are valid
                 # Detect emotion using the emotion engine
                 emotion = detect_emotion_from_face(face_crop)
                 if emotion: emotion_str = emotion.capitalize()
                 else: emotion_str = "Undetected" # Handle case where detection fails
-            else: print(f"Warning: Invalid face crop dimensions for {employee_id}"); emotion_str = "Crop Error"
+            else: event_log.warning('camera', f"Invalid face crop dimensions for {employee_id}", sample_key='camera.crop'); emotion_str = "Crop Error"
 
             # Attempt to log attendance (data_manager handles check for existing log today)
             if emotion_str != "Crop Error": logged = log_attendance(employee_id, emotion_str)
             else: logged = False # Don't log if cropping failed
 
             return logged, emotion_str # Return success status and emotion string
-        except cv2.error as cv_err: print(f"OpenCV Error during face cropping for emotion: {cv_err}"); return False, "Crop Error"
-        except Exception as e: print(f"Error processing emotion/log for {employee_id}: {e}"); return False, "Processing Error"
+        except cv2.error as cv_err: event_log.warning('camera', f"OpenCV Error during face cropping for emotion: {cv_err}", sample_key='camera.crop'); return False, "Crop Error"
+        except Exception as e: event_log.error('camera', f"Error processing emotion/log for {employee_id}: {e}", sample_key='camera.log_attendance'); return False, "Processing Error"
 
     def draw_on_frame(self, display_frame, results, orig_w, orig_h, scale):
         # Draw bounding boxes, names, and enrollment countdown on the frame
@@ -505,7 +781,8 @@ class AttendanceApp:
 
                 # Determine name and box color
                 display_name = "Unknown"; color = (0, 0, 255) # Red for Unknown
-                if employee_id and employee_id != "Unknown":
+                if employee_id is None: display_name = "Checking..."; color = (0, 200, 255) # Deferred by the quality gate
+                elif employee_id != "Unknown":
                     display_name = get_employee_name(employee_id)
                     # Check if recently logged
                     is_logged_recently = employee_id in self.last_log_time and (time.time() - self.last_log_time[employee_id]) <= LOG_COOLDOWN_SECONDS
@@ -523,8 +800,8 @@ class AttendanceApp:
                     # Draw filled background rectangle and text
                     cv2.rectangle(display_frame, (disp_left, label_bg_y1) , (min(disp_left + w + 6, display_w -1), label_bg_y2), color, cv2.FILLED)
                     cv2.putText(display_frame, display_name, (disp_left + 3, label_bg_y2 - 3), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1, lineType=cv2.LINE_AA) # White text
-                except cv2.error as e: print(f"Warning: OpenCV error drawing text '{display_name}': {e}")
-                except Exception as e: print(f"Warning: Generic error drawing text '{display_name}': {e}")
+                except cv2.error as e: event_log.warning('camera', f"OpenCV error drawing text '{display_name}': {e}", sample_key='camera.draw')
+                except Exception as e: event_log.warning('camera', f"Generic error drawing text '{display_name}': {e}", sample_key='camera.draw')
 
     def update_video_label(self, img_rgb):
         # Update the video label on the main Tkinter thread
@@ -532,14 +809,16 @@ class AttendanceApp:
         if not hasattr(self, 'root') or not self.root.winfo_exists(): return # Check if root window exists
         if hasattr(self, 'video_label') and self.video_label.winfo_exists(): # Check if video label exists
             try:
-                 # Convert NumPy array to PIL image, then to Tkinter PhotoImage
-                 img_pil = Image.fromarray(img_rgb); img_tk = ImageTk.PhotoImage(image=img_pil)
-                 # Keep a reference to the image to prevent garbage collection
-                 self.video_label.imgtk = img_tk;
-                 # Update the label's image and clear any placeholder text
-                 self.video_label.config(image=img_tk, text="")
+                 with METRICS.timer('render'):
+                      # Convert NumPy array to PIL image, then to Tkinter PhotoImage
+                      img_pil = Image.fromarray(img_rgb); img_tk = ImageTk.PhotoImage(image=img_pil)
+                      # Keep a reference to the image to prevent garbage collection
+                      self.video_label.imgtk = img_tk;
+                      # Update the label's image and clear any placeholder text
+                      self.video_label.config(image=img_tk, text="")
+                 self.frame_pacer.mark_render(); mark_startup('first_frame')
             except tk.TclError: pass # Ignore errors if widget is destroyed between check and config
-            except Exception as e: print(f"Error updating video label (main thread): {e}")
+            except Exception as e: event_log.warning('camera', f"Error updating video label (main thread): {e}", sample_key='camera.render')
 
     def clear_video_label(self, text="Camera Off"):
         # Clear the video label (e.g., when camera stops)
@@ -578,19 +857,51 @@ class AttendanceApp:
              self.show_attendance_view(); self.set_status("Switched to Attendance Mode.", "blue"); self.admin_button.config(text="Admin Login")
         # Note: Switching *to* admin mode is handled by show_custom_login -> show_admin_view
 
+    def backup_now(self):
+        # Online snapshot in a background thread; the camera thread keeps writing meanwhile
+        self.backup_button.config(state=tk.DISABLED); self.set_status("Backing up database...", "blue")
+        def _backup():
+            report = backup_database()
+            if report: self.set_status(f"Backup saved to {report['path']} ({report['copy_seconds']:.1f}s, verified).", "green")
+            else: self.set_status("Backup failed. See the event log.", "red")
+            if not self.shutting_down: self.root.after(0, lambda: self.backup_button.winfo_exists() and self.backup_button.config(state=tk.NORMAL))
+        threading.Thread(target=_backup, daemon=True, name="backup").start()
+
+    def rebuild_gallery_now(self):
+        # Re-encode every employee photo in worker processes (gallery_rebuild.py); recognition keeps using the old gallery until the swap
+        if not messagebox.askyesno("Rebuild Face Gallery", "Re-encode every employee from their stored photo?\nUnchanged photos are skipped; an interrupted rebuild resumes next time.", parent=self.admin_frame): return
+        self.rebuild_button.config(state=tk.DISABLED); self.set_status("Rebuilding face gallery...", "blue")
+        self.gallery_rebuild = GalleryRebuild(on_progress=lambda done, total, rate: self.set_status(f"Rebuilding face gallery: {done}/{total} ({rate:.1f} photos/s encoded)...", "blue"))
+        def _rebuild():
+            job = self.gallery_rebuild; counts = job.run()
+            if self.shutting_down: return
+            self.root.after(0, lambda: self.finish_gallery_rebuild(counts))
+        threading.Thread(target=_rebuild, daemon=True, name="gallery-rebuild").start()
+
+    def finish_gallery_rebuild(self, counts):
+        self.gallery_rebuild = None
+        if self.rebuild_button.winfo_exists(): self.rebuild_button.config(state=tk.NORMAL)
+        if not counts['completed']: self.set_status("Gallery rebuild did not finish (see the event log); it resumes next time.", "red"); return
+        self.reload_gallery()
+        kept = counts['failed'] + counts['missing_photo']
+        self.set_status(f"Face gallery rebuilt: {counts['swapped']} encoding(s) updated ({counts['cached']} from cache, {counts['encoded']} encoded at {counts['photos_per_s']} photos/s)" + (f", {kept} kept their old encoding." if kept else "."), "green" if not kept else "orange")
+
     def confirm_and_reset_data(self):
         # Ask for confirmation before resetting attendance/emotion data
         confirm = messagebox.askyesno("Confirm Data Reset", "WARNING: Delete ALL attendance/emotion records?\nEmployee profiles WILL remain.\n\nThis action cannot be undone. Proceed?", icon='warning', parent=self.admin_frame)
         if confirm:
             self.set_status("Resetting data...", "orange"); self.root.update_idletasks(); print("Data reset confirmed by user...")
             # Call the reset function from admin_logic
+            PRESENCE.clear() # Drop in-memory sessions first so a flush can't write them back
             success = reset_attendance_emotion_data()
             if success:
+                if self.sighting_journal: self.sighting_journal.clear() # Every recognition since the last reset (deleted employees stay in it until then)
                 self.set_status("Attendance/emotion data reset successfully.", "green"); messagebox.showinfo("Reset Complete", "All attendance and emotion records have been deleted.", parent=self.admin_frame)
                 # Refresh relevant admin tabs after reset
                 if hasattr(self, 'log_tree') and self.log_tree.winfo_exists(): self.load_and_display_logs()
                 if hasattr(self, 'emotion_ax') and self.emotion_ax.figure.canvas.get_tk_widget().winfo_exists(): self.update_emotion_analysis()
                 if hasattr(self, 'notify_tree') and self.notify_tree.winfo_exists(): self.update_notification_panel()
+                if hasattr(self, 'presence_tree') and self.presence_tree.winfo_exists(): self.refresh_presence_panel(reschedule=False)
                 # Refresh employee details tab if currently active (as attendance logs are gone)
                 try:
                     if self.admin_notebook.winfo_exists() and self.admin_notebook.index("current") == 2: # Index 2 is 'Employee Details'
@@ -626,7 +937,7 @@ class AttendanceApp:
             total = len(neg_streaks) + len(att_streaks); self.set_status(f"Notifications updated ({total} alerts found).", "green" if total > 0 else "blue")
         except Exception as e:
              # Handle errors during analysis or display
-             self.set_status("Error updating notifications panel.", "red"); messagebox.showerror("Notification Error", f"Failed to update notifications: {e}", parent=self.notify_tree); print(f"Error updating notifications: {e}"); import traceback; traceback.print_exc()
+             self.set_status("Error updating notifications panel.", "red"); messagebox.showerror("Notification Error", f"Failed to update notifications: {e}", parent=self.notify_tree); print(f"Error updating notifications: {e}"); traceback.print_exc()
         finally:
              # Reset cursor
              if hasattr(self, 'notify_tree') and self.notify_tree.winfo_exists(): self.notify_tree.config(cursor="")
@@ -661,7 +972,7 @@ class AttendanceApp:
         if self.enrollment_in_progress: print("Enrollment already in progress."); return # Prevent multiple enrollments at once
         self.emp_id_to_enroll = emp_id; self.emp_name_to_enroll = emp_name; self.emp_dept_to_enroll = emp_dept
         # Check if camera is ready
-        with self.frame_lock: frame_available = self.latest_frame is not None
+        frame_available = self.frame_ring.sequence > 0
         if not self.camera_active or not frame_available: messagebox.showerror("Camera Error", "Camera not ready for capture.", parent=self.root); return
         # Start countdown
         self.enrollment_in_progress = True; self.enroll_button.config(state=tk.DISABLED); # Disable enroll button
@@ -682,84 +993,86 @@ class AttendanceApp:
                 self.capture_frame_and_enroll()
 
     def capture_frame_and_enroll(self):
-        # Capture the current frame from the camera thread and save it for enrollment
+        # Enroll from the in-memory camera frame (no temp JPEG), reusing the live face detection when it is fresh
         if not self.enrollment_in_progress: return # Check if still enrolling
-        captured_frame = None
-        try:
-            # Get the latest frame safely using the lock
-            with self.frame_lock:
-                if self.latest_frame is not None: captured_frame = self.latest_frame.copy()
-                else: raise ValueError("Could not get a valid frame from the camera thread.")
-            # Create a temporary directory/file to save the captured frame
-            temp_dir = "temp_enroll"; os.makedirs(temp_dir, exist_ok=True);
-            # Create a safe filename
-            safe_id_part = "".join(c if c.isalnum() else "_" for c in self.emp_id_to_enroll); timestamp = int(time.time());
-            temp_image_path = os.path.join(temp_dir, f"{safe_id_part}_enroll_{timestamp}.jpg")
-            # Save the frame as a JPEG image
-            save_success = cv2.imwrite(temp_image_path, captured_frame)
-            if not save_success: raise IOError(f"Failed to save temporary enrollment image to {temp_image_path}")
-            print(f"Enrollment frame saved temporarily to {temp_image_path}")
-            # Enroll using the saved temporary file
-            self.enroll_with_file(self.emp_id_to_enroll, self.emp_name_to_enroll, self.emp_dept_to_enroll, temp_image_path, is_upload=False)
-            # Clean up the temporary file
-            try: os.remove(temp_image_path); print(f"Deleted temporary file: {temp_image_path}")
-            except OSError as e: print(f"Warning: Could not delete temporary enrollment file {temp_image_path}: {e}")
-        except (ValueError, IOError, Exception) as e:
-             # Handle errors during capture or saving
-             error_msg = f"Error during frame capture/saving: {e}"; print(f"!!! {error_msg}"); messagebox.showerror("Capture Error", error_msg, parent=self.root);
+        with self.frame_lock: detection = self.latest_detection
+        captured_frame = None; face_location = None; scale = 1.0
+        if detection is not None and detection[1] and time.time() - detection[3] <= ENROLL_DETECTION_MAX_AGE_SECONDS:
+             # The camera thread located a face in that ring frame moment ago: encode it, don't detect again (None if already overwritten)
+             fresh = self.frame_ring.get(detection[0])
+             if fresh is not None: captured_frame = fresh[1]; face_location = largest_face(detection[1]); scale = detection[2]
+        if captured_frame is None: _, _, captured_frame = self.frame_ring.latest() # Copy of the newest frame
+        if captured_frame is None:
+             messagebox.showerror("Capture Error", "Could not get a valid frame from the camera thread.", parent=self.root)
              self.enroll_status_label.config(text="Capture Failed!", foreground="red"); self.set_status("Enrollment capture failed.", "red")
-        finally:
-             # Reset enrollment state regardless of success/failure
-             self.enrollment_in_progress = False
-             # Re-enable enroll button if it exists
-             if hasattr(self, 'enroll_button') and self.enroll_button.winfo_exists(): self.enroll_button.config(state=tk.NORMAL)
-
+             self.reset_enrollment_state(); return
+        self.enroll_status_label.config(text="Processing face...", foreground='orange'); self.set_status(f"Processing face for {self.emp_name_to_enroll}...", "blue")
+        threading.Thread(target=self.enroll_frame_worker, args=(self.emp_id_to_enroll, self.emp_name_to_enroll, self.emp_dept_to_enroll, captured_frame, face_location, scale), daemon=True).start()
+
+    def enroll_frame_worker(self, emp_id, emp_name, emp_dept, frame, face_location, scale):
+        # Background thread: encode + insert, then hand the result back to the Tk thread
+        start = time.perf_counter(); success = False
+        try: success = add_employee_from_frame(emp_id, emp_name, frame, face_location, emp_dept, scale)
+        except Exception as e: event_log.error('enrollment', f"Unexpected error during capture enrollment for {emp_id}: {e}", traceback=traceback.format_exc())
+        event_log.info('enrollment', f"Capture enrollment for {emp_id} took {(time.perf_counter() - start) * 1000:.0f} ms (live detection reused: {face_location is not None}).")
+        if not self.shutting_down: self.root.after(0, self.finish_enrollment, emp_id, emp_name, success, None, frame)
 
     def enroll_with_file(self, emp_id, emp_name, emp_dept, image_path, is_upload=False):
-        # Enroll employee using a provided image file path (either uploaded or temporarily saved)
+        # Enroll employee using an uploaded image file
         success = False
         try:
             # Update status labels
             self.enroll_status_label.config(text=f"Processing face from file...", foreground='orange'); self.set_status(f"Processing face for {emp_name}...", "blue"); self.root.update_idletasks()
             # Call add_employee from data_manager
             success = add_employee(emp_id, emp_name, image_path, emp_dept)
+        except (sqlite3.Error, Exception) as e:
+             error_msg = f"Unexpected error during enrollment processing: {e}"; messagebox.showerror("Enrollment Error", error_msg, parent=self.root); print(f"!!! {error_msg}"); traceback.print_exc(); success = False
+        self.finish_enrollment(emp_id, emp_name, success, image_path=image_path)
 
+    def finish_enrollment(self, emp_id, emp_name, success, image_path=None, frame=None):
+        # Report the result, save the employee photo (copied file or captured frame) and reload the gallery
+        try:
             if success:
                 # Enrollment successful
                 self.enroll_status_label.config(text=f"Enrollment Successful!", foreground="green"); self.set_status(f"Employee {emp_name} enrolled.", "green"); messagebox.showinfo("Enrollment Success", f"Employee '{emp_name}' (ID: {emp_id}) enrolled successfully!", parent=self.root)
-                # Copy the enrollment photo to the permanent employee_photos directory
+                # Save the enrollment photo to the permanent employee_photos directory
                 photo_dest_path = self.get_employee_photo_path(emp_id, find_existing=False)
                 if photo_dest_path:
-                     try: shutil.copy(image_path, photo_dest_path); print(f"Saved enrollment photo to: {photo_dest_path}")
+                     try:
+                          if image_path: shutil.copy(image_path, photo_dest_path)
+                          elif not cv2.imwrite(photo_dest_path, frame): raise IOError("cv2.imwrite failed")
+                          print(f"Saved enrollment photo to: {photo_dest_path}")
                      except Exception as copy_err:
-                          print(f"Warning: Failed to copy photo to {photo_dest_path}: {copy_err}");
+                          print(f"Warning: Failed to save photo to {photo_dest_path}: {copy_err}");
                           messagebox.showwarning("Photo Copy Warning", f"Enrollment successful, but failed to save photo to employee directory.\nPlease manually add '{os.path.basename(photo_dest_path)}' to the '{EMPLOYEE_PHOTO_DIR}' folder if needed.", parent=self.root)
                 else:
                      print(f"Warning: Could not determine destination photo path for employee {emp_id}");
                      messagebox.showwarning("Photo Path Warning", f"Enrollment successful, but could not determine photo save path.\nPlease manually add photo to the '{EMPLOYEE_PHOTO_DIR}' folder if needed.", parent=self.root)
 
                 # Reload known faces into the face recognition system
-                print("Reloading known faces after enrollment..."); ids, encodings = load_known_faces(); self.face_system.known_face_ids = ids; self.face_system.known_face_encodings = encodings; print(f"Reloaded {len(ids)} faces.")
+                print("Reloading known faces after enrollment..."); print(f"Reloaded {self.reload_gallery()} faces.")
                 # Clear enrollment form fields
                 self.enroll_id_entry.delete(0, tk.END); self.enroll_name_entry.delete(0, tk.END); self.enroll_dept_entry.delete(0, tk.END)
                 self.uploaded_photo_path.set("") # Clear uploaded file path
             else:
-                 # Enrollment failed (e.g., no face found, DB error reported by add_employee)
+                 # Enrollment failed (e.g., no face found, DB error reported by data_manager)
                  enroll_fail_msg = f"Failed to enroll {emp_name}.\nPlease check the console output for more details (e.g., 'No face found', 'DB Error').";
                  self.enroll_status_label.config(text=f"Enrollment Failed.", foreground="red"); self.set_status(f"Enrollment failed for {emp_name}.", "red"); messagebox.showerror("Enrollment Failed", enroll_fail_msg, parent=self.root)
         except (sqlite3.Error, Exception) as e:
-             # Handle unexpected errors during the enrollment process
-             error_msg = f"Unexpected error during enrollment processing: {e}"; self.enroll_status_label.config(text="Enrollment Error!", foreground="red"); self.set_status("Enrollment processing error.", "red"); messagebox.showerror("Enrollment Error", error_msg, parent=self.root); print(f"!!! {error_msg}"); import traceback; traceback.print_exc(); success = False
+             # Handle unexpected errors after enrollment
+             error_msg = f"Unexpected error during enrollment processing: {e}"; self.enroll_status_label.config(text="Enrollment Error!", foreground="red"); self.set_status("Enrollment processing error.", "red"); messagebox.showerror("Enrollment Error", error_msg, parent=self.root); print(f"!!! {error_msg}"); traceback.print_exc(); success = False
         finally:
-             # Reset enrollment flags and UI elements
-             self.enrollment_in_progress = False; self.enroll_countdown_value = 0
-             try:
-                 # Re-enable enroll button if it exists
-                 if hasattr(self,'enroll_button') and self.enroll_button.winfo_exists(): self.enroll_button.config(state=tk.NORMAL)
-                 # Clear status label only if enrollment failed, otherwise keep success message
-                 if hasattr(self,'enroll_status_label') and self.enroll_status_label.winfo_exists() and not success:
-                      self.enroll_status_label.config(text="")
-             except tk.TclError: pass # Ignore if widgets destroyed
+             self.reset_enrollment_state(clear_status=not success)
+
+    def reset_enrollment_state(self, clear_status=False):
+        # Reset enrollment flags and UI elements
+        self.enrollment_in_progress = False; self.enroll_countdown_value = 0
+        try:
+            # Re-enable enroll button if it exists
+            if hasattr(self,'enroll_button') and self.enroll_button.winfo_exists(): self.enroll_button.config(state=tk.NORMAL)
+            # Clear status label only if enrollment failed, otherwise keep success message
+            if clear_status and hasattr(self,'enroll_status_label') and self.enroll_status_label.winfo_exists(): self.enroll_status_label.config(text="")
+        except tk.TclError: pass # Ignore if widgets destroyed
 
 
     # --- Log Loading & Export ---
@@ -826,6 +1139,22 @@ class AttendanceApp:
         except tk.TclError as e: print(f"TclError updating log treeview (widget might be destroyed): {e}")
         except Exception as e: print(f"Error updating log treeview: {e}"); self.set_status("Error displaying logs.", "red")
 
+    def show_log_evidence(self, event=None):
+        # Open the evidence images (face crop, context frame) of the selected attendance log in a small window
+        item = self.log_tree.focus()
+        if not item: return
+        try: log_id = int(self.log_tree.item(item, 'values')[0])
+        except (IndexError, ValueError): return
+        paths = get_evidence(log_id)
+        if not paths or not any(p and os.path.exists(p) for p in paths): messagebox.showinfo("No Evidence", f"No evidence images were saved for log {log_id}.", parent=self.root); return
+        window = tk.Toplevel(self.root); window.title(f"Evidence for log {log_id}"); window.images = [] # Keep references
+        for path, caption in zip(paths, ("Face", "Context")):
+            if not path or not os.path.exists(path): continue
+            try: img = Image.open(path); img.thumbnail((400, 400), Image.Resampling.LANCZOS); img_tk = ImageTk.PhotoImage(img)
+            except Exception as e: print(f"Could not open evidence image {path}: {e}"); continue
+            frame = ttk.LabelFrame(window, text=caption, padding=5); frame.pack(side=tk.LEFT, padx=10, pady=10, anchor=tk.N)
+            ttk.Label(frame, image=img_tk).pack(); window.images.append(img_tk)
+
     def export_displayed_logs(self):
         # Export the currently displayed logs in the Treeview to a CSV file
         displayed_logs = [];
@@ -959,12 +1288,8 @@ class AttendanceApp:
             self.set_status(f"Updating photo and encoding for {self.selected_manage_emp_id}...", "blue")
             success = update_employee_photo(self.selected_manage_emp_id, filepath) # This handles encoding update
             if success:
-                 messagebox.showinfo("Update Successful", f"Photo and face encoding updated successfully for employee {self.selected_manage_emp_id}.", parent=self.root); self.set_status(f"Photo updated successfully.", "green")
-                 # Reload known faces for the running application
-                 print("Reloading known faces after photo update..."); ids, encs = load_known_faces(); self.face_system.known_face_ids = ids; self.face_system.known_face_encodings = encs; print(f"Reloaded {len(ids)} faces.")
-                 # Refresh the photo preview in the manage tab
-                 self.display_manage_employee_photo(self.selected_manage_emp_id)
-                 # Copy the new photo to the employee_photos directory, overwriting old one if same format
+                 # Copy the new photo to the employee_photos directory right away (before any dialog): a running gallery rebuild
+                 # compares its shadow encodings against these files and would otherwise still see the old photo
                  photo_dest_path = self.get_employee_photo_path(self.selected_manage_emp_id, find_existing=False) # Get preferred save path (e.g., .jpg)
                  if photo_dest_path:
                      try:
@@ -974,6 +1299,11 @@ class AttendanceApp:
                      except Exception as copy_err:
                          print(f"Warning: Failed to copy updated photo to {photo_dest_path}: {copy_err}")
                          messagebox.showwarning("Photo Copy Warning", f"Photo encoding updated, but failed to save new photo file to '{EMPLOYEE_PHOTO_DIR}'. Please add it manually if needed.", parent=self.root)
+                 messagebox.showinfo("Update Successful", f"Photo and face encoding updated successfully for employee {self.selected_manage_emp_id}.", parent=self.root); self.set_status(f"Photo updated successfully.", "green")
+                 # Reload known faces for the running application
+                 print("Reloading known faces after photo update..."); print(f"Reloaded {self.reload_gallery()} faces.")
+                 # Refresh the photo preview in the manage tab
+                 self.display_manage_employee_photo(self.selected_manage_emp_id)
             else: messagebox.showerror("Update Failed", f"Could not update photo and encoding.\nPlease check console for errors (e.g., no face found in new image).", parent=self.root); self.set_status(f"Photo update failed.", "red")
         except Exception as e: messagebox.showerror("Update Error", f"An unexpected error occurred during photo update: {e}", parent=self.root); self.set_status("Error updating photo.", "red"); print(f"Error updating employee photo: {e}")
 
@@ -1009,6 +1339,7 @@ class AttendanceApp:
         if confirm:
             try:
                 self.set_status(f"Deleting employee {emp_id_to_delete} and their logs...", "orange")
+                PRESENCE.forget(emp_id_to_delete) # Drop in-memory sessions first so a flush can't write them back
                 # Call delete function from data_manager (handles deleting logs via cascade or manually)
                 success = delete_employee_data(emp_id_to_delete)
                 if success:
@@ -1016,7 +1347,7 @@ class AttendanceApp:
                      # Remove associated photo file(s)
                      self.remove_existing_employee_photos(emp_id_to_delete)
                      # Reload known faces for the running application
-                     print("Reloading known faces after deletion..."); ids, encs = load_known_faces(); self.face_system.known_face_ids = ids; self.face_system.known_face_encodings = encs; print(f"Reloaded {len(ids)} faces.")
+                     print("Reloading known faces after deletion..."); print(f"Reloaded {self.reload_gallery()} faces.")
                      # Refresh the employee list treeview
                      self.load_all_employees_to_tree()
                 else: messagebox.showerror("Deletion Failed", f"Could not delete employee {emp_id_to_delete}.\nThey may have already been deleted, or a database error occurred (Check Console).", parent=self.root); self.set_status(f"Deletion failed for {emp_id_to_delete}.", "red")
@@ -1108,7 +1439,7 @@ class AttendanceApp:
                      except ValueError: print(f"Warning: Could not parse timestamp '{timestamp_str}' for log ID {log_id}."); self.emp_attendance_tree.insert('', tk.END, values=("Parse Error", timestamp_str, emotion or 'N/A'), tags=(tag,))
                      except Exception as parse_err: print(f"Error processing log entry {log_id}: {parse_err}")
         except sqlite3.Error as db_err: messagebox.showerror("Database Error", f"Failed to load attendance logs: {db_err}", parent=self.root); print(f"DB error loading attendance for details tab: {db_err}")
-        except Exception as e: messagebox.showerror("Load Error", f"Failed to load attendance data: {e}", parent=self.root); print(f"Error loading attendance for details tab: {e}"); import traceback; traceback.print_exc()
+        except Exception as e: messagebox.showerror("Load Error", f"Failed to load attendance data: {e}", parent=self.root); print(f"Error loading attendance for details tab: {e}"); traceback.print_exc()
 
     # --- Emotion Analysis Tab ---
     def update_emotion_analysis(self):
@@ -1140,7 +1471,7 @@ class AttendanceApp:
             self.emotion_canvas.draw(); # Redraw the canvas
             self.set_status("Emotion analysis chart updated.", "green")
         except sqlite3.Error as db_err: messagebox.showerror("Database Error", f"Failed to load logs for analysis: {db_err}", parent=self.root); self.set_status("Error loading analysis data.", "red"); print(f"DB error during emotion analysis: {db_err}")
-        except Exception as e: messagebox.showerror("Analysis Error", f"Failed to update emotion chart: {e}", parent=self.root); self.set_status("Error updating analysis chart.", "red"); print(f"Error updating emotion analysis: {e}"); import traceback; traceback.print_exc()
+        except Exception as e: messagebox.showerror("Analysis Error", f"Failed to update emotion chart: {e}", parent=self.root); self.set_status("Error updating analysis chart.", "red"); print(f"Error updating emotion analysis: {e}"); traceback.print_exc()
 
     # --- Photo Path Helper ---
     def get_employee_photo_path(self, employee_id, find_existing=True):
@@ -1163,6 +1494,16 @@ class AttendanceApp:
             return base_path + '.jpg'
 
     # --- Utility Functions ---
+    def reload_gallery(self):
+        # Loads the known faces into the shared FaceRecognitionSystem (quantized if QUANTIZED_GALLERY) and returns how many there are
+        ids, encodings = load_known_faces()
+        if self.shared_gallery is not None:
+            try: publish_gallery(ids, encodings, SHARED_GALLERY_FILE); self.shared_gallery.refresh(); ids, encodings = self.shared_gallery.ids, self.shared_gallery.encodings
+            except OSError as e: event_log.error('shared_gallery', f"Publishing the gallery failed, using a private copy: {e}")
+        elif QUANTIZED_GALLERY: encodings = QuantizedGallery.from_encodings(encodings) # The float64 list is dropped right away
+        self.face_system.set_gallery(ids, encodings)
+        return len(ids)
+
     def set_status(self, message, color="black"):
         # Update the status bar text and color (runs on main thread)
         def _update(): # Inner function to run via 'after'
@@ -1194,6 +1535,15 @@ class AttendanceApp:
             else:
                 print("Camera thread joined successfully.")
 
+            METRICS.stop_file_dump() # Stop the periodic metrics file writer, if running
+            MAINTENANCE.stop(timeout=2.0) # Interrupts a running maintenance step (it rolls back)
+            if self.backup_scheduler: self.backup_scheduler.stop(timeout=2.0)
+            if self.sighting_journal: self.sighting_journal.close()
+            if self.evidence_writer: self.evidence_writer.stop(timeout=2.0) # Writes what is still queued
+            PRESENCE.stop(timeout=2.0) # Final flush of the presence sessions
+            if self.unknown_store: self.unknown_store.stop(timeout=2.0) # Saves today's unknown visitor count
+            if self.gallery_rebuild: self.gallery_rebuild.stop() # Committed progress is kept; the next rebuild resumes
+
             # Close Matplotlib figure if it exists
             try:
                 if hasattr(self, 'emotion_fig'): plt.close(self.emotion_fig); print("Closed Matplotlib plot figure.")
@@ -1224,6 +1574,7 @@ if __name__ == "__main__":
     print("Checking database status...")
     # Run setup regardless of existence to handle schema updates/verification
     setup_database()
+    if ARCHIVE_KEEP_MONTHS: threading.Thread(target=archive_closed_months, args=(ARCHIVE_KEEP_MONTHS,), daemon=True, name="archive").start() # Closed months -> archive files
 
     # Ensure employee photo directory exists
     print("Checking employee photo directory...")
@@ -1239,14 +1590,18 @@ if __name__ == "__main__":
     try:
         # Create and run the main application instance
         print("Creating Application instance...")
-        app = AttendanceApp(root);
+        if PROFILE_STARTUP:
+            import cProfile; profiler = cProfile.Profile(); profiler.enable()
+            app = AttendanceApp(root)
+            profiler.disable(); profiler.dump_stats(STARTUP_PROFILE_FILE); print(f"Startup profile written to {STARTUP_PROFILE_FILE}.")
+        else: app = AttendanceApp(root);
         print("Starting Tkinter main loop...");
         root.mainloop(); # Start the GUI event loop - execution blocks here until window closes
         print("Application main loop finished.") # This line runs after root.quit() or window close
     except Exception as main_err:
         # Catch and report unexpected errors during app initialization or runtime
         print(f"\n--- UNHANDLED FATAL ERROR IN MAIN APPLICATION ---");
-        import traceback; traceback.print_exc()
+        traceback.print_exc()
         try:
             # Try to show an error popup if Tkinter is still minimally functional
             messagebox.showerror("Fatal Application Error", f"An unexpected error occurred:\n{main_err}\n\nApplication will now exit. Check console for details.")
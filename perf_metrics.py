@@ -0,0 +1,133 @@
+# perf_metrics.py (Low-overhead per-stage timers, counters and rolling latency histograms)
+import bisect
+import json
+import threading
+import time
+from datetime import datetime
+
+# Pipeline stages instrumented across the app (any other name also works)
+STAGES = ('capture', 'resize', 'color_convert', 'hog_detection', 'quality_gate', 'encoding', 'matching', 'emotion', 'db_write', 'render')
+
+# Log-spaced latency bucket upper edges in seconds: 20 us .. ~21 s, 4 buckets per doubling
+BUCKET_EDGES = [0.00002 * (2 ** (i / 4)) for i in range(81)]
+WINDOW_SECONDS = 60       # Rolling window covered by the histograms
+SLICES_PER_WINDOW = 6     # Window is kept as 6 x 10 s slices, the oldest slice is dropped as time moves on
+
+
+class RollingHistogram:
+    """Fixed-bucket latency histogram over a sliding time window (O(log buckets) per sample)."""
+    def __init__(self, window_seconds=WINDOW_SECONDS, slices=SLICES_PER_WINDOW):
+        self.slice_seconds = window_seconds / slices
+        self.slice_count = slices
+        self._slices = [] # [(slice_id, counts, total_seconds, sample_count)]
+
+    def add(self, seconds, now):
+        slice_id = int(now / self.slice_seconds)
+        if not self._slices or self._slices[-1][0] != slice_id:
+            self._slices.append((slice_id, [0] * (len(BUCKET_EDGES) + 1), [0.0], [0]))
+            self._expire(slice_id)
+        _, counts, total, n = self._slices[-1]
+        counts[bisect.bisect_left(BUCKET_EDGES, seconds)] += 1
+        total[0] += seconds; n[0] += 1
+
+    def _expire(self, current_slice_id):
+        oldest_allowed = current_slice_id - self.slice_count + 1
+        while self._slices and self._slices[0][0] < oldest_allowed: self._slices.pop(0)
+
+    def summary(self, now):
+        self._expire(int(now / self.slice_seconds))
+        merged = [0] * (len(BUCKET_EDGES) + 1); total = 0.0; count = 0
+        for _, counts, slice_total, slice_n in self._slices:
+            for i, c in enumerate(counts):
+                if c: merged[i] += c
+            total += slice_total[0]; count += slice_n[0]
+        if count == 0: return {'count': 0}
+        return {'count': count, 'mean_ms': round(total / count * 1000, 3), 'p50_ms': self._percentile(merged, count, 0.50),
+                'p95_ms': self._percentile(merged, count, 0.95), 'p99_ms': self._percentile(merged, count, 0.99)}
+
+    @staticmethod
+    def _percentile(counts, total_count, fraction):
+        """Upper edge of the bucket holding the requested rank (a conservative estimate)."""
+        rank = fraction * total_count; running = 0
+        for i, c in enumerate(counts):
+            running += c
+            if running >= rank: return round((BUCKET_EDGES[i] if i < len(BUCKET_EDGES) else BUCKET_EDGES[-1]) * 1000, 3)
+        return round(BUCKET_EDGES[-1] * 1000, 3)
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+    def __init__(self, metrics, stage): self.metrics = metrics; self.stage = stage
+    def __enter__(self): self.start = time.perf_counter(); return self
+    def __exit__(self, *exc): self.metrics.record(self.stage, time.perf_counter() - self.start); return False
+
+
+class _NoOpTimer:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NO_OP_TIMER = _NoOpTimer() # Shared instance: a disabled timer costs one attribute check and no allocation
+
+
+class PerfMetrics:
+    """Process-wide registry of stage latencies and counters. Disabled by default."""
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms = {}; self._counters = {}
+        self._dump_thread = None; self._dump_stop = threading.Event()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def timer(self, stage):
+        """Context manager timing a block as `stage`: `with METRICS.timer('encoding'): ...`"""
+        return _StageTimer(self, stage) if self.enabled else _NO_OP_TIMER
+
+    def record(self, stage, seconds):
+        if not self.enabled: return
+        now = time.time()
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None: histogram = self._histograms[stage] = RollingHistogram()
+            histogram.add(seconds, now)
+
+    def increment(self, counter, amount=1):
+        if not self.enabled: return
+        with self._lock: self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def reset(self):
+        with self._lock: self._histograms = {}; self._counters = {}
+
+    def snapshot(self):
+        """{'stages': {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}}, 'counters': {...}} over the rolling window."""
+        now = time.time()
+        with self._lock:
+            stages = {stage: histogram.summary(now) for stage, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+        ordered = {stage: stages.pop(stage) for stage in STAGES if stage in stages}
+        ordered.update(sorted(stages.items()))
+        return {'stages': ordered, 'counters': counters}
+
+    # --- Periodic dump to a metrics file (one JSON object per line) ---
+    def start_file_dump(self, path, interval_seconds=30):
+        if self._dump_thread and self._dump_thread.is_alive(): return
+        self._dump_stop.clear()
+        self._dump_thread = threading.Thread(target=self._dump_loop, args=(path, interval_seconds), name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_file_dump(self):
+        self._dump_stop.set()
+        if self._dump_thread: self._dump_thread.join(2.0)
+
+    def _dump_loop(self, path, interval_seconds):
+        while not self._dump_stop.wait(interval_seconds):
+            if not self.enabled: continue
+            record = {'time': datetime.now().isoformat(timespec='seconds'), **self.snapshot()}
+            try:
+                with open(path, 'a', encoding='utf-8') as f: f.write(json.dumps(record) + '\n')
+            except OSError as e: print(f"Warning: Could not write metrics file {path}: {e}")
+
+
+METRICS = PerfMetrics()
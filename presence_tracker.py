@@ -0,0 +1,213 @@
+# presence_tracker.py (In/out presence sessions and live occupancy from recognitions - kept in memory, flushed to presence_sessions)
+#
+# attendance_logs only answers "present today". PresenceTracker turns the stream of recognitions into sessions per
+# employee and day: a sighting extends the employee's open session when it comes within `gap_seconds` of the previous
+# one, otherwise it starts a new session (a new day always starts a new one). The same state gives live occupancy:
+# an employee is "in the building" while their last sighting is younger than the gap. note_sighting() is O(1)
+# (dict lookup + OrderedDict move_to_end), expiry pops from the oldest end only, and nothing touches SQLite per
+# sighting: sessions changed since the last flush are upserted in one transaction every `flush_seconds`.
+#   python presence_tracker.py [--day 2026-01-05]     print the stored sessions of a day
+import argparse
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from database_setup import setup_database, DATABASE_FILE
+import event_log
+
+GAP_SECONDS = 900          # A sighting more than 15 minutes after the previous one starts a new session
+FLUSH_SECONDS = 30.0       # How often changed sessions are written to presence_sessions
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S' # Same text format as attendance_logs.timestamp
+
+UPSERT_SQL = '''
+    INSERT INTO presence_sessions (employee_id, day, first_seen, last_seen, first_camera, last_camera, sightings)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(employee_id, first_seen) DO UPDATE SET
+        last_seen = excluded.last_seen, last_camera = excluded.last_camera, sightings = excluded.sightings
+'''
+
+
+def _format(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime(TIMESTAMP_FORMAT)
+
+
+def _parse(text):
+    return datetime.strptime(text, TIMESTAMP_FORMAT).timestamp()
+
+
+class PresenceSession:
+    """One continuous stretch of sightings of an employee within a day."""
+    __slots__ = ('employee_id', 'day', 'first_seen', 'last_seen', 'first_camera', 'last_camera', 'sightings')
+
+    def __init__(self, employee_id, day, timestamp, camera, sightings=1, last_seen=None, last_camera=None):
+        self.employee_id = employee_id; self.day = day; self.first_seen = timestamp; self.last_seen = last_seen if last_seen is not None else timestamp
+        self.first_camera = camera; self.last_camera = last_camera if last_camera is not None else camera; self.sightings = sightings
+
+    @property
+    def duration(self):
+        return self.last_seen - self.first_seen
+
+    def as_row(self):
+        return (self.employee_id, self.day, _format(self.first_seen), _format(self.last_seen), self.first_camera, self.last_camera, self.sightings)
+
+
+class PresenceTracker:
+    """Thread-safe session/occupancy state. Call note_sighting() for every recognized employee."""
+    def __init__(self, db_file=DATABASE_FILE, gap_seconds=GAP_SECONDS, flush_seconds=FLUSH_SECONDS):
+        self.db_file = db_file; self.gap_seconds = gap_seconds; self.flush_seconds = flush_seconds
+        self._lock = threading.Lock(); self._stop_event = threading.Event(); self._thread = None
+        self._flush_lock = threading.Lock() # Held for a whole flush: forget()/clear() wait for a batch in flight
+        self._day = None            # 'YYYY-MM-DD' the in-memory sessions belong to
+        self._sessions = {}         # employee_id -> [PresenceSession] of self._day, oldest first (the last one may be open)
+        self._present = OrderedDict() # employee_id -> open PresenceSession, least recently seen first
+        self._dirty = {}            # (employee_id, first_seen) -> PresenceSession changed since the last flush
+
+    # --- Updates ---
+    def note_sighting(self, employee_id, camera="", timestamp=None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        day = date.fromtimestamp(timestamp).isoformat()
+        with self._lock:
+            if day != self._day: self._start_day(day)
+            session = self._present.get(employee_id)
+            if session is not None and timestamp - session.last_seen <= self.gap_seconds:
+                session.last_seen = max(session.last_seen, timestamp); session.last_camera = camera; session.sightings += 1
+                self._present.move_to_end(employee_id)
+            else:
+                if session is not None: del self._present[employee_id] # Gap exceeded: that session is closed
+                session = PresenceSession(employee_id, day, timestamp, camera)
+                self._sessions.setdefault(employee_id, []).append(session); self._present[employee_id] = session
+            self._dirty[(employee_id, session.first_seen)] = session
+
+    def _start_day(self, day):
+        # Called with the lock held. Open sessions of the previous day end at its last sighting; they stay dirty until flushed.
+        self._day = day; self._sessions = {}; self._present.clear()
+
+    def _expire(self, now):
+        # Called with the lock held: drops everyone whose last sighting is older than the gap (oldest first, stops at the first fresh one)
+        while self._present:
+            employee_id, session = next(iter(self._present.items()))
+            if now - session.last_seen <= self.gap_seconds: break
+            del self._present[employee_id]
+
+    # --- Queries (answered from memory) ---
+    def occupancy(self, now=None):
+        """[(employee_id, session start, last seen, last camera)] of everyone in the building now, most recently seen first."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._expire(now)
+            return [(s.employee_id, s.first_seen, s.last_seen, s.last_camera) for s in reversed(self._present.values())]
+
+    def occupancy_count(self, now=None):
+        with self._lock: self._expire(now if now is not None else time.time()); return len(self._present)
+
+    def sessions_for_day(self, day=None):
+        """[(employee_id, first_seen, last_seen, first_camera, last_camera, sightings, open)] for a 'YYYY-MM-DD' day (default today).
+           The current day comes from memory; other days from presence_sessions."""
+        day = day or date.today().isoformat()
+        with self._lock:
+            if day == self._day:
+                self._expire(time.time())
+                return sorted(((s.employee_id, _format(s.first_seen), _format(s.last_seen), s.first_camera, s.last_camera, s.sightings, self._present.get(s.employee_id) is s)
+                               for sessions in self._sessions.values() for s in sessions), key=lambda row: (row[1], row[0]))
+        return [row + (False,) for row in get_sessions(day, self.db_file)]
+
+    # --- Persistence ---
+    def load_day(self, day=None):
+        """Loads a day's stored sessions into memory (on startup), so sessions continue across restarts. Returns the number loaded."""
+        day = day or date.today().isoformat()
+        rows = get_sessions(day, self.db_file); now = time.time()
+        with self._lock:
+            self._start_day(day)
+            for employee_id, first_seen, last_seen, first_camera, last_camera, sightings in rows:
+                session = PresenceSession(employee_id, day, _parse(first_seen), first_camera, sightings, _parse(last_seen), last_camera)
+                self._sessions.setdefault(employee_id, []).append(session)
+            for session in sorted((sessions[-1] for sessions in self._sessions.values()), key=lambda s: s.last_seen):
+                if now - session.last_seen <= self.gap_seconds: self._present[session.employee_id] = session # Still open
+        return len(rows)
+
+    def flush(self):
+        """Upserts the sessions changed since the last flush in one transaction. Returns the number written (or None on error)."""
+        with self._flush_lock: return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            if not self._dirty: return 0
+            batch = self._dirty; self._dirty = {}
+            rows = [session.as_row() for session in batch.values()]
+        conn = None; start = time.perf_counter()
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=5.0)
+            conn.executemany(UPSERT_SQL, rows); conn.commit()
+        except sqlite3.Error as e:
+            event_log.error('presence', f"Flushing {len(rows)} presence session(s) failed: {e}", sample_key='presence.flush')
+            if conn: conn.rollback()
+            with self._lock:
+                for key, session in batch.items(): self._dirty.setdefault(key, session) # Retry with the next flush
+            return None
+        finally:
+            if conn: conn.close()
+        event_log.debug('presence', f"Flushed {len(rows)} presence session(s) in {(time.perf_counter() - start) * 1000:.1f} ms.", sample_key='presence.flush_ok')
+        return len(rows)
+
+    def forget(self, employee_id):
+        """Drops an employee's in-memory state. Call it before deleting their rows: a batch taken earlier is written first."""
+        with self._flush_lock, self._lock:
+            self._sessions.pop(employee_id, None); self._present.pop(employee_id, None)
+            self._dirty = {key: session for key, session in self._dirty.items() if key[0] != employee_id}
+
+    def clear(self):
+        with self._flush_lock, self._lock: self._day = None; self._sessions = {}; self._present.clear(); self._dirty = {}
+
+    # --- Background flushing ---
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self.load_day()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="presence-flush", daemon=True); self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread: self._thread.join(timeout)
+        self.flush() # Whatever changed since the last periodic flush
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_seconds): self.flush()
+
+
+def get_sessions(day, db_file=DATABASE_FILE, employee_id=None):
+    """Stored sessions of a day: [(employee_id, first_seen, last_seen, first_camera, last_camera, sightings)]."""
+    query = "SELECT employee_id, first_seen, last_seen, first_camera, last_camera, sightings FROM presence_sessions WHERE day = ?"; params = [day]
+    if employee_id: query += " AND employee_id = ?"; params.append(employee_id)
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        return conn.execute(query + " ORDER BY first_seen, employee_id", params).fetchall()
+    except sqlite3.Error as e: event_log.error('presence', f"Reading presence sessions of {day} failed: {e}"); return []
+    finally:
+        if conn: conn.close()
+
+
+PRESENCE = PresenceTracker() # Shared tracker for the GUI and the headless service
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Print the stored presence sessions of a day.")
+    parser.add_argument('--day', default=date.today().isoformat(), help="YYYY-MM-DD (default: today).")
+    parser.add_argument('--employee', help="Only this employee ID.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_database()
+    rows = get_sessions(args.day, employee_id=args.employee)
+    for employee_id, first_seen, last_seen, first_camera, last_camera, sightings in rows:
+        print(f"{employee_id:<12} {first_seen[11:]} - {last_seen[11:]}  {sightings:>6} sighting(s)  {first_camera} -> {last_camera}")
+    print(f"{len(rows)} session(s) on {args.day}.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+# quantized_gallery.py (Int8 gallery for low-memory kiosks - integer search over all employees, exact re-ranking of the top few)
+#
+# load_known_faces() returns a list of float64 arrays: ~1.1 KB per employee including the array objects. QuantizedGallery
+# keeps each encoding as 128 int8 values with one float32 scale (x ~= scale * q, scale = max|x| / 127) plus its float32
+# squared norm: 136 bytes per employee. A query is quantized the same way and scored against every row with one int8 x int8
+# dot product accumulated in int32:  |x - y|^2 ~= |x|^2 + |y|^2 - 2 * scale_x * scale_y * (q_x . q_y).
+# The RERANK_K best candidates are then re-scored exactly against float32 copies of the encodings, kept in a memory-mapped
+# .npy file (only the rows touched are paged in) or in memory when no file is given.
+#
+# It stands in for the encoding list in FaceRecognitionSystem.set_gallery() (len() and truth value work the same);
+# IDs stay a plain list. The distance reported for the best match is the exact float distance.
+import os
+import tempfile
+
+import numpy as np
+
+import event_log
+
+ENCODING_DIMENSIONS = 128
+RERANK_K = 8                        # Candidates re-scored with float vectors (quantization error only reorders near-ties)
+GALLERY_FLOAT_FILE = "gallery_float32.npy" # Memory-mapped float32 encodings used for re-ranking
+
+
+def quantize(matrix):
+    """(int8 codes, float32 per-row scales) of a (n, 128) float matrix or a single encoding."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=-1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales) # All-zero row: any scale gives zero codes
+    codes = np.rint(matrix / scales[..., None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _write_float_file(matrix, path):
+    # Written under a temporary name and renamed, so a gallery still mapping the previous file keeps reading it intact.
+    # Where a mapped file can't be replaced (Windows), the new gallery keeps the temporary name instead.
+    directory = os.path.dirname(os.path.abspath(path)); os.makedirs(directory, exist_ok=True)
+    prefix = os.path.basename(path) + '.'
+    for name in os.listdir(directory): # Leftovers of earlier fallbacks (fails harmlessly while one is still mapped)
+        if name.startswith(prefix) and name.endswith('.tmp.npy'):
+            try: os.remove(os.path.join(directory, name))
+            except OSError: pass
+    fd, tmp_path = tempfile.mkstemp(prefix=prefix, suffix='.tmp.npy', dir=directory); os.close(fd)
+    np.save(tmp_path, matrix)
+    try: os.replace(tmp_path, path); return path
+    except OSError as e:
+        event_log.debug('quantized_gallery', f"Could not replace {path} ({e}); re-ranking from {tmp_path}.")
+        return tmp_path
+
+
+class QuantizedGallery:
+    """Read-only int8 gallery. Build a new one with from_encodings() on every reload."""
+    def __init__(self, codes, scales, norms, floats, rerank_k=RERANK_K, float_path=None):
+        self.codes = codes; self.scales = scales; self.norms = norms # (n, 128) int8, (n,) float32, (n,) float32 squared norms
+        self.floats = floats     # (n, 128) float32, memory-mapped when float_path is set
+        self.rerank_k = max(1, rerank_k); self.float_path = float_path
+
+    @classmethod
+    def from_encodings(cls, encodings, float_path=GALLERY_FLOAT_FILE, rerank_k=RERANK_K):
+        """Quantizes a list/array of encodings. With float_path=None the float32 vectors stay in memory."""
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+        codes, scales = quantize(matrix)
+        norms = np.einsum('ij,ij->i', matrix, matrix)
+        if float_path:
+            float_path = _write_float_file(matrix, float_path); del matrix
+            floats = np.load(float_path, mmap_mode='r') if len(codes) else np.empty((0, ENCODING_DIMENSIONS), np.float32) # Zero-length files can't be mapped
+        else: floats = matrix
+        return cls(codes, scales, norms, floats, rerank_k, float_path)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def nbytes(self):
+        """Bytes held in memory (the memory-mapped float file is not counted)."""
+        resident = self.codes.nbytes + self.scales.nbytes + self.norms.nbytes
+        return resident if isinstance(self.floats, np.memmap) else resident + self.floats.nbytes
+
+    def approximate_distances(self, encoding):
+        """Squared distances from `encoding` to every row, from the int8 codes (int32 accumulation)."""
+        query = np.asarray(encoding, dtype=np.float32)
+        query_codes, query_scale = quantize(query)
+        dots = np.einsum('ij,j->i', self.codes, query_codes, dtype=np.int32, casting='unsafe') # No int32 copy of the gallery
+        return self.norms + float(query @ query) - 2.0 * float(query_scale) * self.scales * dots
+
+    def best_match(self, encoding):
+        """(row index, exact distance) of the closest encoding, or (None, None) if the gallery is empty."""
+        n = len(self.codes)
+        if n == 0: return None, None
+        approximate = self.approximate_distances(encoding)
+        k = min(self.rerank_k, n)
+        candidates = np.argpartition(approximate, k - 1)[:k] if k < n else np.arange(n)
+        candidates.sort() # Ascending rows: sequential reads from the mapped file
+        exact = np.linalg.norm(self.floats[candidates] - np.asarray(encoding, dtype=np.float32), axis=1)
+        best = int(np.argmin(exact))
+        return int(candidates[best]), float(exact[best])
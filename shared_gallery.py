@@ -0,0 +1,156 @@
+# shared_gallery.py (One copy of the gallery for every recognition process on a box - memory-mapped files with a generation counter)
+#
+# Each process that calls load_known_faces() holds its own ~1.1 KB per employee. Instead, one publisher (the GUI, or
+# the headless service with "shared_gallery_publisher") writes the gallery into a file and every recognition process
+# maps it read-only: the encodings are a numpy view of the mapping, so all processes share the same page-cache pages
+# and memory stays flat as cameras/processes are added.
+#
+# Every publish writes a new immutable file <path>.<generation> (64-byte header: magic, format version, count,
+# dimensions, generation, content digest; then float64 encodings, uint32 ID offsets, UTF-8 IDs) and then bumps the
+# generation in the small control file <path>.ctl. Readers poll the control file (one mapped 8-byte read) and attach
+# the new file when the number changes; files in use are never modified, so a reader never sees a half-written gallery.
+# Publishing an unchanged gallery is a no-op. Use a single publisher per box.
+#   python shared_gallery.py publish        load the employees from the database and publish them
+#   python shared_gallery.py info           show the published generation
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Sequence
+
+import numpy as np
+
+import event_log
+
+SHARED_GALLERY_FILE = "gallery_shared" # gallery_shared.ctl + gallery_shared.<generation>
+FORMAT_VERSION = 1
+ENCODING_DIMENSIONS = 128
+MAGIC = b'AIASGAL1'
+HEADER = struct.Struct('<8sIIIIQQ20s4x') # magic, format version, count, dimensions, reserved, generation, ID bytes, SHA-1 of the content
+CONTROL = struct.Struct('<8sQ')          # magic, current generation
+KEEP_GENERATIONS = 2                     # The previous file stays for readers that are still switching
+
+
+def _data_path(path, generation):
+    return f"{path}.{generation}"
+
+
+def _read_control(path):
+    try:
+        with open(path + '.ctl', 'rb') as f: magic, generation = CONTROL.unpack(f.read(CONTROL.size))
+        return generation if magic == MAGIC else 0
+    except (OSError, struct.error): return 0
+
+
+def _read_digest(path, generation):
+    try:
+        with open(_data_path(path, generation), 'rb') as f: return HEADER.unpack(f.read(HEADER.size))[7]
+    except (OSError, struct.error): return None
+
+
+def publish_gallery(ids, encodings, path=SHARED_GALLERY_FILE):
+    """Publishes (ids, encodings) as a new generation unless it equals the current one. Returns the generation readers will see."""
+    matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_DIMENSIONS))
+    encoded_ids = [str(employee_id).encode('utf-8') for employee_id in ids]
+    offsets = np.zeros(len(encoded_ids) + 1, dtype=np.uint32); offsets[1:] = np.cumsum([len(b) for b in encoded_ids])
+    id_blob = b''.join(encoded_ids)
+    digest = hashlib.sha1(matrix.tobytes() + offsets.tobytes() + id_blob).digest()
+    current = _read_control(path)
+    if current and _read_digest(path, current) == digest: return current
+    generation = current + 1
+    directory = os.path.dirname(os.path.abspath(path)); os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(matrix), ENCODING_DIMENSIONS, 0, generation, len(id_blob), digest))
+        f.write(matrix.tobytes()); f.write(offsets.tobytes()); f.write(id_blob)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp_path, _data_path(path, generation)) # Complete before any reader can learn its generation
+    # Overwritten in place, never truncated: readers have it mapped
+    with open(path + '.ctl', 'r+b' if os.path.exists(path + '.ctl') else 'wb') as f: f.write(CONTROL.pack(MAGIC, generation))
+    for name in os.listdir(directory): # Old generations (a file still mapped on Windows is removed by a later publish)
+        prefix, _, suffix = name.rpartition('.')
+        if prefix == os.path.basename(path) and suffix.isdigit() and int(suffix) <= generation - KEEP_GENERATIONS:
+            try: os.remove(os.path.join(directory, name))
+            except OSError: pass
+    event_log.info('shared_gallery', f"Published gallery generation {generation} ({len(matrix)} encodings, {os.path.getsize(_data_path(path, generation)) / 1e6:.1f} MB).")
+    return generation
+
+
+class SharedIds(Sequence):
+    """Employee IDs of a mapped gallery file, decoded on access (only the matched ID is ever decoded per face)."""
+    def __init__(self, buffer, offsets, blob_start):
+        self._buffer = buffer; self._offsets = offsets; self._blob_start = blob_start
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError("gallery ID index out of range")
+        start = self._blob_start + int(self._offsets[index]); end = self._blob_start + int(self._offsets[index + 1])
+        return self._buffer[start:end].decode('utf-8')
+
+
+class SharedGalleryReader:
+    """Read-only, zero-copy view of the published gallery. Call refresh() periodically; ids/encodings change when it returns True."""
+    def __init__(self, path=SHARED_GALLERY_FILE):
+        self.path = path; self.generation = 0
+        self.ids = []; self.encodings = np.empty((0, ENCODING_DIMENSIONS)) # (n, 128) float64 view of the mapping once attached
+        self._control = None
+
+    def published_generation(self):
+        if self._control is None:
+            try:
+                with open(self.path + '.ctl', 'rb') as f: self._control = mmap.mmap(f.fileno(), CONTROL.size, access=mmap.ACCESS_READ)
+            except (OSError, ValueError): return 0 # Nothing published yet
+        magic, generation = CONTROL.unpack_from(self._control)
+        return generation if magic == MAGIC else 0
+
+    def refresh(self):
+        """Attaches the newest published generation. Returns True if the gallery changed."""
+        generation = self.published_generation()
+        if not generation or generation == self.generation: return False
+        try: self._attach(generation); return True
+        except (OSError, ValueError, struct.error) as e: # E.g. the publisher replaced it again meanwhile: retried on the next refresh
+            event_log.warning('shared_gallery', f"Attaching gallery generation {generation} failed: {e}", sample_key='shared_gallery.attach'); return False
+
+    def _attach(self, generation):
+        with open(_data_path(self.path, generation), 'rb') as f: buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, dimensions, _, file_generation, id_bytes, _ = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION or dimensions != ENCODING_DIMENSIONS or file_generation != generation:
+            raise ValueError(f"unexpected header (format {version}, {dimensions} dimensions, generation {file_generation})")
+        encodings_end = HEADER.size + count * dimensions * 8; offsets_end = encodings_end + (count + 1) * 4
+        if len(buffer) < offsets_end + id_bytes: raise ValueError("file is truncated")
+        encodings = np.frombuffer(buffer, dtype=np.float64, count=count * dimensions, offset=HEADER.size).reshape(count, dimensions)
+        offsets = np.frombuffer(buffer, dtype=np.uint32, count=count + 1, offset=encodings_end)
+        # The previous mapping is released once nothing references its arrays any more (a match in progress keeps it alive)
+        self.ids = SharedIds(buffer, offsets, offsets_end); self.encodings = encodings; self.generation = generation
+        event_log.info('shared_gallery', f"Attached gallery generation {generation} ({count} encodings).")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Publish the employee gallery for other recognition processes, or show what is published.")
+    parser.add_argument("command", choices=["publish", "info"])
+    parser.add_argument("--path", default=SHARED_GALLERY_FILE, help="Base path of the shared gallery files.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'publish':
+        from database_setup import setup_database
+        from data_manager import load_known_faces
+        setup_database(); ids, encodings = load_known_faces()
+        print(f"Generation {publish_gallery(ids, encodings, args.path)} published ({len(ids)} employees).")
+        return 0
+    reader = SharedGalleryReader(args.path)
+    if not reader.refresh(): print(f"No gallery published at {args.path}."); return 1
+    print(f"Generation {reader.generation}: {len(reader.ids)} employees, {reader.encodings.nbytes / 1e6:.1f} MB of encodings.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
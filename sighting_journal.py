@@ -0,0 +1,173 @@
+# sighting_journal.py (Append-only journal of every confirmed recognition - memory-mapped, preallocated, rotating segments)
+#
+# attendance_logs keeps one row per employee per day; the journal keeps every recognition (employee, camera,
+# time, match distance, emotion when one was detected) at frame rate without touching SQLite. Records have a
+# fixed 48-byte layout and are written with struct.pack_into straight into a memory-mapped segment file, so an
+# append costs a few microseconds. Segments are preallocated to SEGMENT_RECORDS records; a full segment is
+# flushed and the next one started, and only the newest MAX_SEGMENTS are kept.
+#
+# Segment file: 64-byte header (magic, version, record size, capacity, record count, first/last timestamp),
+# then `capacity` records. The header is updated on every append, so readers (in this or another process)
+# see exactly the records written so far and can skip segments outside a time range without reading them.
+# The journal is append-only: deleting an employee leaves their sightings in place until the segments rotate out (a
+# re-used employee ID would inherit them). A full data reset calls clear(), which deletes every segment.
+#   python sighting_journal.py --from "2026-01-05 08:00" --to "2026-01-05 10:00" [--employee E001] [--csv out.csv]
+import argparse
+import csv
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+JOURNAL_DIR = "sightings"
+SEGMENT_RECORDS = 65536   # Records per segment file (48 B each -> 3 MB)
+MAX_SEGMENTS = 64         # Rotation: ~4 million sightings kept
+MAGIC = b'AIASSJ01'
+HEADER = struct.Struct('<8sHHIIqq')  # magic, version, record size, capacity, count, first timestamp us, last timestamp us
+HEADER_SIZE = 64
+RECORD = struct.Struct('<q20s12sfB3x') # timestamp us, employee_id (utf-8, zero padded), camera, distance (nan = unknown), emotion code
+RECORD_DTYPE = np.dtype([('timestamp_us', '<i8'), ('employee_id', 'S20'), ('camera', 'S12'), ('distance', '<f4'), ('emotion', 'u1'), ('pad', 'V3')])
+EMOTIONS = ('', 'angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral') # Code 0 = not detected for this sighting
+_EMOTION_CODES = {name: code for code, name in enumerate(EMOTIONS)}
+
+Sighting = namedtuple('Sighting', 'timestamp employee_id camera distance emotion') # timestamp in seconds since the epoch
+
+
+def _segment_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "segment_*.bin")))
+
+
+class SightingJournal:
+    """Thread-safe appender. Employee IDs longer than 20 bytes and camera names longer than 12 bytes are truncated."""
+    def __init__(self, directory=JOURNAL_DIR, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS):
+        self.directory = directory; self.segment_records = segment_records; self.max_segments = max_segments
+        self._lock = threading.Lock(); self._file = None; self._map = None; self._count = 0; self._first_us = 0; self._sequence = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = _segment_paths(directory)
+        if existing:
+            self._sequence = int(os.path.basename(existing[-1])[8:-4])
+            if not self._open_segment(existing[-1], create=False): self._new_segment() # Continue the newest segment if it has room
+        else: self._new_segment()
+
+    def append(self, employee_id, camera="", distance=None, emotion=None, timestamp=None):
+        """Records one sighting. `emotion` is the detected emotion label or None."""
+        timestamp_us = int((timestamp if timestamp is not None else time.time()) * 1_000_000)
+        with self._lock:
+            if self._map is None: return False # Closed
+            if self._count >= self.segment_records: self._new_segment()
+            RECORD.pack_into(self._map, HEADER_SIZE + self._count * RECORD.size, timestamp_us, str(employee_id).encode('utf-8')[:20],
+                             str(camera).encode('utf-8')[:12], float('nan') if distance is None else distance,
+                             _EMOTION_CODES.get(str(emotion).lower(), 0) if emotion else 0)
+            self._count += 1
+            if self._count == 1: self._first_us = timestamp_us
+            HEADER.pack_into(self._map, 0, MAGIC, 1, RECORD.size, self.segment_records, self._count, self._first_us, timestamp_us)
+        return True
+
+    def flush(self):
+        with self._lock:
+            if self._map is not None: self._map.flush()
+
+    def close(self):
+        with self._lock: self._close_segment()
+
+    def clear(self):
+        """Deletes every segment and starts an empty one (attendance data reset). Returns the number of segments removed."""
+        with self._lock:
+            if self._map is None: return 0 # Closed
+            self._close_segment(); removed = 0
+            for path in _segment_paths(self.directory):
+                try: os.remove(path); removed += 1
+                except OSError as e: print(f"Warning: Could not remove journal segment {path}: {e}")
+            self._new_segment() # Numbering continues, so a segment another process still writes to sorts before the new one
+        return removed
+
+    # --- Segments (called with the lock held) ---
+    def _open_segment(self, path, create):
+        size = HEADER_SIZE + self.segment_records * RECORD.size
+        if create:
+            with open(path, 'wb') as f:
+                if hasattr(os, 'posix_fallocate'): os.posix_fallocate(f.fileno(), 0, size) # Reserve the blocks up front
+                else: f.truncate(size)
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, _, record_size, capacity, count, first_us, _ = HEADER.unpack_from(self._map, 0)
+        if create: count = 0; first_us = 0; HEADER.pack_into(self._map, 0, MAGIC, 1, RECORD.size, self.segment_records, 0, 0, 0)
+        elif magic != MAGIC or record_size != RECORD.size or capacity != self.segment_records or count >= capacity:
+            self._close_segment(); return False
+        self._count = count; self._first_us = first_us
+        return True
+
+    def _new_segment(self):
+        self._close_segment()
+        self._sequence += 1
+        self._open_segment(os.path.join(self.directory, f"segment_{self._sequence:08d}.bin"), create=True)
+        for old_path in _segment_paths(self.directory)[:-self.max_segments]:
+            try: os.remove(old_path)
+            except OSError as e: print(f"Warning: Could not remove old journal segment {old_path}: {e}")
+
+    def _close_segment(self):
+        if self._map is not None: self._map.flush(); self._map.close(); self._map = None
+        if self._file is not None: self._file.close(); self._file = None
+
+
+def read_sightings(start=None, end=None, employee_id=None, directory=JOURNAL_DIR):
+    """Sightings with start <= timestamp < end (seconds since the epoch, or datetimes), oldest first.
+       Segments whose header time range misses the window are skipped; matching records are filtered with numpy."""
+    to_us = lambda value: None if value is None else int((value.timestamp() if isinstance(value, datetime) else value) * 1_000_000)
+    start_us, end_us = to_us(start), to_us(end)
+    wanted_id = str(employee_id).encode('utf-8')[:20] if employee_id is not None else None
+    results = []
+    for path in _segment_paths(directory):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE: continue
+            magic, _, record_size, _, count, first_us, last_us = HEADER.unpack_from(header, 0)
+            if magic != MAGIC or record_size != RECORD.size or count == 0: continue
+            if (start_us is not None and last_us < start_us) or (end_us is not None and first_us >= end_us): continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                records = np.frombuffer(mapped, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE).copy() # Copy before the map closes
+        mask = np.ones(count, dtype=bool)
+        if start_us is not None: mask &= records['timestamp_us'] >= start_us
+        if end_us is not None: mask &= records['timestamp_us'] < end_us
+        if wanted_id is not None: mask &= records['employee_id'] == wanted_id
+        records = records[mask]
+        for timestamp_us, employee, camera, distance, emotion in zip(records['timestamp_us'].tolist(), records['employee_id'].tolist(), records['camera'].tolist(),
+                                                                     records['distance'].tolist(), records['emotion'].tolist()): # Plain Python values: much faster than per-record numpy access
+            results.append(Sighting(timestamp_us / 1_000_000, employee.decode('utf-8', 'replace'), camera.decode('utf-8', 'replace'),
+                                    None if distance != distance else distance, (EMOTIONS[emotion] if emotion < len(EMOTIONS) else '') or None)) # distance != distance: nan
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Print or export sightings from the journal.")
+    parser.add_argument('--dir', default=JOURNAL_DIR)
+    parser.add_argument('--from', dest='start', help="Start time, e.g. '2026-01-05 08:00' (default: everything).")
+    parser.add_argument('--to', dest='end', help="End time (exclusive).")
+    parser.add_argument('--employee', help="Only this employee ID.")
+    parser.add_argument('--csv', help="Write the sightings to this CSV file instead of printing them.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    parse = lambda value: datetime.fromisoformat(value) if value else None
+    sightings = read_sightings(parse(args.start), parse(args.end), args.employee, args.dir)
+    rows = [(datetime.fromtimestamp(s.timestamp).isoformat(sep=' ', timespec='milliseconds'), s.employee_id, s.camera,
+             '' if s.distance is None else f"{s.distance:.4f}", s.emotion or '') for s in sightings]
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f: writer = csv.writer(f); writer.writerow(Sighting._fields); writer.writerows(rows)
+        print(f"Wrote {len(rows)} sighting(s) to {args.csv}")
+    else:
+        for row in rows: print("  ".join(row))
+        print(f"{len(rows)} sighting(s).")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
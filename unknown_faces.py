@@ -0,0 +1,244 @@
+# unknown_faces.py (Incremental clustering of unknown faces - returning visitors, daily counts, promotion to employee)
+#
+# Encodings that match nobody in the gallery are clustered online (nearest centroid; a face joins the closest
+# cluster within JOIN_THRESHOLD, otherwise starts a new one; clusters whose centroids drift within MERGE_THRESHOLD
+# are merged). Memory is bounded: at most MAX_CLUSTERS clusters (the least recently seen one is evicted) and
+# MAX_CROPS JPEG face crops per cluster.
+#
+# Each cluster also keeps a lower bound on the distance from its centroid to every gallery encoding, taken from the
+# full matches of its members (|c - g| >= |e - g| - |e - c|) and lowered by every centroid move. When a new face is
+# at distance d from a centroid whose bound - d is still above the match tolerance, the triangle inequality proves it
+# matches nobody, so face_engine skips the full gallery scan for it. The bounds are dropped whenever the gallery changes.
+# With a quantized gallery face_engine keeps no bounds (the re-ranked distance is only an upper bound on the true minimum).
+#
+# Clusters live in memory only; the daily unknown-visitor counts are flushed to the unknown_visitors table.
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+import cv2
+import numpy as np
+
+from database_setup import DATABASE_FILE
+import event_log
+
+ENCODING_DIMENSIONS = 128
+JOIN_THRESHOLD = 0.45      # A face this close to a centroid joins that cluster (tighter than the 0.5 match tolerance)
+MERGE_THRESHOLD = 0.35     # Two centroids this close are the same visitor
+CENTROID_WINDOW = 50       # The centroid is a running mean over about this many recent faces (follows lighting changes)
+MAX_CLUSTERS = 500
+MAX_CROPS = 3              # Largest face crops kept per cluster (for review and promotion)
+CROP_PADDING = 0.25        # Crop margin around the face box, as a fraction of the box size
+VISITOR_MIN_SIGHTINGS = 3  # Sightings of a cluster on a day before it counts as a visitor (filters one-off misdetections)
+HISTORY_DAYS = 90          # Daily counts kept in memory
+FLUSH_SECONDS = 60.0
+
+
+class UnknownFaceStore:
+    """Thread-safe cluster store shared by every camera. Attach it as FaceRecognitionSystem.unknown_store."""
+    def __init__(self, max_clusters=MAX_CLUSTERS, join_threshold=JOIN_THRESHOLD, merge_threshold=MERGE_THRESHOLD,
+                 db_file=DATABASE_FILE, flush_seconds=FLUSH_SECONDS):
+        self.max_clusters = max_clusters; self.join_threshold = join_threshold; self.merge_threshold = merge_threshold
+        self.db_file = db_file; self.flush_seconds = flush_seconds
+        self._lock = threading.Lock(); self._stop_event = threading.Event(); self._thread = None
+        self._centroids = np.zeros((max_clusters, ENCODING_DIMENSIONS), dtype=np.float64)
+        self._active = np.zeros(max_clusters, dtype=bool)
+        self._spread = np.zeros(max_clusters)                       # Running mean distance of joining faces to the centroid
+        self._bound = np.full(max_clusters, -np.inf)                # Lower bound of centroid-to-gallery distance
+        self._ids = [0] * max_clusters; self._counts = [0] * max_clusters
+        self._first_seen = [0.0] * max_clusters; self._last_seen = [0.0] * max_clusters
+        self._crops = [[] for _ in range(max_clusters)]             # [(score, jpeg bytes, face box inside the crop)], best first
+        self._next_id = 1; self._gallery_key = None
+        self._daily = {}                                            # 'YYYY-MM-DD' -> Counter(cluster_id -> sightings)
+        self.gallery_scans_skipped = 0
+
+    @property
+    def size(self):
+        return int(self._active.sum())
+
+    # --- Recognition path (called from face_engine for every encoded face) ---
+    def match_unknown(self, encoding, gallery_key, tolerance, rgb_frame=None, location=None, timestamp=None):
+        """Cluster ID if `encoding` provably matches no gallery encoding (then the sighting is recorded), else None."""
+        with self._lock:
+            self._check_gallery(gallery_key)
+            slot, distance = self._nearest(encoding)
+            if slot is None or distance > self.join_threshold or self._bound[slot] - distance <= tolerance: return None
+            self._join(slot, encoding, distance, timestamp)
+            self._note_crop(slot, rgb_frame, location)
+            self.gallery_scans_skipped += 1
+            return self._ids[slot]
+
+    def add(self, encoding, gallery_distance, gallery_key, rgb_frame=None, location=None, timestamp=None):
+        """Records an encoding the full gallery match rejected (`gallery_distance` = its distance to the closest employee).
+           Returns the cluster ID."""
+        encoding = np.asarray(encoding, dtype=np.float64)
+        with self._lock:
+            self._check_gallery(gallery_key)
+            slot, distance = self._nearest(encoding)
+            if slot is not None and distance <= self.join_threshold: self._join(slot, encoding, distance, timestamp)
+            else: slot = self._new_cluster(encoding, timestamp)
+            if gallery_distance is not None:
+                self._bound[slot] = max(self._bound[slot], gallery_distance - float(np.linalg.norm(encoding - self._centroids[slot])))
+            self._note_crop(slot, rgb_frame, location)
+            slot = self._merge_neighbours(slot)
+            return self._ids[slot]
+
+    def _check_gallery(self, gallery_key):
+        if gallery_key != self._gallery_key: self._gallery_key = gallery_key; self._bound[:] = -np.inf # Enrolled/removed faces void the bounds
+
+    def _nearest(self, encoding):
+        if not self._active.any(): return None, None
+        distances = np.linalg.norm(self._centroids - encoding, axis=1); distances[~self._active] = np.inf
+        slot = int(np.argmin(distances))
+        return slot, float(distances[slot])
+
+    def _join(self, slot, encoding, distance, timestamp):
+        count = self._counts[slot] + 1
+        shift_vector = (encoding - self._centroids[slot]) / min(count, CENTROID_WINDOW)
+        self._centroids[slot] += shift_vector; shift = float(np.linalg.norm(shift_vector))
+        self._spread[slot] += (distance - self._spread[slot]) / min(count, CENTROID_WINDOW); self._bound[slot] -= shift
+        self._counts[slot] = count; self._note_sighting(slot, timestamp)
+
+    def _new_cluster(self, encoding, timestamp):
+        free = np.flatnonzero(~self._active)
+        if free.size: slot = int(free[0])
+        else: # Full: evict the cluster seen least recently
+            slot = min(range(self.max_clusters), key=lambda i: self._last_seen[i])
+            event_log.debug('unknown_faces', f"Evicted unknown cluster {self._ids[slot]} ({self._counts[slot]} sightings).", sample_key='unknown_faces.evict')
+        self._active[slot] = True; self._centroids[slot] = encoding; self._spread[slot] = 0.0; self._bound[slot] = -np.inf
+        self._ids[slot] = self._next_id; self._next_id += 1; self._counts[slot] = 1; self._crops[slot] = []
+        now = timestamp or time.time(); self._first_seen[slot] = now; self._last_seen[slot] = now
+        self._note_sighting(slot, timestamp, count_only=True)
+        return slot
+
+    def _note_sighting(self, slot, timestamp, count_only=False):
+        now = timestamp or time.time()
+        if not count_only: self._last_seen[slot] = now
+        day = date.fromtimestamp(now).isoformat()
+        if day not in self._daily:
+            self._daily[day] = Counter()
+            for old_day in sorted(self._daily)[:-HISTORY_DAYS]: del self._daily[old_day]
+        self._daily[day][self._ids[slot]] += 1
+
+    def _merge_neighbours(self, slot):
+        # The updated centroid may now sit next to another cluster: fold the smaller one into the larger one
+        distances = np.linalg.norm(self._centroids - self._centroids[slot], axis=1); distances[~self._active] = np.inf; distances[slot] = np.inf
+        other = int(np.argmin(distances))
+        if distances[other] > self.merge_threshold: return slot
+        keep, gone = (slot, other) if self._counts[slot] >= self._counts[other] else (other, slot)
+        w_keep, w_gone = min(self._counts[keep], CENTROID_WINDOW), min(self._counts[gone], CENTROID_WINDOW)
+        merged = (self._centroids[keep] * w_keep + self._centroids[gone] * w_gone) / (w_keep + w_gone)
+        shift_keep = float(np.linalg.norm(merged - self._centroids[keep])); shift_gone = float(np.linalg.norm(merged - self._centroids[gone]))
+        self._spread[keep] = (self._spread[keep] * w_keep + self._spread[gone] * w_gone) / (w_keep + w_gone)
+        self._bound[keep] = min(self._bound[keep] - shift_keep, self._bound[gone] - shift_gone)
+        self._centroids[keep] = merged; self._counts[keep] += self._counts[gone]
+        self._first_seen[keep] = min(self._first_seen[keep], self._first_seen[gone]); self._last_seen[keep] = max(self._last_seen[keep], self._last_seen[gone])
+        self._crops[keep] = sorted(self._crops[keep] + self._crops[gone], key=lambda crop: -crop[0])[:MAX_CROPS]
+        keep_id, gone_id = self._ids[keep], self._ids[gone]
+        for counter in self._daily.values():
+            if gone_id in counter: counter[keep_id] += counter.pop(gone_id)
+        self._active[gone] = False; self._crops[gone] = []
+        return keep
+
+    def _note_crop(self, slot, rgb_frame, location):
+        # Keeps the MAX_CROPS largest faces; only faces that would make the list are cropped and JPEG-encoded
+        if rgb_frame is None or location is None: return
+        top, right, bottom, left = location; score = bottom - top
+        crops = self._crops[slot]
+        if len(crops) >= MAX_CROPS and score <= crops[-1][0]: return
+        h, w = rgb_frame.shape[:2]; pad = int(score * CROP_PADDING)
+        y0, x0, y1, x1 = max(0, top - pad), max(0, left - pad), min(h, bottom + pad), min(w, right + pad)
+        if y1 <= y0 or x1 <= x0: return
+        ok, jpeg = cv2.imencode('.jpg', cv2.cvtColor(rgb_frame[y0:y1, x0:x1], cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok: return
+        crops.append((score, jpeg.tobytes(), (top - y0, right - x0, bottom - y0, left - x0)))
+        crops.sort(key=lambda crop: -crop[0]); del crops[MAX_CROPS:]
+
+    # --- Admin queries ---
+    def clusters(self, min_sightings=1):
+        """[{'cluster_id', 'sightings', 'first_seen', 'last_seen', 'spread', 'crops'}], most recently seen first."""
+        with self._lock:
+            rows = [{'cluster_id': self._ids[i], 'sightings': self._counts[i], 'first_seen': self._first_seen[i], 'last_seen': self._last_seen[i],
+                     'spread': round(float(self._spread[i]), 3), 'crops': len(self._crops[i])}
+                    for i in np.flatnonzero(self._active) if self._counts[i] >= min_sightings]
+        return sorted(rows, key=lambda row: -row['last_seen'])
+
+    def best_crop(self, cluster_id, index=0):
+        """(BGR face crop, face box inside it) of a cluster, or (None, None)."""
+        with self._lock:
+            slot = self._slot_of(cluster_id)
+            if slot is None or index >= len(self._crops[slot]): return None, None
+            _, jpeg, location = self._crops[slot][index]
+        return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR), location
+
+    def daily_counts(self, min_sightings=VISITOR_MIN_SIGHTINGS):
+        """[(day, unknown visitors, sightings)] for the days in memory, oldest first."""
+        with self._lock:
+            return [(day, sum(1 for n in counter.values() if n >= min_sightings), sum(counter.values())) for day, counter in sorted(self._daily.items())]
+
+    def _slot_of(self, cluster_id):
+        for i in np.flatnonzero(self._active):
+            if self._ids[i] == cluster_id: return int(i)
+        return None
+
+    def remove(self, cluster_id):
+        with self._lock:
+            slot = self._slot_of(cluster_id)
+            if slot is None: return False
+            self._active[slot] = False; self._crops[slot] = []; return True
+
+    def promote(self, cluster_id, employee_id, name, department=None):
+        """Enrolls a cluster as a new employee from its best crop. Returns the crop (BGR, for the employee photo) or None."""
+        from data_manager import add_employee_from_frame # Imported here: data_manager -> face_engine is the other direction
+        for index in range(MAX_CROPS):
+            crop, location = self.best_crop(cluster_id, index)
+            if crop is None: break
+            if add_employee_from_frame(employee_id, name, crop, location, department):
+                self.remove(cluster_id)
+                event_log.info('unknown_faces', f"Unknown cluster {cluster_id} promoted to employee {name} (ID: {employee_id}).", cluster_id=cluster_id, employee_id=employee_id)
+                return crop
+        event_log.error('unknown_faces', f"Could not promote unknown cluster {cluster_id} to employee ID '{employee_id}'.")
+        return None
+
+    # --- Daily counts persistence ---
+    def flush(self):
+        rows = self.daily_counts()
+        if not rows: return 0
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=5.0)
+            conn.executemany('''INSERT INTO unknown_visitors (day, visitors, sightings) VALUES (?, ?, ?)
+                                ON CONFLICT(day) DO UPDATE SET visitors = max(visitors, excluded.visitors), sightings = max(sightings, excluded.sightings)''', rows)
+            conn.commit(); return len(rows)
+        except sqlite3.Error as e:
+            event_log.error('unknown_faces', f"Saving unknown visitor counts failed: {e}", sample_key='unknown_faces.flush')
+            if conn: conn.rollback()
+            return None
+        finally:
+            if conn: conn.close()
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="unknown-faces-flush", daemon=True); self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread: self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_seconds): self.flush()
+
+
+def get_daily_counts(days=30, db_file=DATABASE_FILE):
+    """Stored [(day, visitors, sightings)] of the last `days` days, newest first."""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        return conn.execute("SELECT day, visitors, sightings FROM unknown_visitors ORDER BY day DESC LIMIT ?", (days,)).fetchall()
+    except sqlite3.Error as e: event_log.error('unknown_faces', f"Reading unknown visitor counts failed: {e}"); return []
+    finally:
+        if conn: conn.close()